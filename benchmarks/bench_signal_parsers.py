@@ -0,0 +1,80 @@
+"""Microbenchmark: messages/second for each registered signal parser.
+
+Usage: python benchmarks/bench_signal_parsers.py [iterations]
+"""
+import importlib.util
+import os
+import re
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def load_module(name, relative_path):
+    # تحميل الوحدة مباشرة دون تشغيل utils/__init__.py (يتصل بـ Redis و PocketOption)
+    spec = importlib.util.spec_from_file_location(name, os.path.join(ROOT, relative_path))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+signal_parsers = load_module("signal_parsers", os.path.join("utils", "signal_parsers.py"))
+
+LEGACY_PATTERN = r"💷 (\S+)\s+💎 (M\d+)\s+⌚️ (\d{2}:\d{2}:\d{2})\s+(🔼 call|🔽 put)"
+
+SIGNAL = "💷 EURUSD-OTC\n💎 M1\n⌚️ 12:30:00\n🔼 call"
+CHATTER = [
+    "Good morning traders! Today we are going to have a great session 🚀",
+    "✅ WIN ✅",
+    "Martingale 1 ...",
+    "Join our VIP group for more signals: https://t.me/example " * 3,
+    "📊 Results of the day: 12 wins, 3 losses",
+]
+CUSTOM_FORMAT = {
+    "plain": {
+        "marker": "SIGNAL",
+        "pattern": r"SIGNAL (?P<symbol>[A-Z/_-]+) (?P<duration>M\d+) (?P<time>\d{2}:\d{2}(?::\d{2})?) (?P<direction>CALL|PUT)",
+        "ignore_case": True,
+    }
+}
+PLAIN_SIGNAL = "SIGNAL GBP/USD-OTC M5 09:15 PUT"
+
+
+def legacy_handler(text):
+    # نسخة من المعالج القديم: يعيد تقييم النمط لكل رسالة
+    match = re.search(LEGACY_PATTERN, text, re.MULTILINE)
+    if match:
+        symbol, duration, trade_time, direction = match.groups()
+        direction = "call" if "call" in direction.lower() else "put"
+        return {"symbol": symbol, "duration": duration, "time": trade_time, "direction": direction}
+    return None
+
+
+def bench(label, func, messages, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        for text in messages:
+            func(text)
+    elapsed = time.perf_counter() - start
+    rate = iterations * len(messages) / elapsed
+    print(f"{label:<32} {rate:>14,.0f} msg/s")
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    registry = signal_parsers.build_parser_registry({"signal_formats": CUSTOM_FORMAT})
+    mixed = [SIGNAL] + CHATTER
+
+    print(f"{iterations} iterations, {len(mixed)} messages per iteration (1 signal + {len(CHATTER)} chatter)\n")
+    bench("legacy re.search (signals)", legacy_handler, [SIGNAL], iterations)
+    bench("legacy re.search (mixed)", legacy_handler, mixed, iterations)
+    for name, parser in registry.parsers.items():
+        sample = PLAIN_SIGNAL if name == "plain" else SIGNAL
+        bench(f"{name} (signals)", parser.parse, [sample], iterations)
+        bench(f"{name} (chatter)", parser.parse, CHATTER, iterations)
+    bench("registry, unbound chat (mixed)", lambda t: registry.parse(None, t), mixed, iterations)
+
+
+if __name__ == "__main__":
+    main()
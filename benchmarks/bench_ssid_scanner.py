@@ -0,0 +1,154 @@
+"""Benchmark: finding the Real and Demo SSIDs in captured WebSocket traffic.
+
+A synthetic capture (two tabs, stream and heartbeat frames, one auth frame
+per tab arriving late) grows poll by poll, as driver.requests does while
+the pages load. The legacy extract_ssid loop rescans every frame from the
+start on every poll, once per account type; SsidScanner reads each frame
+once and stops at the last auth frame it needs.
+
+Usage: python benchmarks/bench_ssid_scanner.py [frames_per_socket] [polls]
+"""
+import importlib.util
+import json
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def load_module(name, relative_path):
+    # تحميل الوحدة مباشرة دون الحاجة إلى selenium أو Chrome
+    spec = importlib.util.spec_from_file_location(name, os.path.join(ROOT, relative_path))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+ssid_scanner = load_module("ssid_scanner", os.path.join("utils", "ssid_scanner.py"))
+
+
+class Message:
+    __slots__ = ("content",)
+
+    def __init__(self, content):
+        self.content = content
+
+
+class Request:
+    def __init__(self, id, url, frames=()):
+        self.id = id
+        self.url = url
+        self.ws_messages = list(frames)
+
+
+def auth_frame(is_demo):
+    payload = {"session": "a" * 32, "isDemo": is_demo, "uid": 12345678, "platform": 2}
+    return '42["auth",' + json.dumps(payload) + "]"
+
+
+def capture(rng, frames_per_socket):
+    """طلبات HTTP عادية + WebSocket لكل تبويب؛ إطار المصادقة في الربع الأخير."""
+    sockets = []
+    for is_demo in (0, 1):
+        frames = []
+        for _ in range(frames_per_socket):
+            if rng.random() < 0.7:
+                frames.append(b"\x04" + bytes(rng.randrange(256) for _ in range(rng.randint(60, 400))))
+            else:
+                frames.append('42["updateStream",[["EURUSD_otc",%d,1.0%04d]]]' % (rng.randint(1, 10 ** 9), rng.randrange(10 ** 4)))
+        frames.insert(rng.randint(frames_per_socket * 3 // 4, frames_per_socket), auth_frame(is_demo))
+        sockets.append(frames)
+    return sockets
+
+
+def legacy_extract(requests, is_demo):
+    # نسخة من حلقة extract_ssid القديمة: كل الطلبات وكل الإطارات من البداية
+    for request in requests:
+        if request.ws_messages and "wss://" in request.url:
+            for message in request.ws_messages:
+                message_text = message.content
+                if isinstance(message_text, bytes):
+                    message_text = message_text.decode("utf-8", errors="ignore")
+                if '42["auth"' in message_text or "a:4:{" in message_text:
+                    try:
+                        if '42["auth"' in message_text:
+                            parsed_data = json.loads(message_text[2:])
+                            if parsed_data[0] == "auth" and parsed_data[1].get("isDemo") == (1 if is_demo else 0):
+                                return message_text
+                        elif "a:4:{" in message_text:
+                            if is_demo:
+                                continue
+                            return message_text
+                    except (ValueError, KeyError):
+                        continue
+    return None
+
+
+def snapshots(sockets, polls):
+    """driver.requests عند كل قراءة: الإطارات تصل تدريجيًا."""
+    noise = [Request(f"http-{i}", f"https://pocketoption.com/asset/{i}.js") for i in range(200)]
+    for poll in range(1, polls + 1):
+        requests = list(noise)
+        for index, frames in enumerate(sockets):
+            visible = frames[: len(frames) * poll // polls]
+            requests.append(Request(f"ws-{index}", "wss://api-eu.po.market/socket.io/?EIO=4", [Message(f) for f in visible]))
+        yield requests
+
+
+def run_legacy(sockets, polls):
+    found = {}
+    for requests in snapshots(sockets, polls):
+        for account_type, is_demo in (("Real", False), ("Demo", True)):
+            if account_type not in found:
+                ssid = legacy_extract(requests, is_demo)
+                if ssid:
+                    found[account_type] = ssid
+        if len(found) == 2:
+            break
+    return found
+
+
+def run_scanner(sockets, polls):
+    scanner = ssid_scanner.SsidScanner()
+    for requests in snapshots(sockets, polls):
+        scanner.scan_requests(requests)
+        if scanner.done:
+            break
+    return scanner.found, scanner.frames_read
+
+
+def timed(func, *args):
+    # بناء اللقطات نفسه جزء من التكلفة في الحالتين، فيُقاس معها
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    frames_per_socket = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    polls = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    rng = random.Random(3)
+    sockets = capture(rng, frames_per_socket)
+    print(f"2 sockets x {frames_per_socket} frames, {polls} polls while the pages load\n")
+
+    legacy, legacy_time = timed(run_legacy, sockets, polls)
+    (found, frames_read), scanner_time = timed(run_scanner, sockets, polls)
+    assert legacy == found, "scanner and legacy loop disagree"
+
+    # الدالة النقية وحدها على التسجيل الكامل
+    full = sockets[0] + sockets[1]
+    start = time.perf_counter()
+    for _ in range(20):
+        ssid_scanner.scan_frames(full)
+    pure_time = (time.perf_counter() - start) / 20
+
+    print(f"{'legacy rescan loop':<28} {legacy_time * 1000:>10.1f} ms")
+    print(f"{'SsidScanner (incremental)':<28} {scanner_time * 1000:>10.1f} ms   frames read: {frames_read}")
+    print(f"{'scan_frames, full capture':<28} {pure_time * 1000:>10.2f} ms")
+    print(f"\nspeed-up: {legacy_time / scanner_time:.1f}x, both found {sorted(found)}")
+
+
+if __name__ == "__main__":
+    main()
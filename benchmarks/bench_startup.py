@@ -0,0 +1,67 @@
+"""Startup benchmark: import time and time-to-first-signal-ready, each in a fresh interpreter.
+
+Stages, measured from the first line of the child process:
+  import utils       -- the package itself (should do no I/O)
+  menu ready         -- everything main.py imports before the account menu
+  first signal ready -- menu ready + one signal through handle_signal on the
+                        replay loop (first-use costs: Redis, symbol catalog ...)
+
+Usage: python benchmarks/bench_startup.py [runs]
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SIGNAL = "💷 EURUSD-OTC\n💎 M1\n⌚️ 10:00:00\n🔼 call\n"
+
+CHILD = """
+import json, sys, time
+start = time.perf_counter()
+marks = {}
+import utils
+marks["import utils"] = time.perf_counter() - start
+import main
+marks["menu ready"] = time.perf_counter() - start
+from utils.replay import replay, load_signals
+settings = {"amount": 1.0, "multiplier": 2.0, "profit": 1e9, "loss": 1e9, "max_loss_count": 1, "payout": 70.0}
+replay(load_signals(sys.argv[1]), settings, latency=0.0)
+marks["first signal ready"] = time.perf_counter() - start
+print("BENCH " + json.dumps(marks))
+"""
+
+
+def run_once(workdir, signals_path):
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [ROOT, os.environ.get("PYTHONPATH")])))
+    started = time.perf_counter()
+    # يعمل في مجلد مؤقت حتى لا تكتب السجلات وملفات الجلسة في المستودع
+    result = subprocess.run([sys.executable, "-c", CHILD, signals_path], cwd=workdir, env=env, capture_output=True, text=True, encoding="utf-8")
+    wall = time.perf_counter() - started
+    for line in result.stdout.splitlines():
+        if line.startswith("BENCH "):
+            marks = json.loads(line[6:])
+            marks["process wall"] = wall
+            return marks
+    raise RuntimeError(f"child failed:\n{result.stderr[-2000:]}")
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    with tempfile.TemporaryDirectory() as workdir:
+        signals_path = os.path.join(workdir, "signals.txt")
+        with open(signals_path, "w", encoding="utf-8") as f:
+            f.write(SIGNAL)
+        samples = [run_once(workdir, signals_path) for _ in range(runs)]
+    print(f"{'stage':<22} {'min ms':>10} {'median ms':>10}")
+    for stage in samples[0]:
+        values = [sample[stage] * 1000 for sample in samples]
+        print(f"{stage:<22} {min(values):>10.1f} {statistics.median(values):>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""Microbenchmark: symbol -> API symbol resolution against a ~150 symbol payout map.
+
+Compares the old check_payout scan (normalize_symbol, three variants, a
+`.lower()` pass over every payout key) with one SymbolCatalog lookup.
+
+Usage: python benchmarks/bench_symbol_lookup.py [iterations]
+"""
+import importlib.util
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def load_module(name, relative_path):
+    # تحميل الوحدة مباشرة دون تشغيل utils/__init__.py (يتصل بـ Redis و PocketOption)
+    spec = importlib.util.spec_from_file_location(name, os.path.join(ROOT, relative_path))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+symbol_catalog = load_module("symbol_catalog", os.path.join("utils", "symbol_catalog.py"))
+
+CURRENCIES = ["EUR", "USD", "GBP", "JPY", "AUD", "CAD", "CHF", "NZD", "SGD", "PHP", "MXN", "BRL"]
+STOCKS = ["#AAPL", "#MSFT", "#TSLA", "#AMZN", "#FB", "#NFLX", "#BA", "#INTC", "#PFE", "#XOM"]
+CRYPTO = ["BTCUSD", "ETHUSD", "LTCUSD", "DOTUSD", "LINKUSD"]
+
+
+def live_payouts(rng):
+    """حوالي 150 رمزًا: أزواج عادية و OTC وأسهم وعملات رقمية."""
+    symbols = []
+    for base in CURRENCIES:
+        for quote in CURRENCIES:
+            if base != quote and len(symbols) < 125:
+                pair = base + quote
+                symbols.append(pair + "_otc")
+                if rng.random() < 0.3:
+                    symbols.append(pair)
+    symbols += [stock + "_otc" for stock in STOCKS] + STOCKS[:5]
+    symbols += [coin + "_otc" for coin in CRYPTO] + CRYPTO
+    return {symbol: rng.choice([70, 75, 80, 85, 92]) for symbol in symbols}
+
+
+def spellings(symbol):
+    """صيغ القنوات المختلفة لنفس الرمز."""
+    plain = symbol.replace("_otc", "")
+    is_otc = symbol.endswith("_otc")
+    pair = plain[:3] + "/" + plain[3:] if len(plain) == 6 and plain.isalpha() else plain
+    forms = [plain.lstrip("#")]
+    if is_otc:
+        forms += [plain + "-OTC", pair + " OTC", plain.lower() + "otc", symbol]
+    else:
+        forms += [pair]
+    return forms
+
+
+def legacy_normalize_symbol(symbol):
+    # نسخة من normalize_symbol القديمة
+    symbol = symbol.replace(" ", "").replace("/", "").lower()
+    symbol_mapping = {
+        "eurusdotc": "eurusd_otc",
+        "usdphpotc": "usdphp_otc",
+    }
+    symbol = symbol_mapping.get(symbol, symbol)
+    symbol = symbol.replace("-otc", "_otc").replace("otc", "_otc")
+    while "__otc" in symbol:
+        symbol = symbol.replace("__otc", "_otc")
+    return symbol
+
+
+def legacy_resolve(full_payout, symbol):
+    # نسخة من حلقة البحث القديمة في check_payout
+    normalized_symbol = legacy_normalize_symbol(symbol)
+    symbol_variants = [
+        normalized_symbol,
+        normalized_symbol.replace("_otc", ""),
+        normalized_symbol.replace("_otc", "-otc")
+    ]
+    for variant in symbol_variants:
+        for key in full_payout:
+            if key.lower() == variant.lower():
+                return key
+    return None
+
+
+def bench(label, func, queries, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        for query in queries:
+            func(query)
+    elapsed = time.perf_counter() - start
+    rate = iterations * len(queries) / elapsed
+    print(f"{label:<32} {rate:>14,.0f} lookups/s")
+    return rate
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    rng = random.Random(7)
+    full_payout = live_payouts(rng)
+    queries = [form for symbol in full_payout for form in spellings(symbol)]
+    rng.shuffle(queries)
+
+    catalog = symbol_catalog.SymbolCatalog(full_payout)
+    differ = sorted({q for q in queries if legacy_resolve(full_payout, q) != catalog.resolve(q)})
+    print(f"{len(full_payout)} live symbols, {len(catalog.aliases)} aliases, {len(queries)} spellings")
+    print(f"catalog differs from the legacy scan on {len(differ)} spellings: {differ}\n")
+
+    start = time.perf_counter()
+    for _ in range(100):
+        symbol_catalog.SymbolCatalog(full_payout)
+    print(f"{'catalog rebuild':<32} {(time.perf_counter() - start) / 100 * 1000:>11.3f} ms\n")
+
+    legacy = bench("legacy scan", lambda q: legacy_resolve(full_payout, q), queries, iterations)
+    indexed = bench("SymbolCatalog.resolve", catalog.resolve, queries, iterations)
+    print(f"\nspeed-up: {indexed / legacy:.0f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -5,17 +5,32 @@ import threading
 import sys
 import platform
 from datetime import datetime
-import ntplib
-import pytz
 from utils.auth import login_to_account, choose_account
 from utils.config_manager import load_account_data, save_account_data, load_martingale_settings, save_martingale_settings, get_martingale_settings
 from utils.telegram_bot import setup_telegram, listen_to_signals
 from utils.helpers import get_pocketoption_credentials
 from utils.martingale_strategy import MartingaleStrategy
-from utils.trade_modules.message_handling import handle_signal
+from utils.trade_modules.message_handling import handle_signal, resume_trade
 from utils.logger import Logger
 from BinaryOptionsToolsV2.pocketoption.asyncronous import PocketOptionAsync
-from utils.trade_modules.trade_utils import display_account_stats
+from utils.trade_modules.trade_utils import display_account_stats, seconds_until_entry, normalize_symbol
+from utils.signal_queue import SignalQueue
+from utils.signal_dedup import SignalDeduplicator, signal_key
+from utils.entry_scheduler import entry_scheduler
+from utils.precision_timer import precision_timer
+from utils.time_sync import clock_offset
+from utils.control_plane import control_plane
+from collections import OrderedDict
+from utils.connectivity import connectivity_monitor
+from utils.redis_client import redis_client
+from utils.payout_index import payout_index
+from utils.balance_ledger import ledger_for
+from utils.trade_modules.order_tracking import order_acks, result_tracker
+from utils.accounts import Account, account_pool
+from utils.metrics import metrics, signals_total
+from utils.trade_journal import trade_journal
+from utils.symbol_store import symbol_store
+from utils.session_registry import session_registry
 
 # إنشاء مجلد logs إذا لم يكن موجودًا
 log_dir = "logs"
@@ -34,19 +49,25 @@ if platform.system() == "Windows":
 
 start_time = datetime.now()
 
-def sync_system_time():
+# الإشارات المنتظرة في كل المسارات؛ لكل رمز مسار وعامل خاص به (نفس سلم المارتينجال)
+# والرموز المختلفة تتداول معًا بسلالم مستقلة
+SIGNAL_QUEUE_SIZE = 100
+DEDUP_WINDOW = 300
+LIVE_SIGNALS_LIMIT = 1000
+
+async def sync_system_time():
+    # تقدير فرق الساعة من عدة عينات NTP؛ كل حسابات وقت الدخول تمر عبر clock المصحح
     try:
-        client = ntplib.NTPClient()
-        response = client.request('pool.ntp.org')
-        ntp_time = datetime.fromtimestamp(response.tx_time, pytz.timezone('America/Sao_Paulo'))
-        current_time = datetime.now(pytz.timezone('America/Sao_Paulo'))
-        time_diff = abs((ntp_time - current_time).total_seconds())
-        if time_diff > 1:
-            logger.warning(f"System time is off by {time_diff:.2f} seconds. Consider syncing.")
-            print(f"⚠️ System time is off by {time_diff:.2f} seconds. Please sync your system clock.")
+        offset = await clock_offset.sync()
+        if offset is None:
+            print("⚠️ Failed to sync time: no NTP response, using the system clock")
+        elif abs(offset) > 1:
+            logger.warning(f"System time is off by {abs(offset):.2f} seconds, corrected automatically.")
+            print(f"⚠️ System time is off by {abs(offset):.2f} seconds, trade times are corrected automatically.")
     except Exception as e:
         logger.error(f"Failed to sync time with NTP: {str(e)}")
         print(f"⚠️ Failed to sync time: {str(e)}")
+    clock_offset.start()
 
 def print_timer(stop_event, start_time_timer):
     while not stop_event.is_set():
@@ -62,6 +83,7 @@ async def get_valid_balance(client, strategy, max_retries=3, retry_delay=1.5):
         try:
             balance = await client.balance()
             if balance is not None and balance >= 0:
+                ledger_for(client).observe(balance)
                 if strategy:
                     strategy.update_balance(balance)
                 logger.info(f"Balance retrieved successfully: {balance:.2f}")
@@ -76,15 +98,24 @@ async def get_valid_balance(client, strategy, max_retries=3, retry_delay=1.5):
 
 async def keep_alive(client: PocketOptionAsync):
     while True:
+        if not connectivity_monitor.is_online:
+            logger.warning("Keep_alive skipped: no internet connection")
+            await asyncio.sleep(15)
+            continue
         try:
-            await client.payout()
-            logger.info("Keep_alive request sent successfully")
+            changes = payout_index.update(await client.payout())
+            logger.info(f"Keep_alive request sent successfully, {changes} payout changes")
+            # مطابقة سجل الرصيد مع الخادم في الخلفية عند انتهاء مدته
+            await ledger_for(client).get()
         except Exception as e:
             logger.error(f"Keep_alive failed: {str(e)}")
         await asyncio.sleep(15)  # تحسين: تغيير الفاصل الزمني إلى 15 ثانية بدلاً من 10
 
 async def main():
-    sync_system_time()
+    # المزامنة الأولى في الخلفية: بدون اتصال تستغرق حتى ~8 ثوانٍ ولا يجب أن تؤخر القائمة
+    time_sync = asyncio.create_task(sync_system_time())
+    # لوحة التحكم المحلية تعمل من البداية لتأكيد CAPTCHA أثناء تسجيل الدخول
+    await control_plane.start()
     saved_martingale = load_martingale_settings()
     choice = choose_account()
     if choice == "1":
@@ -93,6 +124,10 @@ async def main():
     elif choice == "2":
         account_type = "Real"
         demo = False
+    elif choice == "4":
+        # كل الحسابات المحفوظة في عملية واحدة، لكل حساب سلم مارتينجال خاص به
+        account_type = "All"
+        demo = None
     elif choice == "3":
         print("👋 Exiting RoadBot...")
         logger.log_session(start_time, datetime.now(), account_type, 0.0, 0.0, 0.0, 0, 0, 0, 0, "Manual Exit")
@@ -102,10 +137,11 @@ async def main():
         logger.log_session(start_time, datetime.now(), account_type, 0.0, 0.0, 0.0, 0, 0, 0, 0, "Invalid Choice")
         return
 
-    saved_account_data = load_account_data(account_type)
+    multi_account = choice == "4"
+    saved_account_data = load_account_data(account_type) if not multi_account else None
     if saved_account_data:
         print(f"\nℹ️ Previous account type: {saved_account_data['account_type']}")
-    else:
+    elif not multi_account:
         print(f"\nℹ️ No previous {account_type} account data found, will create new...")
 
     if saved_martingale:
@@ -132,18 +168,24 @@ async def main():
     stop_event = None
     timer_thread = None
 
-    while retry_attempts < max_attempts:
+    if multi_account and not await account_pool.connect_saved(saved_martingale):
+        print("❌ No saved account could connect, cannot proceed")
+        logger.log_session(start_time, datetime.now(), account_type, 0.0, 0.0, 0.0, 0, 0, 0, 0, "No Connection")
+        return
+
+    while not multi_account and retry_attempts < max_attempts:
         try:
             if saved_account_data and saved_account_data.get("ssid"):
                 ssid = saved_account_data["ssid"]
-                client = PocketOptionAsync(ssid=ssid)
                 stop_event = threading.Event()
                 start_time_timer = time.time()
                 timer_thread = threading.Thread(target=print_timer, args=(stop_event, start_time_timer))
                 timer_thread.start()
-                balance = await get_valid_balance(client, None)
-                if balance < 0:
+                # اتصال واحد: التحقق من SSID وقراءة الرصيد على العميل الذي يبقى طوال الجلسة
+                client = await session_registry.open(ssid, account_type, retries=3)
+                if client is None:
                     raise Exception("Invalid balance retrieved")
+                balance = session_registry.balance(ssid)
                 martingale_strategy = MartingaleStrategy(saved_martingale, balance)
                 logger.info(f"Successfully connected with cached SSID for {account_type}")
                 print(f"✅ Successfully connected with cached SSID for {account_type}")
@@ -154,14 +196,15 @@ async def main():
                 driver, ssid = await login_to_account(credentials["email"], credentials["password"], demo=demo)
                 if ssid:
                     save_account_data(account_type, credentials, ssid)
-                    client = PocketOptionAsync(ssid=ssid)
                     stop_event = threading.Event()
                     start_time_timer = time.time()
                     timer_thread = threading.Thread(target=print_timer, args=(stop_event, start_time_timer))
                     timer_thread.start()
-                    balance = await get_valid_balance(client, None)
-                    if balance < 0:
+                    # إذا تحقق login_to_account من SSID المحفوظ فالعميل نفسه يُعاد هنا دون اتصال جديد
+                    client = await session_registry.open(ssid, account_type, retries=3)
+                    if client is None:
                         raise Exception("Invalid balance retrieved")
+                    balance = session_registry.balance(ssid)
                     martingale_strategy = MartingaleStrategy(saved_martingale, balance)
                     logger.info(f"Successfully connected with new SSID for {account_type}")
                     print(f"✅ Successfully connected with new SSID for {account_type}")
@@ -174,9 +217,9 @@ async def main():
             if stop_event and timer_thread:
                 stop_event.set()
                 timer_thread.join()
-            if client:
-                await client.disconnect()
-                client = None
+            if ssid:
+                await session_registry.discard(ssid)
+            client = None
             if driver:
                 driver.quit()
                 driver = None
@@ -197,22 +240,32 @@ async def main():
             driver.quit()
         return
 
-    if not client or not martingale_strategy:
+    if not multi_account and (not client or not martingale_strategy):
         print("❌ No connection to PocketOptionAsync, cannot proceed")
         logger.log_session(start_time, datetime.now(), account_type, 0.0, 0.0, 0.0, 0, 0, 0, 0, "No Connection")
         if driver:
             driver.quit()
         return
 
+    if not multi_account:
+        account_pool.add(Account(account_type, account_type, ssid, client, martingale_strategy))
+
     try:
-        balance = await get_valid_balance(client, martingale_strategy)
+        for account in account_pool:
+            # الرصيد قُرئ عند التحقق من الجلسة ويحفظه سجل الرصيد؛ لا طلب إضافي للخادم
+            account.strategy.update_balance(await ledger_for(account.client).get())
         os.system('cls' if os.name == 'nt' else 'clear')
-        print(f"🤖 Account Type: {account_type}")
-
-        await display_account_stats(martingale_strategy)
+        for account in account_pool:
+            print(f"🤖 Account: {account.name} ({account.account_type})")
+            await display_account_stats(account.strategy)
 
         logger.info("CONNECTED SUCCESSFUL")
-        asyncio.create_task(keep_alive(client))
+        connectivity_monitor.start()
+        account_pool.start_supervision()
+        for account in account_pool:
+            asyncio.create_task(keep_alive(account.client))
+        # كتالوج الرموز على القرص يُحدّث من العميل الحي (الرموز نفسها لكل الحسابات)
+        symbol_store.start(account_pool.accounts[0].client)
     except Exception as e:
         logger.error(f"Failed to fetch balance for {account_type}: {str(e)}")
         print(f"⚠️ Failed to fetch balance: {str(e)}")
@@ -221,58 +274,216 @@ async def main():
             driver.quit()
         return
 
-    martingale_strategy.is_active = True
+    for account in account_pool:
+        account.strategy.is_active = True
 
-    async def signal_handler(message):
-        if not martingale_strategy.is_active:
-            logger.info("⚠️ Bot stopped, ignoring new signal")
-            return
-        print("🔥 Waiting for a new trade 🔥")
-        await handle_signal(client, message, martingale_strategy, logger, ssid, demo)
-        net_profit = martingale_strategy.current_balance - martingale_strategy.initial_balance
-        net_loss = martingale_strategy.initial_balance - martingale_strategy.current_balance if martingale_strategy.current_balance < martingale_strategy.initial_balance else 0
-        if (net_profit >= martingale_strategy.settings["profit"] or
-            net_loss >= martingale_strategy.settings["loss"]):
-            martingale_strategy.is_active = False
-            limit_type = ('Profit' if net_profit >= martingale_strategy.settings["profit"]
-                        else 'Loss')
-            logger.info(f"🛑 Bot stopped due to reaching {limit_type} limit")
-            print(f"🛑 Bot stopped due to reaching {limit_type} limit")
-            final_balance = martingale_strategy.current_balance
+    # استعادة السلالم والصفقات المفتوحة من سجل الصفقات إذا توقف البرنامج بشكل مفاجئ
+    journal_state = trade_journal.recover()
+    try:
+        trade_journal.compact(journal_state)
+    except Exception as e:
+        logger.error(f"Trade journal compaction failed: {str(e)}")
+    trade_journal.open()
+    for account in account_pool:
+        state = journal_state.get(account.name.lower())
+        if not state:
+            continue
+        account.strategy.restore(state)
+        for entry in state["open"].values():
+            asyncio.create_task(resume_trade(account.client, account.strategy, logger, entry))
+        logger.info(f"{account.name}: restored {state['total_trades']} trades from the journal, {len(state['open'])} still open")
+        print(f"♻️ {account.name}: restored {state['total_trades']} trades, {len(state['open'])} still open")
+
+    async def on_connectivity_change(online):
+        if online:
+            for account in account_pool:
+                if account.supervisor:
+                    account.supervisor.check_now()
+                balance = await get_valid_balance(account.client, account.strategy)
+                logger.info(f"Connectivity restored, WebSocket re-checked, {account.name} balance: {balance:.2f}")
+
+    connectivity_monitor.add_listener(on_connectivity_change)
+
+    def on_payout_change(symbol, old, new):
+        # العائد المخزن في Redis لهذا الرمز لم يعد صحيحًا
+        redis_client.delete_data(f"payout_{normalize_symbol(symbol)}")
+        logger.info(f"Payout changed for {symbol}: {old} -> {new}")
+
+    payout_index.add_listener(on_payout_change)
+
+    limit_logged = set()
+
+    async def trade_signal(account, message):
+        strategy = account.strategy
+        await handle_signal(account.client, message, strategy, logger, account.ssid, account.demo, on_fire=account.record_fire)
+        # الحدود على الربح/الخسارة المحققة من كل السلالم معًا
+        net_profit, net_loss = strategy.net_result()
+        limit_type = strategy.limit_reached()
+        if limit_type and account.name not in limit_logged:
+            # عدة سلالم قد تنتهي بعد بلوغ الحد: تسجيل الجلسة مرة واحدة لكل حساب
+            limit_logged.add(account.name)
+            strategy.is_active = False
+            logger.info(f"🛑 {account.name} stopped due to reaching {limit_type} limit")
+            print(f"🛑 {account.name} stopped due to reaching {limit_type} limit")
             logger.log_session(
                 start_time,
                 datetime.now(),
-                account_type,
+                account.name,
                 net_profit,
                 net_loss,
-                final_balance,
-                martingale_strategy.total_trades,
-                martingale_strategy.wins,
-                martingale_strategy.losses,
-                martingale_strategy.ties,
+                strategy.current_balance,
+                strategy.total_trades,
+                strategy.wins,
+                strategy.losses,
+                strategy.ties,
                 f"Reached {limit_type} Limit"
             )
+
+    async def signal_handler(message):
+        if not account_pool.active:
+            logger.info("⚠️ Bot stopped, ignoring new signal")
+            return
+        print("🔥 Waiting for a new trade 🔥")
+        # نفس الإشارة لكل الحسابات النشطة معًا
+        await account_pool.dispatch(message, trade_signal)
+        if not account_pool.active:
+            logger.info("🛑 All accounts stopped, closing the signal listener")
             await telegram_client.disconnect()
 
-    await listen_to_signals(telegram_client, signal_handler, channel_name)
-
-    final_balance = martingale_strategy.current_balance
-    net_profit = final_balance - martingale_strategy.initial_balance
-    net_loss = martingale_strategy.initial_balance - final_balance if final_balance < martingale_strategy.initial_balance else 0
-    stop_reason = "Manual Exit" if martingale_strategy.is_active else "Reached Limit or Error"
-    logger.log_session(
-        start_time,
-        datetime.now(),
-        account_type,
-        net_profit,
-        net_loss,
-        final_balance,
-        martingale_strategy.total_trades,
-        martingale_strategy.wins,
-        martingale_strategy.losses,
-        martingale_strategy.ties,
-        stop_reason
+    signal_queue = SignalQueue(
+        signal_handler,
+        maxsize=SIGNAL_QUEUE_SIZE,
+        time_to_deadline=lambda message: seconds_until_entry(message.get("time"))
     )
+    deduplicator = SignalDeduplicator(window=DEDUP_WINDOW)
+    # (chat_id, message_id) -> (revision, signal key): لإلغاء الدخول عند تعديل الرسالة أو حذفها
+    live_signals = OrderedDict()
+
+    def track_signal(message, revision=0):
+        source = (message.get("chat_id"), message.get("message_id"))
+        message["entry_key"] = source + (revision,)
+        live_signals[source] = (revision, signal_key(message))
+        while len(live_signals) > LIVE_SIGNALS_LIMIT:
+            live_signals.popitem(last=False)
+
+    def untrack_signal(source):
+        tracked = live_signals.pop(source, None)
+        if tracked is None:
+            return None
+        entry_scheduler.cancel(source + (tracked[0],))
+        deduplicator.forget(tracked[1])
+        return tracked
+
+    async def ingest_signal(message, revision=0):
+        if deduplicator.is_duplicate(message, message.get("chat_id")):
+            signals_total.inc(outcome="rejected", reason="duplicate")
+            return
+        track_signal(message, revision)
+        await signal_queue.submit(message)
+
+    async def on_signal_edited(chat_id, message_id, message):
+        source = (chat_id, message_id)
+        tracked = live_signals.get(source)
+        if tracked and message and signal_key(message) == tracked[1]:
+            return  # تعديل لا يغير الإشارة
+        if tracked:
+            untrack_signal(source)
+            logger.info(f"Signal message {message_id} in {chat_id} edited, pending entry replaced")
+        if message:
+            await ingest_signal(message, tracked[0] + 1 if tracked else 0)
+
+    async def on_signal_deleted(chat_id, message_ids):
+        for message_id in message_ids:
+            if untrack_signal((chat_id, message_id)):
+                logger.info(f"Signal message {message_id} in {chat_id} deleted, pending entry cancelled")
+
+    def collect_stats():
+        return {
+            "signal_queue": signal_queue.stats(),
+            "entry_scheduler": entry_scheduler.stats(),
+            "entry_timer": precision_timer.stats(),
+            "clock_offset": clock_offset.stats(),
+            "signal_dedup": deduplicator.stats(),
+            "payout_index": payout_index.stats(),
+            "accounts": account_pool.stats(),
+            "balance_ledger": {account.name: ledger_for(account.client).stats() for account in account_pool},
+            "order_acks": order_acks.stats(),
+            "result_tracker": result_tracker.stats(),
+            "connectivity": connectivity_monitor.stats(),
+            "trade_journal": trade_journal.stats(),
+            "symbol_store": symbol_store.stats(),
+            "sessions": session_registry.stats(),
+        }
+
+    def set_trading(params, active):
+        # ?account=<name> لحساب واحد، وبدونه لكل الحسابات
+        if "account" in params:
+            account = account_pool.get(params["account"])
+            if account is None:
+                return 404, {"error": f"unknown account {params['account']}", "accounts": [a.name for a in account_pool]}
+            accounts = [account]
+        else:
+            accounts = list(account_pool)
+        for account in accounts:
+            account.strategy.is_active = active
+        names = [account.name for account in accounts]
+        logger.info(f"Trading {'resumed' if active else 'paused'} from the control plane for {names}")
+        print(f"{'▶️ Trading resumed' if active else '⏸️ Trading paused'}: {', '.join(names)}")
+        return {"active": active, "accounts": names}
+
+    def skip_entry(params):
+        try:
+            entry_id = int(params["id"]) if "id" in params else None
+        except ValueError:
+            return 400, {"error": "id must be an integer"}
+        skipped = entry_scheduler.cancel_matching(entry_id, params.get("symbol"))
+        if not skipped:
+            return 404, {"error": "no matching pending entry", "pending": entry_scheduler.snapshot()}
+        logger.info(f"Pending entries {skipped} skipped from the control plane")
+        return {"skipped": skipped}
+
+    control_plane.route("GET", "/stats", lambda params: {"active": bool(account_pool.active), **collect_stats()})
+    control_plane.route("GET", "/metrics", metrics.handle)
+    control_plane.route("GET", "/pending", lambda params: {"pending": entry_scheduler.snapshot()})
+    control_plane.route("POST", "/skip", skip_entry)
+    control_plane.route("POST", "/pause", lambda params: set_trading(params, False))
+    control_plane.route("POST", "/resume", lambda params: set_trading(params, True))
+
+    # أوقات الدخول تمر عبر clock المصحح: المزامنة الأولى تكتمل قبل أول إشارة
+    await time_sync
+    signal_queue.start()
+    await listen_to_signals(telegram_client, ingest_signal, channel_name, on_edit=on_signal_edited, on_delete=on_signal_deleted)
+    await signal_queue.stop()
+    await entry_scheduler.stop()
+    await result_tracker.stop()
+    await connectivity_monitor.stop()
+    await clock_offset.stop()
+    await symbol_store.stop()
+    await control_plane.stop()
+    await account_pool.disconnect()
+    # بدون session_end إذا بقيت صفقات مفتوحة، حتى تُستأنف عند التشغيل التالي
+    await trade_journal.close(clean=not any(account.strategy.exposure for account in account_pool))
+    for name, stats in collect_stats().items():
+        logger.info(f"{name} stats: {stats}")
+
+    for account in account_pool:
+        strategy = account.strategy
+        final_balance = strategy.current_balance
+        net_profit, net_loss = strategy.net_result()
+        stop_reason = "Manual Exit" if strategy.is_active else "Reached Limit or Error"
+        logger.log_session(
+            start_time,
+            datetime.now(),
+            account.name,
+            net_profit,
+            net_loss,
+            final_balance,
+            strategy.total_trades,
+            strategy.wins,
+            strategy.losses,
+            strategy.ties,
+            stop_reason
+        )
     if driver:
         driver.quit()
     if telegram_client:
@@ -1,8 +1,37 @@
-from .auth import login_to_account, choose_account
-from .config_manager import load_account_data, save_account_data, load_martingale_settings, save_martingale_settings, get_martingale_settings
-from .helpers import get_pocketoption_credentials
-from .logger import Logger
-from .telegram_bot import setup_telegram, listen_to_signals
-from .martingale_strategy import MartingaleStrategy
-from .trade_modules import trade_execution, trade_preparation, message_handling, trade_globals, trade_utils
-from .redis_client import redis_client
+import importlib
+
+# الأسماء المصدرة تُحمّل عند أول استخدام: استيراد utils لا يتصل بـ Redis ولا يحمّل telethon أو selenium
+_EXPORTS = {
+    "login_to_account": (".auth", "login_to_account"),
+    "choose_account": (".auth", "choose_account"),
+    "load_account_data": (".config_manager", "load_account_data"),
+    "save_account_data": (".config_manager", "save_account_data"),
+    "load_martingale_settings": (".config_manager", "load_martingale_settings"),
+    "save_martingale_settings": (".config_manager", "save_martingale_settings"),
+    "get_martingale_settings": (".config_manager", "get_martingale_settings"),
+    "get_pocketoption_credentials": (".helpers", "get_pocketoption_credentials"),
+    "Logger": (".logger", "Logger"),
+    "setup_telegram": (".telegram_bot", "setup_telegram"),
+    "listen_to_signals": (".telegram_bot", "listen_to_signals"),
+    "MartingaleStrategy": (".martingale_strategy", "MartingaleStrategy"),
+    "trade_execution": (".trade_modules.trade_execution", None),
+    "trade_preparation": (".trade_modules.trade_preparation", None),
+    "message_handling": (".trade_modules.message_handling", None),
+    "trade_globals": (".trade_modules.trade_globals", None),
+    "trade_utils": (".trade_modules.trade_utils", None),
+    "redis_client": (".redis_client", "redis_client"),
+}
+
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    module_name, attr = _EXPORTS[name]
+    module = importlib.import_module(module_name, __name__)
+    value = module if attr is None else getattr(module, attr)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_EXPORTS))
@@ -0,0 +1,166 @@
+import asyncio
+import logging
+from collections import deque
+from .config_manager import load_all_account_data
+from .martingale_strategy import MartingaleStrategy
+from .session_registry import session_registry
+from .trade_journal import trade_journal
+
+# إعدادات التسجيل
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[logging.FileHandler('errors.log', mode='a', encoding='utf-8')]
+)
+
+# عدد محاولات قراءة الرصيد عند ربط كل حساب
+CONNECT_RETRIES = 3
+CONNECT_RETRY_DELAY = 1.5
+
+
+class Account:
+    """One trading account: its client, its own Martingale ladder and its fire latencies."""
+
+    def __init__(self, name: str, account_type: str, ssid: str, client=None, strategy: MartingaleStrategy = None):
+        self.name = name
+        self.account_type = account_type
+        self.demo = account_type.lower() == "demo"
+        self.ssid = ssid
+        self.client = client
+        self.strategy = strategy
+        if strategy is not None:
+            strategy.journal = trade_journal.for_account(name)
+        self.fire_latencies = deque(maxlen=200)
+        self.signals = 0
+        self.fired = 0
+        self.errors = 0
+
+    @property
+    def supervisor(self):
+        return getattr(self.client, "supervisor", None)
+
+    @property
+    def is_active(self) -> bool:
+        return self.strategy is not None and self.strategy.is_active
+
+    def record_fire(self, latency: float, trade_id=None):
+        """تسجيل تأخر إرسال أمر هذا الحساب عن وقت الدخول."""
+        self.fire_latencies.append(latency)
+        if trade_id is not None:
+            self.fired += 1
+        logging.info(f"[{self.name}] order sent {latency * 1000:+.1f} ms from entry, trade {trade_id}")
+
+    def stats(self) -> dict:
+        latencies = sorted(self.fire_latencies)
+        strategy = self.strategy
+        return {
+            "type": self.account_type,
+            "active": self.is_active,
+            "balance": round(strategy.current_balance, 2) if strategy else None,
+            "net": round(strategy.realized, 2) if strategy else None,
+            "open": round(strategy.exposure, 2) if strategy else None,
+            "ladders": strategy.ladders_snapshot() if strategy else None,
+            "refused_steps": strategy.rejected_steps if strategy else None,
+            "signals": self.signals,
+            "fired": self.fired,
+            "errors": self.errors,
+            "fire_ms_avg": round(sum(latencies) / len(latencies) * 1000, 1) if latencies else None,
+            "fire_ms_max": round(latencies[-1] * 1000, 1) if latencies else None,
+            "connection": self.supervisor.stats() if self.supervisor else None,
+        }
+
+
+class AccountPool:
+    """All accounts served by this process.
+
+    Each account has its own PocketOptionAsync client, MartingaleStrategy and
+    balance ledger; the Telegram session, Redis, payout index, entry
+    scheduler and result tracker are shared. `dispatch` hands one parsed
+    signal to every active account concurrently. The copies share the
+    message's entry key, so they wait on the same scheduler entry and an
+    edit, delete or skip cancels the entry for all of them.
+    """
+
+    def __init__(self):
+        self.accounts = []
+        self.dispatched = 0
+
+    def __len__(self):
+        return len(self.accounts)
+
+    def __iter__(self):
+        return iter(self.accounts)
+
+    def add(self, account: Account) -> Account:
+        self.accounts.append(account)
+        return account
+
+    def get(self, name: str):
+        for account in self.accounts:
+            if account.name.lower() == str(name).lower():
+                return account
+        return None
+
+    @property
+    def active(self) -> list:
+        return [account for account in self.accounts if account.is_active]
+
+    async def _connect(self, data: dict, settings: dict):
+        name = data.get("name") or data.get("account_type", "account")
+        account_type = data.get("account_type", name)
+        ssid = data.get("ssid")
+        if not ssid:
+            logging.warning(f"Account {name} has no saved SSID, skipped")
+            print(f"⚠️ {name}: no saved SSID, log in once with the single-account menu")
+            return None
+        client = await session_registry.open(ssid, name, retries=CONNECT_RETRIES, retry_delay=CONNECT_RETRY_DELAY)
+        if client is None:
+            print(f"❌ {name}: could not connect, skipped")
+            return None
+        balance = session_registry.balance(ssid)
+        logging.info(f"Account {name} ({account_type}) connected, balance: {balance:.2f}")
+        print(f"✅ {name} ({account_type}) connected, balance: {balance:.2f}")
+        return Account(name, account_type, ssid, client, MartingaleStrategy(settings, balance))
+
+    async def connect_saved(self, settings: dict, filename_prefix: str = "account_data") -> int:
+        """Connect every saved account with a cached SSID concurrently; returns how many connected."""
+        accounts = await asyncio.gather(*(self._connect(data, settings) for data in load_all_account_data(filename_prefix)))
+        for account in accounts:
+            if account is not None:
+                self.add(account)
+        return len(self.accounts)
+
+    def start_supervision(self):
+        """بدء نبضات القلب وإعادة الاتصال التلقائي لكل حساب."""
+        for account in self.accounts:
+            if account.supervisor:
+                account.supervisor.start()
+
+    async def _run(self, account: Account, message: dict, handler):
+        account.signals += 1
+        try:
+            await handler(account, dict(message))
+        except Exception as e:
+            account.errors += 1
+            logging.error(f"[{account.name}] signal handling failed: {str(e)}")
+
+    async def dispatch(self, message: dict, handler):
+        """تمرير الإشارة إلى كل الحسابات النشطة معًا؛ handler(account, message) لكل حساب."""
+        accounts = self.active
+        if not accounts:
+            return
+        self.dispatched += 1
+        await asyncio.gather(*(self._run(account, message, handler) for account in accounts))
+
+    async def disconnect(self):
+        for account in self.accounts:
+            try:
+                await account.client.disconnect()
+            except Exception as e:
+                logging.warning(f"[{account.name}] disconnect failed: {str(e)}")
+
+    def stats(self) -> dict:
+        return {account.name: account.stats() for account in self.accounts}
+
+
+account_pool = AccountPool()
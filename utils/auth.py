@@ -1,8 +1,5 @@
-import json
 import logging
-import time
 import os
-from seleniumwire.webdriver import Chrome
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
@@ -10,9 +7,11 @@ from selenium.common.exceptions import TimeoutException, WebDriverException
 from contextlib import contextmanager
 from getpass import getpass
 from utils.trade_modules.trade_globals import initialize_driver
-from BinaryOptionsToolsV2.pocketoption.asyncronous import PocketOptionAsync
 import asyncio
-import msvcrt
+import threading
+from utils.control_plane import control_plane
+from utils.ssid_scanner import SsidScanner
+from utils.session_registry import session_registry
 
 logging.basicConfig(
     level=logging.WARNING,
@@ -21,39 +20,42 @@ logging.basicConfig(
 )
 
 async def check_ssid_validity(ssid: str, demo: bool = False) -> bool:
-    try:
-        client = PocketOptionAsync(ssid=ssid, demo=demo)
-        balance = await client.balance()
-        if balance is not None and balance >= 0:
-            logging.info(f"SSID {ssid} is valid")
-            return True
+    # العميل الذي يتحقق من SSID يبقى في session_registry ويستخدمه main بدل اتصال جديد
+    valid = await session_registry.validate(ssid, "Demo" if demo else "Real")
+    if valid:
+        logging.info(f"SSID {ssid} is valid")
+    else:
         logging.warning(f"SSID {ssid} is invalid or balance retrieval failed")
-        return False
-    except Exception as e:
-        logging.error(f"Failed to validate SSID {ssid}: {str(e)}")
-        return False
+    return valid
+
+CAPTCHA_SELECTOR = "iframe[title*='CAPTCHA'], div[id*='captcha'], div[class*='recaptcha']"
+CAPTCHA_TIMEOUT = 30
+
+async def wait_for_captcha(driver, timeout=CAPTCHA_TIMEOUT):
+    """انتظار اختفاء CAPTCHA من الصفحة أو تأكيد المشغل عبر POST /confirm?name=captcha."""
+    confirmed = control_plane.expect("captcha")
+    stop = threading.Event()
 
-def input_with_timeout(prompt, timeout):
+    def captcha_gone(d):
+        # stop يُنهي الاستطلاع في الخيط عند تأكيد المشغل بدل تركه يعمل حتى المهلة
+        return stop.is_set() or not d.find_elements(By.CSS_SELECTOR, CAPTCHA_SELECTOR)
+
+    solved = asyncio.ensure_future(asyncio.to_thread(
+        WebDriverWait(driver, timeout).until, captcha_gone, "CAPTCHA was not solved in time."
+    ))
+    # قراءة نتيجة الخيط دائمًا حتى لا يبقى TimeoutException غير مقروء
+    solved.add_done_callback(lambda future: future.cancelled() or future.exception())
     try:
-        print(prompt, end='', flush=True)
-        start_time = time.time()
-        result = ""
-        while time.time() - start_time < timeout:
-            if msvcrt.kbhit():
-                char = msvcrt.getch().decode('utf-8', errors='ignore')
-                if char == '\r':
-                    print()
-                    return result
-                result += char
-                print(char, end='', flush=True)
-            time.sleep(0.01)
-        raise TimeoutException("Input timed out")
-    except TimeoutException:
-        print("\nInput timed out")
-        raise
-    except Exception as e:
-        logging.error(f"Input error: {str(e)}")
-        raise
+        done, _ = await asyncio.wait({confirmed, solved}, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        confirmed.cancel()
+        stop.set()
+    if solved in done and solved.exception() is None:
+        return True
+    if confirmed in done and not confirmed.cancelled():
+        logging.info("CAPTCHA confirmed by the operator")
+        return True
+    raise TimeoutException("CAPTCHA was not solved in time.")
 
 @contextmanager
 def get_driver():
@@ -68,16 +70,13 @@ def get_driver():
 async def handle_captcha(driver):
     try:
         captcha = WebDriverWait(driver, 5).until(
-            EC.presence_of_element_located((By.CSS_SELECTOR, "iframe[title*='CAPTCHA'], div[id*='captcha'], div[class*='recaptcha']"))
+            EC.presence_of_element_located((By.CSS_SELECTOR, CAPTCHA_SELECTOR))
         )
         if captcha.is_displayed():
-            print("⏳ CAPTCHA detected! Please solve it manually within 30 seconds...")
+            print(f"⏳ CAPTCHA detected! Please solve it manually within {CAPTCHA_TIMEOUT} seconds...")
+            print("ℹ️ Or confirm it with: POST /confirm?name=captcha on the control port")
             try:
-                await asyncio.to_thread(input_with_timeout, "", 30)
-                WebDriverWait(driver, 30).until_not(
-                    EC.presence_of_element_located((By.CSS_SELECTOR, "iframe[title*='CAPTCHA'], div[id*='captcha'], div[class*='recaptcha']")),
-                    message="CAPTCHA was not solved in time."
-                )
+                await wait_for_captcha(driver)
                 logging.info("CAPTCHA solved successfully")
                 print("✅ CAPTCHA solved")
                 return True
@@ -115,67 +114,78 @@ async def login(driver, email, password):
         print(f"❌ Login failed: {str(e)}")
         return False
 
-async def extract_ssid(driver, is_demo, max_attempts=3, delay=1):
-    account_type = "Real" if not is_demo else "Demo"
-    url = f"https://pocketoption.com/en/cabinet/{'/demo-quick-high-low' if is_demo else ''}"
-    print(f"Extracting SSID for {account_type} account...")
-    
+CABINET_URLS = {
+    "Real": "https://pocketoption.com/en/cabinet/",
+    "Demo": "https://pocketoption.com/en/cabinet//demo-quick-high-low",
+}
+# مدة البحث عن إطار المصادقة في كل محاولة قبل إعادة تحميل الصفحة، وفاصل القراءة
+SSID_ATTEMPT_TIMEOUT = 5.0
+SSID_POLL_INTERVAL = 0.1
+
+def _open_cabinet(driver, account_type):
     for load_attempt in range(2):
         try:
-            driver.get(url)
+            driver.get(CABINET_URLS[account_type])
             WebDriverWait(driver, 10).until(
                 EC.presence_of_element_located((By.TAG_NAME, "body"))
             )
             logging.info(f"{account_type} page loaded successfully")
-            break
-        except:
+            return True
+        except Exception:
             logging.warning(f"Attempt {load_attempt + 1}/2: Failed to load {account_type} page, retrying...")
             print(f"⚠️ Attempt {load_attempt + 1}/2: Failed to load {account_type} page, retrying...")
-            if load_attempt == 1:
-                logging.error(f"Failed to load {account_type} page after retries")
-                print(f"❌ Failed to load {account_type} page after retries")
-                return None
+    logging.error(f"Failed to load {account_type} page after retries")
+    print(f"❌ Failed to load {account_type} page after retries")
+    return False
+
+async def extract_ssids(driver, account_types=("Real", "Demo"), max_attempts=3, delay=1):
+    """Extract the SSIDs of several account types from one browser session.
+
+    Each account type gets its own tab, all captured by the same
+    selenium-wire session, and one SsidScanner reads the new WebSocket
+    frames of every tab until it has an auth frame for each type. Only the
+    tabs still missing an SSID are reloaded between attempts.
+    """
+    print(f"Extracting SSID for {' and '.join(account_types)} account...")
+    windows = {}
+    for account_type in account_types:
+        if windows:
+            driver.switch_to.new_window("tab")
+        if not await asyncio.to_thread(_open_cabinet, driver, account_type):
+            continue
+        windows[account_type] = driver.current_window_handle
+    scanner = SsidScanner(windows)
+    loop = asyncio.get_running_loop()
 
     for attempt in range(max_attempts):
         try:
-            driver.execute_script("window.location.reload();")
-            await asyncio.sleep(1)
-            for request in driver.requests:
-                if request.ws_messages and "wss://" in request.url:
-                    for message in request.ws_messages:
-                        message_text = message.content
-                        if isinstance(message_text, bytes):
-                            message_text = message_text.decode('utf-8', errors='ignore')
-                        if '42["auth"' in message_text or 'a:4:{' in message_text:
-                            try:
-                                if '42["auth"' in message_text:
-                                    parsed_data = json.loads(message_text[2:])
-                                    if parsed_data[0] == "auth" and parsed_data[1].get('isDemo') == (1 if is_demo else 0):
-                                        ssid = message_text
-                                        logging.info(f"SSID extracted for {account_type}: {ssid}")
-                                        print(f"✅ SSID successfully extracted for {account_type}: {ssid}")
-                                        return ssid
-                                elif 'a:4:{' in message_text:
-                                    if is_demo:
-                                        continue  # Ignore a:4:{ format for demo account
-                                    ssid = message_text
-                                    logging.info(f"SSID extracted for {account_type}: {ssid}")
-                                    print(f"✅ SSID successfully extracted for {account_type}: {ssid}")
-                                    return ssid
-                            except json.JSONDecodeError as e:
-                                logging.error(f"Failed to parse WebSocket message: {str(e)}")
-                                continue
-                            except KeyError as e:
-                                logging.error(f"Key error in WebSocket data: {str(e)}")
-                                continue
-            logging.warning(f"Attempt {attempt + 1}/{max_attempts}: Could not find valid {account_type} SSID")
-            print(f"⚠️ Attempt {attempt + 1}/{max_attempts}: Failed to extract {account_type} SSID")
+            deadline = loop.time() + SSID_ATTEMPT_TIMEOUT
+            while not scanner.done and loop.time() < deadline:
+                await asyncio.to_thread(lambda: scanner.scan_requests(driver.requests))
+                if not scanner.done:
+                    await asyncio.sleep(SSID_POLL_INTERVAL)
+            if scanner.done:
+                break
+            for account_type in scanner.missing:
+                logging.warning(f"Attempt {attempt + 1}/{max_attempts}: Could not find valid {account_type} SSID")
+                print(f"⚠️ Attempt {attempt + 1}/{max_attempts}: Failed to extract {account_type} SSID")
+                driver.switch_to.window(windows[account_type])
+                driver.execute_script("window.location.reload();")
             await asyncio.sleep(delay)
         except Exception as e:
-            logging.error(f"Failed to extract {account_type} SSID: {str(e)}")
-            print(f"⚠️ Error extracting {account_type} SSID: {str(e)}")
-            return None
-    return None
+            logging.error(f"Failed to extract {', '.join(scanner.missing)} SSID: {str(e)}")
+            print(f"⚠️ Error extracting SSID: {str(e)}")
+            break
+
+    logging.info(f"SSID scan read {scanner.frames_read} WebSocket frames")
+    for account_type, ssid in scanner.found.items():
+        logging.info(f"SSID extracted for {account_type}: {ssid}")
+        print(f"✅ SSID successfully extracted for {account_type}: {ssid}")
+    return scanner.found
+
+async def extract_ssid(driver, is_demo, max_attempts=3, delay=1):
+    account_type = "Real" if not is_demo else "Demo"
+    return (await extract_ssids(driver, (account_type,), max_attempts, delay)).get(account_type)
 
 async def login_to_account(email, password, demo=False):
     from utils.config_manager import load_account_data, save_account_data
@@ -195,9 +205,10 @@ async def login_to_account(email, password, demo=False):
         if not await handle_captcha(driver):
             return None, None
         
-        # Extract SSID for both real and demo accounts
-        ssid_real = await extract_ssid(driver, is_demo=False)
-        ssid_demo = await extract_ssid(driver, is_demo=True)
+        # Extract SSID for both real and demo accounts from one page session
+        ssids = await extract_ssids(driver, ("Real", "Demo"))
+        ssid_real = ssids.get("Real")
+        ssid_demo = ssids.get("Demo")
         
         # Save both SSIDs
         if ssid_real:
@@ -217,5 +228,6 @@ def choose_account():
     print("1️⃣  Demo")
     print("2️⃣  Real")
     print("3️⃣  Exit")
+    print("4️⃣  All saved accounts")
     choice = input("💥 Press to Start💥: ").strip()
     return choice
\ No newline at end of file
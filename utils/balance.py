@@ -1,9 +1,11 @@
+from .balance_ledger import ledger_for
+
 async def get_balance(driver=None, client=None):
     """جلب الرصيد باستخدام PocketOptionAsync فقط"""
     if not client:
         return "💵 Balance: Client not available"
     try:
-        balance = await client.balance()
+        balance = await ledger_for(client).get()
         if balance < 0:
             raise ValueError(f"Invalid balance: {balance}")
         account_type = "Demo" if client.ssid and '"isDemo":1' in client.ssid else "Real"
@@ -0,0 +1,158 @@
+import asyncio
+import logging
+import weakref
+from . import clock
+
+# إعدادات التسجيل
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[logging.FileHandler('errors.log', mode='a', encoding='utf-8')]
+)
+
+# المطابقة الدورية مع الخادم (بالثواني)
+RECONCILE_INTERVAL = 60.0
+# مجموع المبالغ غير المؤكدة (صفقات بدون نتيجة معروفة) الذي يستدعي مطابقة فورية
+DRIFT_THRESHOLD = 1.0
+
+
+class BalanceLedger:
+    """Local expected balance for one client.
+
+    The ledger starts from a server balance, subtracts each stake when an
+    order is accepted (`reserve`) and adds stake + profit when the result
+    arrives (`settle`). Reads are local. The server is asked again only in
+    the background: every `interval` seconds, or as soon as settlements
+    with an unknown outcome add up to `drift_threshold`.
+    """
+
+    def __init__(self, client, interval: float = RECONCILE_INTERVAL, drift_threshold: float = DRIFT_THRESHOLD):
+        self.client = weakref.ref(client)
+        self.interval = interval
+        self.drift_threshold = drift_threshold
+        self.expected = None
+        self.confirmed_at = None
+        self.open = {}
+        self.uncertain = 0.0
+        self.version = 0
+        self.task = None
+        self.reads = 0
+        self.reconciles = 0
+        self.max_drift = 0.0
+        self.drift_events = 0
+
+    @property
+    def balance(self):
+        """الرصيد المتوقع محليًا (None قبل أول مطابقة)."""
+        self.reads += 1
+        return self.expected
+
+    @property
+    def age(self):
+        return clock.monotonic() - self.confirmed_at if self.confirmed_at is not None else None
+
+    def observe(self, balance: float):
+        """تسجيل رصيد قرأه المستدعي من الخادم مباشرة."""
+        if balance is None or balance < 0:
+            return
+        if self.expected is not None:
+            self._record_drift(balance - self.expected)
+        self.expected = float(balance)
+        self.confirmed_at = clock.monotonic()
+        self.uncertain = 0.0
+        self.version += 1
+
+    def _record_drift(self, drift: float):
+        self.max_drift = max(self.max_drift, abs(drift))
+        if abs(drift) >= 0.01:
+            self.drift_events += 1
+            level = logging.WARNING if abs(drift) >= self.drift_threshold else logging.INFO
+            logging.log(level, f"Balance ledger drift {drift:+.2f}, corrected from the server")
+
+    async def reconcile(self):
+        """Read the server balance and correct the ledger; returns the balance or None."""
+        client = self.client()
+        if client is None:
+            return None
+        version = self.version
+        try:
+            balance = await client.balance()
+        except Exception as e:
+            logging.error(f"Balance reconcile failed: {str(e)}")
+            return None
+        if balance is None or not isinstance(balance, (int, float)) or balance < 0:
+            logging.error(f"Balance reconcile returned an invalid balance: {balance}")
+            return None
+        self.reconciles += 1
+        if version != self.version:
+            # صفقة فُتحت أو أُغلقت أثناء الطلب: الرصيد المقروء قد لا يشملها، نعيد المحاولة لاحقًا
+            logging.info("Balance changed locally during reconcile, keeping the ledger value")
+            self.schedule_reconcile()
+            return balance
+        self.observe(balance)
+        return balance
+
+    def schedule_reconcile(self):
+        """مطابقة في الخلفية دون انتظار النتيجة."""
+        if self.task is None or self.task.done():
+            self.task = asyncio.ensure_future(self.reconcile())
+
+    async def get(self):
+        """الرصيد المحلي؛ ينتظر الخادم فقط إذا لم تكن هناك قيمة بعد."""
+        if self.expected is None:
+            await self.reconcile()
+        elif self.age >= self.interval:
+            self.schedule_reconcile()
+        return self.balance
+
+    def reserve(self, trade_id, stake: float):
+        """خصم مبلغ صفقة قبلها الخادم."""
+        self.open[trade_id] = float(stake)
+        if self.expected is not None:
+            self.expected -= float(stake)
+        self.version += 1
+
+    def adopt(self, trade_id, stake: float):
+        """تتبع صفقة فُتحت قبل إعادة التشغيل: رصيد الخادم لا يشمل مبلغها، فلا يُخصم مرة أخرى."""
+        self.open[trade_id] = float(stake)
+        self.version += 1
+
+    def settle(self, trade_id, trade_data=None, stake: float = None):
+        """إضافة نتيجة الصفقة: المبلغ + الربح (الربح سالب عند الخسارة)."""
+        stake = self.open.pop(trade_id, stake)
+        if stake is None:
+            logging.warning(f"Settling unknown trade {trade_id}, reconciling")
+            self.schedule_reconcile()
+            return self.balance
+        profit = trade_data.get("profit") if trade_data else None
+        if profit is None:
+            # النتيجة غير معروفة: نفترض الخسارة كما يفعل handle_signal ونطابق عند تجاوز العتبة
+            self.uncertain += stake
+            if self.uncertain >= self.drift_threshold:
+                self.schedule_reconcile()
+        elif self.expected is not None:
+            self.expected += stake + float(profit)
+        self.version += 1
+        return self.balance
+
+    def stats(self) -> dict:
+        return {
+            "balance": round(self.expected, 2) if self.expected is not None else None,
+            "open": len(self.open),
+            "age": round(self.age, 1) if self.age is not None else None,
+            "reads": self.reads,
+            "reconciles": self.reconciles,
+            "drift_events": self.drift_events,
+            "max_drift": round(self.max_drift, 2),
+        }
+
+
+_ledgers = weakref.WeakKeyDictionary()
+
+
+def ledger_for(client) -> BalanceLedger:
+    """سجل الرصيد الخاص بهذا العميل (واحد لكل حساب)."""
+    ledger = _ledgers.get(client)
+    if ledger is None:
+        ledger = _ledgers[client] = BalanceLedger(client)
+    return ledger
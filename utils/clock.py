@@ -0,0 +1,53 @@
+import time as _time
+from datetime import datetime
+
+
+class SystemClock:
+    """الساعة الافتراضية: وقت النظام الحقيقي مصححًا بفرق التوقيت المقدر."""
+
+    virtual = False
+
+    def __init__(self):
+        self.offset = 0.0
+
+    def time(self) -> float:
+        return _time.time() + self.offset
+
+    def monotonic(self) -> float:
+        return _time.monotonic()
+
+    def now(self, tz=None) -> datetime:
+        return datetime.fromtimestamp(self.time(), tz)
+
+
+_system_clock = SystemClock()
+_clock = _system_clock
+
+
+def set_clock(new_clock):
+    """Swap the clock used by the trade path and return the previous one."""
+    global _clock
+    previous = _clock
+    _clock = new_clock
+    return previous
+
+
+def get_clock():
+    return _clock
+
+
+def set_offset(offset: float):
+    """Correction (seconds) added to the system clock, as estimated by time_sync."""
+    _system_clock.offset = offset
+
+
+def time() -> float:
+    return _clock.time()
+
+
+def monotonic() -> float:
+    return _clock.monotonic()
+
+
+def now(tz=None) -> datetime:
+    return _clock.now(tz)
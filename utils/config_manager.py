@@ -1,4 +1,5 @@
 import os
+import glob
 import json
 
 def format_value(value):
@@ -57,3 +58,18 @@ def load_account_data(account_type=None, filename_prefix="account_data"):
             with open(filename, "r") as f:
                 return json.load(f)
     return None
+
+def load_all_account_data(filename_prefix="account_data"):
+    """
+    تحميل كل ملفات الحسابات المحفوظة (account_data_*.json)، مع اسم الحساب المأخوذ من اسم الملف.
+    """
+    accounts = []
+    for filename in sorted(glob.glob(f"{filename_prefix}_*.json")):
+        try:
+            with open(filename, "r") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            continue
+        data["name"] = os.path.basename(filename)[len(filename_prefix) + 1:-len(".json")]
+        accounts.append(data)
+    return accounts
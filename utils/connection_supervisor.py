@@ -0,0 +1,273 @@
+import asyncio
+import contextvars
+import inspect
+import logging
+import random
+from collections import deque
+from BinaryOptionsToolsV2.pocketoption.asyncronous import PocketOptionAsync
+from . import clock
+from .connectivity import connectivity_monitor
+from .balance_ledger import ledger_for
+from .payout_index import payout_index
+from .metrics import reconnects_total
+
+# إعدادات التسجيل
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[logging.FileHandler('errors.log', mode='a', encoding='utf-8')]
+)
+
+# نبضة قلب كل HEARTBEAT_INTERVAL ثانية، وكل نبضة تفشل إذا لم يرد الخادم خلال HEARTBEAT_TIMEOUT
+HEARTBEAT_INTERVAL = 5.0
+HEARTBEAT_TIMEOUT = 3.0
+# عدد النبضات الفاشلة المتتالية قبل اعتبار الاتصال نصف مفتوح وإعادة الاتصال
+MAX_MISSES = 2
+# التراجع بين محاولات إعادة الاتصال: 1، 2، 4 ... حتى 30 ثانية مع تذبذب ±20%
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 30.0
+# المدة التي ينتظرها أمر جديد أثناء إعادة الاتصال قبل أن يفشل
+HOLD_TIMEOUT = 20.0
+# زمن رحلة النبضة الذي تبدأ بعده درجة الصحة في الانخفاض
+RTT_BUDGET = 0.5
+
+# موعد أقصى (clock.monotonic) لانتظار الاستدعاء الحالي أثناء إعادة الاتصال؛
+# يضبطه fire_armed_trade للأوامر الموقوتة حتى لا يُرسل أمر بعد فوات وقت دخوله
+hold_deadline = contextvars.ContextVar("hold_deadline", default=None)
+
+
+class LateOrderError(ConnectionError):
+    """إعادة الاتصال لم تنته قبل الموعد الأقصى للأمر؛ الأمر لم يُرسل."""
+
+
+class SupervisedClient:
+    """Stable stand-in for the supervisor's current PocketOptionAsync.
+
+    Async methods wait while the supervisor reconnects (up to `HOLD_TIMEOUT`,
+    or until `hold_deadline` when the caller set one) and are then forwarded to whichever client is current, so the trade path,
+    the balance ledger and the result tracker keep one client object across
+    reconnects. A failed call asks the supervisor for an early heartbeat.
+    """
+
+    def __init__(self, supervisor):
+        self.supervisor = supervisor
+
+    def __getattr__(self, name):
+        # أثناء إعادة الاتصال قد لا يوجد عميل حالي، فيُفحص نوع الدالة من الصنف
+        attr = getattr(self.supervisor.raw or self.supervisor.factory, name)
+        if not inspect.iscoroutinefunction(attr):
+            return attr
+
+        async def call(*args, **kwargs):
+            deadline = hold_deadline.get()
+            timeout = None if deadline is None else min(self.supervisor.hold_timeout, max(0.0, deadline - clock.monotonic()))
+            if not await self.supervisor.wait_ready(timeout):
+                if deadline is not None:
+                    raise LateOrderError(f"{self.supervisor.name}: still reconnecting at the order deadline, {name}() not sent")
+                raise ConnectionError(f"{self.supervisor.name}: still reconnecting, {name}() not sent")
+            try:
+                return await getattr(self.supervisor.raw, name)(*args, **kwargs)
+            except (ConnectionError, asyncio.TimeoutError, OSError) as e:
+                self.supervisor.report_failure(name, e)
+                raise
+
+        call.__name__ = name
+        return call
+
+    async def disconnect(self):
+        await self.supervisor.stop()
+
+    def __repr__(self):
+        return f"<SupervisedClient {self.supervisor.name} {self.supervisor.state}>"
+
+
+class ConnectionSupervisor:
+    """Owns the PocketOptionAsync of one account for the whole session.
+
+    A heartbeat measures the round trip of a server call. When the client
+    has `get_server_time`, a server time that stops advancing also counts
+    as a miss: the socket is half-open and nothing is arriving. After
+    `max_misses` misses in a row the client is replaced with a new one built
+    from the saved SSID, with exponential backoff between attempts.
+    Reconnecting waits while connectivity_monitor reports the machine
+    offline. `client` is the proxy the rest of the bot uses.
+    """
+
+    def __init__(self, ssid: str, name: str = "account", factory=PocketOptionAsync,
+                 interval: float = HEARTBEAT_INTERVAL, timeout: float = HEARTBEAT_TIMEOUT, max_misses: int = MAX_MISSES,
+                 hold_timeout: float = HOLD_TIMEOUT):
+        self.ssid = ssid
+        self.name = name
+        self.factory = factory
+        self.interval = interval
+        self.timeout = timeout
+        self.max_misses = max_misses
+        self.hold_timeout = hold_timeout
+        self.raw = factory(ssid=ssid)
+        self.client = SupervisedClient(self)
+        self.state = "connected"
+        self.ready = asyncio.Event()
+        self.ready.set()
+        self.wake = asyncio.Event()
+        self.task = None
+        self.misses = 0
+        self.last_server_time = None
+        self.rtts = deque(maxlen=50)
+        self.beats = deque(maxlen=20)
+        self.reconnects = 0
+        self.held = 0
+        self.failures = 0
+        self.down_since = None
+        self.downtime = 0.0
+
+    async def wait_ready(self, timeout: float = None) -> bool:
+        """انتظار انتهاء إعادة الاتصال؛ يعيد False إذا لم ينته خلال المهلة."""
+        if self.ready.is_set():
+            return True
+        self.held += 1
+        logging.info(f"[{self.name}] holding a call until the connection is back")
+        try:
+            await asyncio.wait_for(self.ready.wait(), timeout=self.hold_timeout if timeout is None else timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    def report_failure(self, method: str, error: Exception):
+        self.failures += 1
+        logging.warning(f"[{self.name}] {method}() failed: {str(error)}, checking the connection")
+        self.wake.set()
+
+    async def heartbeat(self) -> bool:
+        """نبضة واحدة على العميل الحالي؛ تعيد True إذا رد الخادم ببيانات حية."""
+        start = clock.monotonic()
+        try:
+            async with asyncio.timeout(self.timeout):
+                if hasattr(self.raw, "get_server_time"):
+                    server_time = await self.raw.get_server_time()
+                    if server_time is not None and server_time == self.last_server_time:
+                        raise ConnectionError(f"server time stuck at {server_time}")
+                    self.last_server_time = server_time
+                else:
+                    balance = await self.raw.balance()
+                    if balance is None or balance < 0:
+                        raise ConnectionError(f"invalid balance {balance}")
+        except Exception as e:
+            self.beats.append(False)
+            logging.warning(f"[{self.name}] heartbeat missed ({self.misses + 1}/{self.max_misses}): {str(e) or type(e).__name__}")
+            return False
+        self.rtts.append(clock.monotonic() - start)
+        self.beats.append(True)
+        return True
+
+    async def reconnect(self):
+        """استبدال العميل بعميل جديد من نفس SSID مع تراجع أسي بين المحاولات."""
+        self.ready.clear()
+        self.state = "reconnecting"
+        self.down_since = clock.monotonic()
+        print(f"🔌 {self.name}: connection lost, reconnecting...")
+        attempt = 0
+        while True:
+            old, self.raw = self.raw, None
+            if old is not None:
+                try:
+                    await old.disconnect()
+                except Exception as e:
+                    logging.warning(f"[{self.name}] disconnecting the old client failed: {str(e)}")
+            if not connectivity_monitor.is_online:
+                # لا فائدة من المحاولة والجهاز غير متصل؛ المحاولة لا تُحسب في التراجع
+                await asyncio.sleep(1.0)
+                continue
+            try:
+                self.raw = self.factory(ssid=self.ssid)
+                async with asyncio.timeout(self.timeout * 2):
+                    balance = await self.raw.balance()
+                if balance is None or balance < 0:
+                    raise ConnectionError(f"invalid balance {balance}")
+                break
+            except Exception as e:
+                attempt += 1
+                delay = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** (attempt - 1)) * random.uniform(0.8, 1.2)
+                logging.error(f"[{self.name}] reconnect attempt {attempt} failed: {str(e) or type(e).__name__}, next in {delay:.1f}s")
+                await asyncio.sleep(delay)
+        downtime = clock.monotonic() - self.down_since
+        self.downtime += downtime
+        self.down_since = None
+        self.reconnects += 1
+        reconnects_total.inc(account=self.name)
+        self.misses = 0
+        self.last_server_time = None
+        ledger_for(self.client).observe(balance)
+        try:
+            payout_index.update(await self.raw.payout())
+        except Exception as e:
+            logging.warning(f"[{self.name}] payout refresh after reconnect failed: {str(e)}")
+        self.state = "connected"
+        self.ready.set()
+        logging.info(f"[{self.name}] reconnected after {downtime:.1f}s ({attempt + 1} attempts), balance {balance:.2f}")
+        print(f"✅ {self.name}: reconnected after {downtime:.1f}s")
+
+    def check_now(self):
+        """نبضة فورية (مثلاً بعد عودة الاتصال بالإنترنت)."""
+        self.wake.set()
+
+    async def _run(self):
+        while True:
+            self.wake.clear()
+            try:
+                await asyncio.wait_for(self.wake.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            if not connectivity_monitor.is_online:
+                continue
+            try:
+                if await self.heartbeat():
+                    self.misses = 0
+                    continue
+                self.misses += 1
+                if self.misses >= self.max_misses:
+                    await self.reconnect()
+                else:
+                    # تأكيد سريع بدل انتظار الفاصل الكامل
+                    self.wake.set()
+            except Exception as e:
+                logging.error(f"[{self.name}] supervisor error: {str(e)}")
+
+    def start(self):
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+        if self.raw is not None:
+            try:
+                await self.raw.disconnect()
+            except Exception as e:
+                logging.warning(f"[{self.name}] disconnect failed: {str(e)}")
+        self.state = "stopped"
+
+    def health(self) -> int:
+        """درجة من 0 إلى 100: نسبة النبضات الناجحة مخصومًا منها زمن الرحلة الزائد عن RTT_BUDGET."""
+        if self.state != "connected":
+            return 0
+        if not self.beats:
+            return 100
+        score = 100 * sum(self.beats) / len(self.beats)
+        if self.rtts:
+            score -= min(50, max(0.0, (self.rtts[-1] - RTT_BUDGET) / RTT_BUDGET * 25))
+        return max(0, round(score))
+
+    def stats(self) -> dict:
+        rtts = sorted(self.rtts)
+        return {
+            "state": self.state,
+            "health": self.health(),
+            "rtt_ms": round(self.rtts[-1] * 1000, 1) if self.rtts else None,
+            "rtt_ms_max": round(rtts[-1] * 1000, 1) if rtts else None,
+            "reconnects": self.reconnects,
+            "downtime": round(self.downtime, 1),
+            "held_calls": self.held,
+            "call_failures": self.failures,
+        }
@@ -0,0 +1,143 @@
+import asyncio
+import logging
+import time
+
+# إعدادات التسجيل
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[logging.FileHandler('errors.log', mode='a', encoding='utf-8')]
+)
+
+PROBE_URLS = ("https://pocketoption.com/en/", "https://po.trade")
+
+
+class ConnectivityMonitor:
+    """Background reachability probe over one pooled aiohttp session.
+
+    The trade path reads `is_online` (or awaits `check()`, which only probes
+    when the cached state is older than `stale_after`). Listeners registered
+    with `add_listener` are called with the new state on every transition.
+    """
+
+    def __init__(self, urls=PROBE_URLS, interval: float = 5.0, timeout: float = 2.0, stale_after: float = 15.0):
+        self.urls = urls
+        self.interval = interval
+        self.timeout = timeout
+        self.stale_after = stale_after
+        self.session = None
+        self.task = None
+        self.online = None
+        self.rtt = None
+        self.last_checked = 0.0
+        self.consecutive_failures = 0
+        self.listeners = []
+        self.simulated = None
+
+    def add_listener(self, callback):
+        """callback(online: bool) — دالة عادية أو coroutine."""
+        self.listeners.append(callback)
+
+    def simulate(self, online):
+        """تثبيت الحالة (لإعادة التشغيل المحاكاة)؛ None لإعادة الفحص الحقيقي."""
+        self.simulated = online
+
+    @property
+    def is_fresh(self) -> bool:
+        return time.monotonic() - self.last_checked < self.stale_after
+
+    @property
+    def is_online(self) -> bool:
+        if self.simulated is not None:
+            return self.simulated
+        return bool(self.online) and self.is_fresh
+
+    async def _session(self):
+        if self.session is None or self.session.closed:
+            # aiohttp يُستورد عند أول فحص فقط؛ استيراده وحده يؤخر ظهور القائمة
+            import aiohttp
+            self.session = aiohttp.ClientSession(
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+                connector=aiohttp.TCPConnector(limit=4, keepalive_timeout=60)
+            )
+        return self.session
+
+    async def probe(self) -> bool:
+        """فحص واحد عبر الجلسة المشتركة؛ يكفي أن يستجيب أحد الروابط."""
+        session = await self._session()
+        for url in self.urls:
+            start = time.monotonic()
+            try:
+                async with session.head(url, allow_redirects=False) as response:
+                    if response.status < 500:
+                        self._update(True, time.monotonic() - start)
+                        return True
+                    logging.warning(f"Connectivity probe to {url} returned {response.status}")
+            except Exception as e:
+                logging.warning(f"Connectivity probe to {url} failed: {str(e)}")
+        self._update(False, None)
+        return False
+
+    def _update(self, online: bool, rtt):
+        previous = self.online
+        self.online = online
+        self.last_checked = time.monotonic()
+        if online:
+            self.rtt = rtt
+            self.consecutive_failures = 0
+        else:
+            self.consecutive_failures += 1
+        if previous is not None and previous != online:
+            if online:
+                logging.info(f"Connectivity restored, RTT {rtt * 1000:.0f} ms")
+            else:
+                logging.error("Connectivity lost")
+                print("⚠️ Internet connection lost")
+            for callback in self.listeners:
+                try:
+                    result = callback(online)
+                    if asyncio.iscoroutine(result):
+                        asyncio.create_task(result)
+                except Exception as e:
+                    logging.error(f"Connectivity listener failed: {str(e)}")
+
+    async def check(self) -> bool:
+        """Return the cached state, probing only if it is stale."""
+        if self.simulated is not None:
+            return self.simulated
+        if self.online is not None and self.is_fresh:
+            return self.online
+        return await self.probe()
+
+    async def _run(self):
+        while True:
+            try:
+                await self.probe()
+            except Exception as e:
+                logging.error(f"Connectivity monitor error: {str(e)}")
+            # الفحص أسرع أثناء الانقطاع لاكتشاف العودة مبكرًا
+            await asyncio.sleep(self.interval if self.online else min(self.interval, 1.0))
+
+    def start(self):
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+        if self.session is not None and not self.session.closed:
+            await self.session.close()
+        self.session = None
+
+    def stats(self) -> dict:
+        return {
+            "online": self.is_online,
+            "rtt_ms": round(self.rtt * 1000, 1) if self.rtt is not None else None,
+            "age": round(time.monotonic() - self.last_checked, 1) if self.last_checked else None,
+            "consecutive_failures": self.consecutive_failures,
+        }
+
+
+connectivity_monitor = ConnectivityMonitor()
@@ -0,0 +1,156 @@
+import asyncio
+import json
+import logging
+from urllib.parse import urlsplit, parse_qsl
+
+# إعدادات التسجيل
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[logging.FileHandler('errors.log', mode='a', encoding='utf-8')]
+)
+
+# لوحة التحكم تستمع على الجهاز المحلي فقط
+CONTROL_HOST = "127.0.0.1"
+CONTROL_PORT = 8765
+MAX_BODY = 64 * 1024
+
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 413: "Payload Too Large", 500: "Internal Server Error"}
+
+
+class ControlPlane:
+    """Minimal localhost HTTP endpoint for operating the bot while it runs.
+
+    Routes are registered with `route(method, path, handler)`; a handler
+    receives the query parameters merged with a JSON body (if any) and
+    returns a dict (sent as JSON), a (status, dict) pair, or a
+    (status, text, content_type) triple. Handlers may be coroutines.
+    `expect(name)` returns a future that a POST /confirm?name=<name>
+    resolves, for prompts that used to block on the keyboard.
+
+        curl -s localhost:8765/stats
+        curl -s -X POST "localhost:8765/skip?symbol=EURUSD_otc"
+    """
+
+    def __init__(self, host: str = CONTROL_HOST, port: int = CONTROL_PORT):
+        self.host = host
+        self.port = port
+        self.routes = {}
+        self.confirmations = {}
+        self.server = None
+        self.requests = 0
+        self.route("POST", "/confirm", self._confirm)
+        self.route("GET", "/", lambda params: {"routes": sorted(f"{m} {p}" for m, p in self.routes)})
+
+    def route(self, method: str, path: str, handler):
+        self.routes[(method.upper(), path)] = handler
+
+    def expect(self, name: str) -> asyncio.Future:
+        """انتظار تأكيد من المشغل عبر POST /confirm?name=<name>."""
+        future = self.confirmations.get(name)
+        if future is None or future.done():
+            future = self.confirmations[name] = asyncio.get_running_loop().create_future()
+        return future
+
+    def _confirm(self, params):
+        name = params.get("name")
+        future = self.confirmations.pop(name, None)
+        if future is None or future.done():
+            return 404, {"error": f"nothing is waiting for '{name}'"}
+        future.set_result(params.get("value", True))
+        return {"confirmed": name}
+
+    async def start(self):
+        if self.server is not None:
+            return
+        try:
+            self.server = await asyncio.start_server(self._handle, self.host, self.port)
+            logging.info(f"Control plane listening on http://{self.host}:{self.port}")
+            print(f"🎛️ Control: http://{self.host}:{self.port}")
+        except OSError as e:
+            logging.error(f"Control plane could not listen on {self.host}:{self.port}: {str(e)}")
+            print(f"⚠️ Control plane unavailable: {str(e)}")
+
+    async def stop(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+            self.server = None
+        for future in self.confirmations.values():
+            future.cancel()
+        self.confirmations = {}
+
+    async def _read_request(self, reader):
+        request_line = await reader.readline()
+        if not request_line:
+            return None
+        method, target, _ = request_line.decode("latin-1").split(" ", 2)
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        length = int(headers.get("content-length", 0) or 0)
+        if length > MAX_BODY:
+            raise ValueError("body too large")
+        body = await reader.readexactly(length) if length else b""
+        return method.upper(), target, body
+
+    async def _dispatch(self, method, target, body):
+        url = urlsplit(target)
+        params = dict(parse_qsl(url.query))
+        if body:
+            try:
+                payload = json.loads(body)
+            except ValueError:
+                return 400, {"error": "body must be JSON"}
+            if isinstance(payload, dict):
+                params.update(payload)
+        handler = self.routes.get((method, url.path))
+        if handler is None:
+            if any(path == url.path for _, path in self.routes):
+                return 405, {"error": f"{method} not allowed on {url.path}"}
+            return 404, {"error": f"unknown path {url.path}"}
+        result = handler(params)
+        if asyncio.iscoroutine(result):
+            result = await result
+        if isinstance(result, tuple):
+            return result
+        return 200, result
+
+    async def _handle(self, reader, writer):
+        self.requests += 1
+        try:
+            try:
+                request = await asyncio.wait_for(self._read_request(reader), timeout=5)
+                if request is None:
+                    return
+                response = await self._dispatch(*request)
+            except ValueError as e:
+                response = (400, {"error": str(e)})
+            except Exception as e:
+                logging.error(f"Control plane request failed: {str(e)}")
+                response = (500, {"error": str(e)})
+            if len(response) == 3:
+                status, text, content_type = response
+                payload = text.encode("utf-8")
+            else:
+                status, data = response
+                payload = json.dumps(data, ensure_ascii=False, default=str).encode("utf-8")
+                content_type = "application/json; charset=utf-8"
+            writer.write(
+                f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+                f"Content-Type: {content_type}\r\n"
+                f"Content-Length: {len(payload)}\r\n"
+                "Connection: close\r\n\r\n".encode("latin-1") + payload
+            )
+            await writer.drain()
+        except Exception as e:
+            logging.warning(f"Control plane connection error: {str(e)}")
+        finally:
+            writer.close()
+
+
+control_plane = ControlPlane()
@@ -0,0 +1,264 @@
+import asyncio
+import logging
+import math
+from . import clock
+from .precision_timer import precision_timer
+from .symbol_catalog import alias_key
+
+# إعدادات التسجيل
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[logging.FileHandler('errors.log', mode='a', encoding='utf-8')]
+)
+
+# عدد الثواني التي يبقى فيها مفتاح ملغى معروفًا، حتى يُرفض الانتظار الذي يصل بعد الإلغاء
+TOMBSTONE_TTL = 900
+
+
+class ScheduledEntry:
+    __slots__ = ("key", "fire_at", "tick", "waiters", "cancelled", "label", "seq")
+
+    def __init__(self, key, fire_at: float, tick: int, label=None, seq: int = 0):
+        self.key = key
+        self.fire_at = fire_at
+        self.tick = tick
+        self.waiters = []
+        self.cancelled = False
+        self.label = label
+        self.seq = seq
+
+
+class EntryScheduler:
+    """Hierarchical timer wheel that owns every pending trade entry.
+
+    Entries are keyed by an id of the source message and by absolute entry
+    time (clock.time()). One driver task sleeps until the next occupied tick,
+    so wake-ups depend on the number of distinct ticks, not on the number of
+    pending signals. Level 0 has `slots` buckets of `tick` seconds; each
+    higher level is `slots` times coarser and cascades down when the level
+    below wraps.
+    """
+
+    def __init__(self, tick: float = 0.05, slots: int = 64, levels: int = 3):
+        self.tick = tick
+        self.slots = slots
+        self.levels = levels
+        self._reset()
+        self.fired = 0
+        self.cancelled = 0
+        self.wakeups = 0
+        self.seq = 0
+
+    def _reset(self):
+        self.wheels = [[[] for _ in range(self.slots)] for _ in range(self.levels)]
+        self.overflow = []
+        self.entries = {}
+        self.tombstones = {}
+        self.current_tick = None
+        self.task = None
+        self.wake = None
+
+    def _ensure_driver(self):
+        loop = asyncio.get_running_loop()
+        if self.task is not None and not self.task.done() and self.task.get_loop() is loop:
+            return
+        if self.task is not None and self.task.get_loop() is not loop:
+            # حلقة جديدة (مثل إعادة التشغيل المحاكاة): البدء من عجلة فارغة
+            self._reset()
+        if self.current_tick is None:
+            self.current_tick = math.floor(clock.time() / self.tick)
+        self.wake = asyncio.Event()
+        self.task = loop.create_task(self._drive())
+
+    def _place(self, entry: ScheduledEntry):
+        delta = entry.tick - self.current_tick
+        span = self.slots
+        for level in range(self.levels):
+            if delta < span:
+                index = (entry.tick // (span // self.slots)) % self.slots
+                self.wheels[level][index].append(entry)
+                return
+            span *= self.slots
+        self.overflow.append(entry)
+
+    def _cascade(self):
+        """نقل المداخل من المستويات العليا عند اكتمال دورة المستوى الأدنى (من الأعلى إلى الأدنى)."""
+        wrapped = []
+        span = 1
+        for level in range(1, self.levels + 1):
+            span *= self.slots
+            if self.current_tick % span:
+                break
+            wrapped.append((level, span))
+        for level, span in reversed(wrapped):
+            if level == self.levels:
+                bucket, self.overflow = self.overflow, []
+            else:
+                index = (self.current_tick // span) % self.slots
+                bucket, self.wheels[level][index] = self.wheels[level][index], []
+            for entry in bucket:
+                if not entry.cancelled:
+                    self._place(entry)
+
+    def _fire_bucket(self):
+        index = self.current_tick % self.slots
+        bucket, self.wheels[0][index] = self.wheels[0][index], []
+        for entry in sorted(bucket, key=lambda e: e.fire_at):
+            if entry.cancelled:
+                continue
+            if entry.tick > self.current_tick:
+                self._place(entry)
+                continue
+            self._fire(entry)
+
+    def _fire(self, entry: ScheduledEntry):
+        if self.entries.get(entry.key) is entry:
+            del self.entries[entry.key]
+        self.fired += 1
+        for waiter in entry.waiters:
+            if not waiter.done():
+                waiter.set_result(True)
+
+    def _next_wake_tick(self) -> int:
+        """أقرب نبضة تحتاج إلى استيقاظ: خانة مشغولة في المستوى 0 أو حد انتقال."""
+        for offset in range(1, self.slots + 1):
+            tick = self.current_tick + offset
+            if self.wheels[0][tick % self.slots]:
+                return tick
+        boundary = (self.current_tick // self.slots + 1) * self.slots
+        return boundary
+
+    def _has_pending(self) -> bool:
+        return bool(self.entries)
+
+    async def _drive(self):
+        while True:
+            if not self._has_pending():
+                self.wake.clear()
+                await self.wake.wait()
+                # العجلة كانت فارغة: القفز مباشرة إلى النبضة الحالية
+                self._catch_up(jump=True)
+                continue
+            target = self._next_wake_tick()
+            delay = target * self.tick - clock.time()
+            if delay > 0:
+                self.wake.clear()
+                try:
+                    await asyncio.wait_for(self.wake.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+            self.wakeups += 1
+            self._catch_up()
+
+    def _catch_up(self, jump: bool = False):
+        now_tick = math.floor(clock.time() / self.tick)
+        if jump and not self._has_pending():
+            self.current_tick = max(self.current_tick, now_tick)
+            return
+        while self.current_tick < now_tick:
+            self.current_tick += 1
+            self._cascade()
+            self._fire_bucket()
+
+    def schedule(self, key, fire_at: float, label=None) -> asyncio.Future:
+        """Register a waiter for `key` firing at `fire_at`; returns a future resolving to True/False."""
+        self._ensure_driver()
+        future = asyncio.get_running_loop().create_future()
+        if key is not None and key in self.tombstones:
+            future.set_result(False)
+            return future
+        if not self.entries:
+            # العجلة فارغة: لا حاجة للمرور على النبضات التي مضت
+            self.current_tick = max(self.current_tick, math.floor(clock.time() / self.tick))
+        entry = self.entries.get(key) if key is not None else None
+        if entry is not None and entry.fire_at != fire_at:
+            # نفس المفتاح بوقت مختلف: استبدال المدخل القديم
+            self.cancel(key, tombstone=False)
+            entry = None
+        if entry is None:
+            tick = math.floor(fire_at / self.tick)
+            self.seq += 1
+            entry = ScheduledEntry(key if key is not None else object(), fire_at, tick, label, self.seq)
+            if tick <= self.current_tick:
+                entry.waiters.append(future)
+                self._fire(entry)
+                return future
+            self.entries[entry.key] = entry
+            self._place(entry)
+            self.wake.set()
+        entry.waiters.append(future)
+        return future
+
+    async def wait(self, key, fire_at: float, label=None) -> bool:
+        """الانتظار حتى وقت الدخول؛ يعيد False إذا أُلغي المدخل أو استُبدل.
+
+        The wheel wakes on the tick containing `fire_at`; the last fraction
+        of a tick is covered by the precision timer.
+        """
+        fired = await self.schedule(key, fire_at, label)
+        if fired:
+            await precision_timer.sleep_until(fire_at)
+        return fired
+
+    def cancel(self, key, tombstone: bool = True) -> bool:
+        """Cancel the pending entry for `key`; later waits on it return False."""
+        now = clock.time()
+        if tombstone and key is not None:
+            self.tombstones[key] = now
+            for stale in [k for k, t in self.tombstones.items() if now - t > TOMBSTONE_TTL]:
+                del self.tombstones[stale]
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return False
+        entry.cancelled = True
+        self.cancelled += 1
+        for waiter in entry.waiters:
+            if not waiter.done():
+                waiter.set_result(False)
+        logging.info(f"Pending entry {key} cancelled")
+        return True
+
+    async def stop(self):
+        """إيقاف مهمة التشغيل وإلغاء كل المداخل المعلقة."""
+        for key in list(self.entries):
+            self.cancel(key, tombstone=False)
+        if self.task is not None:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+
+    def pending(self) -> int:
+        return len(self.entries)
+
+    def snapshot(self) -> list:
+        """المداخل المعلقة مرتبة حسب وقت الدخول (للوحة التحكم)."""
+        now = clock.time()
+        return [
+            {"id": entry.seq, "label": entry.label, "fire_in": round(entry.fire_at - now, 3)}
+            for entry in sorted(self.entries.values(), key=lambda e: e.fire_at)
+        ]
+
+    def cancel_matching(self, entry_id=None, label=None) -> list:
+        """Cancel pending entries by id, by label, or the next one if neither is given; returns their ids."""
+        entries = sorted(self.entries.values(), key=lambda e: e.fire_at)
+        if entry_id is not None:
+            entries = [entry for entry in entries if entry.seq == entry_id]
+        elif label is not None:
+            entries = [entry for entry in entries if entry.label is not None and alias_key(entry.label) == alias_key(label)]
+        else:
+            entries = entries[:1]
+        for entry in entries:
+            self.cancel(entry.key)
+        return [entry.seq for entry in entries]
+
+    def stats(self) -> dict:
+        return {
+            "pending": self.pending(),
+            "fired": self.fired,
+            "cancelled": self.cancelled,
+            "wakeups": self.wakeups,
+        }
+
+
+entry_scheduler = EntryScheduler()
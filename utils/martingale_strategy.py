@@ -1,4 +1,6 @@
+import asyncio
 import logging
+from .symbol_catalog import alias_key
 
 # إعدادات التسجيل
 logging.basicConfig(
@@ -45,6 +47,15 @@ class MartingaleStrategy:
         self.losses = 0
         self.ties = 0
         self.total_trades = 0
+        # السلم الافتراضي (بدون رمز) يبقى على الكائن نفسه؛ لكل رمز سلم مستقل في ladders
+        self.key = None
+        self.open_stake = 0.0
+        self.ladders = {}
+        self.realized = 0.0
+        self.rejected_steps = 0
+        self.lock = asyncio.Lock()
+        # سجل الصفقات الخاص بالحساب (AccountJournal)، يعلقه Account عند الإنشاء
+        self.journal = None
         logging.info(f"تهيئة MartingaleStrategy مع max_loss_count: {self.settings['max_loss_count']}")
 
     def get_amount(self):
@@ -55,12 +66,89 @@ class MartingaleStrategy:
         """تحديث الرصيد المخزن مؤقتًا."""
         self.current_balance = float(new_balance)
 
-    async def update_amount(self, result: str, amount: float, profit_or_loss: float, payout: float):
+    def ladder(self, key) -> "MartingaleLadder":
+        """سلم المركز الخاص بهذا الرمز (يُنشأ عند أول استخدام)."""
+        key = alias_key(key)
+        ladder = self.ladders.get(key)
+        if ladder is None:
+            ladder = self.ladders[key] = MartingaleLadder(self, key)
+        return ladder
+
+    @property
+    def exposure(self) -> float:
+        """مجموع مبالغ الصفقات المفتوحة في كل السلالم."""
+        return self.open_stake + sum(ladder.open_stake for ladder in self.ladders.values())
+
+    def net_result(self):
+        """(صافي الربح، صافي الخسارة) المحققان من الصفقات المغلقة فقط."""
+        return max(self.realized, 0.0), max(-self.realized, 0.0)
+
+    def limit_reached(self):
+        net_profit, net_loss = self.net_result()
+        if net_profit >= self.settings["profit"]:
+            return "Profit"
+        if net_loss >= self.settings["loss"]:
+            return "Loss"
+        return None
+
+    async def open_position(self, amount: float, ladder=None) -> bool:
+        """Admit a new stake on `ladder` unless the global limits forbid it.
+
+        The check and the reservation happen under one lock, so ladders that
+        fire together cannot all pass a loss limit that only one of them fits
+        under: while other ladders hold open stakes, those stakes and the new
+        `amount` must all fit under the limit as possible losses. A lone stake
+        keeps the single-ladder rule (only realized losses are checked).
+        """
+        ladder = ladder or self
+        async with self.lock:
+            if not self.is_active:
+                return False
+            net_profit, net_loss = self.net_result()
+            others = self.exposure
+            at_risk = net_loss + others + (float(amount) if others else 0.0)
+            if net_profit >= self.settings["profit"] or net_loss + others >= self.settings["loss"] or at_risk > self.settings["loss"]:
+                self.rejected_steps += 1
+                logging.warning(f"Stake {amount:.2f} on {ladder.key} refused: realized loss {net_loss:.2f} + open {others:.2f} + new {amount:.2f} against limit {self.settings['loss']:.2f}")
+                return False
+            ladder.open_stake += float(amount)
+            return True
+
+    def release(self, amount: float = None, ladder=None):
+        """تحرير مبلغ صفقة لم تُفتح (أو كل المبلغ المفتوح للسلم إذا لم يُحدد)."""
+        ladder = ladder or self
+        ladder.open_stake = max(0.0, ladder.open_stake - float(amount)) if amount is not None else 0.0
+
+    async def update_amount(self, result: str, amount: float, profit_or_loss: float, payout: float, ladder=None, trade_id=None):
         """تحديث المبلغ بناءً على نتيجة الصفقة."""
+        ladder = ladder or self
+        async with self.lock:
+            self.release(amount, ladder)
+            self.realized += float(profit_or_loss)
+            continuing = self._apply_result(ladder, result, amount, profit_or_loss, payout)
+            if self.journal is not None:
+                # السلم الذي لن يستمر يُعاد عداده إلى الصفر في handle_signal، فيُسجل كذلك
+                loss_count = ladder.loss_count if continuing and self.is_active else 0
+                self.journal.result(trade_id, ladder, result, amount, profit_or_loss, self, loss_count)
+            return continuing
+
+    def restore(self, state: dict):
+        """Restore counters and ladders replayed from the trade journal after a restart."""
+        self.realized = float(state.get("realized", 0.0))
+        for field in ("wins", "losses", "ties", "total_trades"):
+            setattr(self, field, int(state.get(field, 0)))
+        for key, saved in state.get("ladders", {}).items():
+            ladder = self.ladder(key)
+            ladder.loss_count = int(saved["loss_count"])
+            ladder.current_amount = float(saved["current_amount"])
+        if self.limit_reached():
+            self.is_active = False
+        logging.info(f"استعادة الحالة من سجل الصفقات: realized={self.realized:.2f}, trades={self.total_trades}, ladders={self.ladders_snapshot()}")
+
+    def _apply_result(self, ladder, result: str, amount: float, profit_or_loss: float, payout: float):
         try:
             self.total_trades += 1
-            net_profit = self.current_balance - self.initial_balance
-            net_loss = self.initial_balance - self.current_balance if self.current_balance < self.initial_balance else 0
+            net_profit, net_loss = self.net_result()
 
             if net_profit >= self.settings["profit"]:
                 logging.info(f"Target profit reached: {net_profit:.2f} >= {self.settings['profit']:.2f}")
@@ -75,29 +163,29 @@ class MartingaleStrategy:
 
             if result == "win":
                 self.wins += 1
-                self.current_amount = self.settings["amount"]
-                self.loss_count = 0
+                ladder.current_amount = self.settings["amount"]
+                ladder.loss_count = 0
                 expected_profit = amount * self.settings["payout"] / 100
                 if abs(profit_or_loss - expected_profit) > 0.01:
                     logging.warning(f"الربح المستلم ({profit_or_loss:.2f}) لا يتطابق مع المتوقع ({expected_profit:.2f})")
-                logging.info(f"إعادة تعيين المبلغ إلى {self.current_amount:.2f} بعد الفوز، الربح: {profit_or_loss:.2f}")
+                logging.info(f"إعادة تعيين المبلغ إلى {ladder.current_amount:.2f} بعد الفوز، الربح: {profit_or_loss:.2f}")
                 return False  # التوقف لانتظار إشارة جديدة
             elif result == "loss":
                 self.losses += 1
-                self.loss_count += 1
-                if self.loss_count < self.settings["max_loss_count"]:
-                    self.current_amount *= self.settings["multiplier"]
-                    logging.info(f"زيادة المبلغ إلى {self.current_amount:.2f} بعد الخسارة، عدد الخسارات: {self.loss_count}")
+                ladder.loss_count += 1
+                if ladder.loss_count < self.settings["max_loss_count"]:
+                    ladder.current_amount *= self.settings["multiplier"]
+                    logging.info(f"زيادة المبلغ إلى {ladder.current_amount:.2f} بعد الخسارة، عدد الخسارات: {ladder.loss_count}")
                     return True
                 else:
-                    self.current_amount = self.settings["amount"]
-                    logging.info(f"توقف مؤقت بعد الوصول إلى الحد الأقصى للخسارات ({self.settings['max_loss_count']})، المبلغ: {self.current_amount:.2f}")
+                    ladder.current_amount = self.settings["amount"]
+                    logging.info(f"توقف مؤقت بعد الوصول إلى الحد الأقصى للخسارات ({self.settings['max_loss_count']})، المبلغ: {ladder.current_amount:.2f}")
                     return False
             elif result == "tie":
                 self.ties += 1
-                self.current_amount = self.settings["amount"]
-                self.loss_count = 0
-                logging.info(f"إعادة تعيين المبلغ إلى {self.current_amount:.2f} بعد التعادل")
+                ladder.current_amount = self.settings["amount"]
+                ladder.loss_count = 0
+                logging.info(f"إعادة تعيين المبلغ إلى {ladder.current_amount:.2f} بعد التعادل")
                 return False  # التوقف لانتظار إشارة جديدة
         except Exception as e:
             logging.error(f"Error while updating amount: {str(e)}")
@@ -105,4 +193,43 @@ class MartingaleStrategy:
             self.is_active = False
             return False
         finally:
-            logging.info(f"حالة الروبوت: is_active={self.is_active}, loss_count={self.loss_count}, current_amount={self.current_amount:.2f}")
\ No newline at end of file
+            logging.info(f"حالة الروبوت: is_active={self.is_active}, ladder={ladder.key}, loss_count={ladder.loss_count}, current_amount={ladder.current_amount:.2f}, open={self.exposure:.2f}")
+
+    def ladders_snapshot(self) -> dict:
+        """حالة السلالم غير الفارغة (للوحة التحكم)."""
+        return {
+            ladder.key: {"loss_count": ladder.loss_count, "amount": round(ladder.current_amount, 2), "open": round(ladder.open_stake, 2)}
+            for ladder in self.ladders.values()
+            if ladder.loss_count or ladder.open_stake
+        }
+
+
+class MartingaleLadder:
+    """سلم مارتينجال لمركز واحد: عدد الخسارات والمبلغ الحالي لرمز واحد.
+
+    الرصيد والإحصائيات وحدود الربح/الخسارة تبقى مشتركة في MartingaleStrategy.
+    """
+
+    def __init__(self, strategy: MartingaleStrategy, key: str):
+        self.strategy = strategy
+        self.key = key
+        self.current_amount = float(strategy.settings["amount"])
+        self.loss_count = 0
+        self.open_stake = 0.0
+
+    def get_amount(self):
+        return self.current_amount
+
+    async def open(self, amount: float) -> bool:
+        return await self.strategy.open_position(amount, self)
+
+    def release(self, amount: float = None):
+        self.strategy.release(amount, self)
+
+    async def update_amount(self, result: str, amount: float, profit_or_loss: float, payout: float, trade_id=None):
+        return await self.strategy.update_amount(result, amount, profit_or_loss, payout, self, trade_id)
+
+    def checkpoint(self):
+        """تسجيل حالة السلم في سجل الصفقات بعد تعديلها خارج update_amount."""
+        if self.strategy.journal is not None:
+            self.strategy.journal.ladder(self)
@@ -0,0 +1,166 @@
+import logging
+import math
+import time
+from contextlib import contextmanager
+
+# إعدادات التسجيل
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[logging.FileHandler('errors.log', mode='a', encoding='utf-8')]
+)
+
+# حدود الـ buckets بالثواني: من 1 ms (إرسال الأمر) حتى دقائق (معالجة الإشارة كاملة)
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 900.0)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=()) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs += [f'{name}="{_escape(value)}"' for name, value in extra]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.series = {}
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels.get(name, "")) for name in self.labels)
+
+
+class Counter(Metric):
+    """Monotonic counter, one series per label combination."""
+
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        self.series[key] = self.series.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self.series.get(self._key(labels), 0)
+
+    def render(self) -> list:
+        return [f"{self.name}{_format_labels(self.labels, key)} {_format_value(value)}" for key, value in sorted(self.series.items())]
+
+
+class Histogram(Metric):
+    """Cumulative-bucket histogram in the Prometheus layout (_bucket, _sum, _count)."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        series = self.series.get(key)
+        if series is None:
+            series = self.series[key] = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                series["counts"][index] += 1
+                break
+        series["sum"] += value
+        series["count"] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """قياس زمن كتلة كود: with stage_seconds.time(stage="buy"): ..."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self) -> list:
+        lines = []
+        for key, series in sorted(self.series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, series["counts"]):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, [('le', _format_value(bound))])} {cumulative}")
+            lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, [('le', '+Inf')])} {series['count']}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {_format_value(series['sum'])}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {series['count']}")
+        return lines
+
+
+class MetricsRegistry:
+    """Holds every metric of the process and renders them as Prometheus text.
+
+    `counter` and `histogram` return the existing metric when the name is
+    already registered, so modules can declare the metrics they record
+    without import-order concerns.
+    """
+
+    def __init__(self):
+        self.metrics = {}
+
+    def _register(self, cls, name, help, labels, **options):
+        metric = self.metrics.get(name)
+        if metric is None:
+            metric = self.metrics[name] = cls(name, help, labels, **options)
+        elif not isinstance(metric, cls):
+            raise ValueError(f"Metric {name} already registered as a {metric.kind}")
+        return metric
+
+    def counter(self, name: str, help: str, labels=()) -> Counter:
+        return self._register(Counter, name, help, labels)
+
+    def histogram(self, name: str, help: str, labels=(), buckets=LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram, name, help, labels, buckets=buckets)
+
+    def render(self) -> str:
+        lines = []
+        for name, metric in sorted(self.metrics.items()):
+            lines.append(f"# HELP {name} {metric.help}")
+            lines.append(f"# TYPE {name} {metric.kind}")
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def handle(self, params):
+        """معالج GET /metrics في لوحة التحكم."""
+        return 200, self.render(), CONTENT_TYPE
+
+
+metrics = MetricsRegistry()
+
+# المقاييس المشتركة بين الوحدات
+stage_seconds = metrics.histogram(
+    "roadbot_stage_seconds",
+    "Latency of each signal and trade stage in seconds",
+    labels=("stage",),
+)
+signals_total = metrics.counter(
+    "roadbot_signals_total",
+    "Signals accepted or rejected, by reason (trade-path reasons count once per account)",
+    labels=("outcome", "reason"),
+)
+trades_total = metrics.counter(
+    "roadbot_trades_total",
+    "Trades by result",
+    labels=("result",),
+)
+reconnects_total = metrics.counter(
+    "roadbot_reconnects_total",
+    "PocketOption reconnects by account",
+    labels=("account",),
+)
@@ -0,0 +1,140 @@
+import asyncio
+import logging
+from . import clock
+from .symbol_catalog import SymbolCatalog
+
+# إعدادات التسجيل
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[logging.FileHandler('errors.log', mode='a', encoding='utf-8')]
+)
+
+# عمر البيانات المقبول: ثلاث دورات من keep_alive (كل 15 ثانية)
+PAYOUT_MAX_AGE = 45.0
+
+
+class PayoutEntry:
+    __slots__ = ("symbol", "payout", "updated_at")
+
+    def __init__(self, symbol: str, payout: float, updated_at: float):
+        self.symbol = symbol
+        self.payout = payout
+        self.updated_at = updated_at
+
+
+class PayoutIndex:
+    """In-memory payout map fed by the keep_alive loop.
+
+    Entries are keyed by the lower-cased API symbol and `catalog` maps any
+    spelling of a symbol to its API symbol, so a read is two dict lookups.
+    Each entry keeps the time it was last seen; reads older than `max_age`
+    count as misses so the caller falls back to the network.
+    Listeners registered with `add_listener` are called with
+    (symbol, old_payout, new_payout) whenever a payout changes, appears
+    (old is None) or disappears (new is None).
+    """
+
+    def __init__(self, max_age: float = PAYOUT_MAX_AGE):
+        self.max_age = max_age
+        self.entries = {}
+        self.catalog = SymbolCatalog()
+        self.refreshed_at = None
+        self.listeners = []
+        self.refreshes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def add_listener(self, callback):
+        """callback(symbol, old_payout, new_payout) — دالة عادية أو coroutine."""
+        self.listeners.append(callback)
+
+    def _notify(self, symbol, old, new):
+        for callback in self.listeners:
+            try:
+                result = callback(symbol, old, new)
+                if asyncio.iscoroutine(result):
+                    asyncio.ensure_future(result)
+            except Exception as e:
+                logging.error(f"Payout listener failed for {symbol}: {str(e)}")
+
+    def update(self, full_payout: dict) -> int:
+        """تحديث الفهرس من استجابة client.payout() كاملة؛ يعيد عدد التغييرات."""
+        if not full_payout:
+            return 0
+        now = clock.monotonic()
+        changes = 0
+        seen = set()
+        for symbol, value in full_payout.items():
+            try:
+                payout = float(value)
+            except (TypeError, ValueError):
+                continue
+            key = symbol.lower()
+            seen.add(key)
+            entry = self.entries.get(key)
+            if entry is None:
+                self.entries[key] = PayoutEntry(symbol, payout, now)
+                if self.refreshed_at is not None:
+                    changes += 1
+                    self._notify(symbol, None, payout)
+                continue
+            entry.updated_at = now
+            if entry.payout != payout:
+                old, entry.payout = entry.payout, payout
+                changes += 1
+                self._notify(symbol, old, payout)
+        # الأصول التي اختفت من الاستجابة أصبحت غير نشطة
+        for key in [k for k in self.entries if k not in seen]:
+            entry = self.entries.pop(key)
+            changes += 1
+            self._notify(entry.symbol, entry.payout, None)
+        self.catalog.rebuild(entry.symbol for entry in self.entries.values())
+        self.refreshed_at = now
+        self.refreshes += 1
+        return changes
+
+    def clear(self):
+        self.entries = {}
+        self.catalog = SymbolCatalog()
+        self.refreshed_at = None
+
+    async def refresh(self, client) -> int:
+        return self.update(await client.payout())
+
+    @property
+    def is_fresh(self) -> bool:
+        return self.refreshed_at is not None and clock.monotonic() - self.refreshed_at < self.max_age
+
+    def get(self, symbol: str):
+        """Return the fresh PayoutEntry for an API symbol (any case), or None."""
+        entry = self.entries.get(symbol.lower())
+        if entry is None or clock.monotonic() - entry.updated_at >= self.max_age:
+            return None
+        return entry
+
+    def lookup(self, symbol: str):
+        """العائد لأي صيغة من صيغ الرمز.
+
+        Returns (hit, entry): hit is False when the index is stale and the
+        caller must ask the API; entry is None for a fresh index that does
+        not list the symbol (the asset is inactive).
+        """
+        if not self.is_fresh:
+            self.misses += 1
+            return False, None
+        self.hits += 1
+        api_symbol = self.catalog.resolve(symbol)
+        return True, self.get(api_symbol) if api_symbol is not None else None
+
+    def stats(self) -> dict:
+        return {
+            "symbols": len(self.entries),
+            "age": round(clock.monotonic() - self.refreshed_at, 1) if self.refreshed_at is not None else None,
+            "refreshes": self.refreshes,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+payout_index = PayoutIndex()
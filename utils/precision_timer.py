@@ -0,0 +1,65 @@
+import asyncio
+import logging
+from collections import deque
+from . import clock
+
+# إعدادات التسجيل
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[logging.FileHandler('errors.log', mode='a', encoding='utf-8')]
+)
+
+# الاستيقاظ قبل الموعد بهذا الهامش لتغطية دقة مؤقت الحلقة (حوالي 15.6 ms على Windows)
+COARSE_MARGIN = 0.02
+# آخر جزء من الانتظار يُنفذ بحلقة دوران مباشرة على الساعة الرتيبة
+SPIN_WINDOW = 0.002
+
+
+class PrecisionTimer:
+    """Sleeps until an absolute clock.time() target with millisecond accuracy.
+
+    The wait is split in three: an ordinary asyncio sleep until
+    `coarse_margin` before the target, a cooperative spin (yielding to the
+    loop) until `spin_window` before it, and a tight spin on the monotonic
+    clock for the rest. Under a virtual clock (replay) it just sleeps. The
+    distance between each actual fire and its target is recorded.
+    """
+
+    def __init__(self, coarse_margin: float = COARSE_MARGIN, spin_window: float = SPIN_WINDOW, history: int = 200):
+        self.coarse_margin = coarse_margin
+        self.spin_window = spin_window
+        self.drifts = deque(maxlen=history)
+        self.fired = 0
+
+    async def sleep_until(self, target: float) -> float:
+        """الانتظار حتى target (بتوقيت clock.time())؛ يعيد الانحراف بالثواني (موجب = متأخر)."""
+        remaining = target - clock.time()
+        if clock.get_clock().virtual:
+            if remaining > 0:
+                await asyncio.sleep(remaining)
+        elif remaining > 0:
+            # التحويل إلى الساعة الرتيبة مرة واحدة حتى لا يؤثر تعديل ساعة النظام على الدوران
+            deadline = clock.monotonic() + remaining
+            if remaining > self.coarse_margin:
+                await asyncio.sleep(remaining - self.coarse_margin)
+            while deadline - clock.monotonic() > self.spin_window:
+                await asyncio.sleep(0)
+            while clock.monotonic() < deadline:
+                pass
+        drift = clock.time() - target
+        self.fired += 1
+        self.drifts.append(drift)
+        logging.info(f"Precision timer fired {drift * 1000:+.2f} ms from target")
+        return drift
+
+    def stats(self) -> dict:
+        drifts = [abs(drift) for drift in self.drifts]
+        return {
+            "fired": self.fired,
+            "drift_ms_avg": round(sum(drifts) / len(drifts) * 1000, 3) if drifts else None,
+            "drift_ms_max": round(max(drifts) * 1000, 3) if drifts else None,
+        }
+
+
+precision_timer = PrecisionTimer()
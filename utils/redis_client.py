@@ -1,6 +1,6 @@
-import redis
 import json
 import logging
+import threading
 import time
 
 logging.basicConfig(
@@ -9,26 +9,86 @@ logging.basicConfig(
     handlers=[logging.FileHandler('errors.log', mode='a', encoding='utf-8')]
 )
 
+# Redis محلي يرد خلال أجزاء من الثانية؛ مهلة قصيرة حتى لا يتأخر مسار الصفقة إذا تعطل
+CONNECT_TIMEOUT = 0.5
+# بعد فشل الاتصال لا نحاول مرة أخرى قبل هذه المدة (ثوانٍ)؛ حتى ذلك الحين يُستخدم التخزين المحلي فقط
+RETRY_BACKOFF = 60.0
+
 class RedisClient:
-    def __init__(self, host='localhost', port=6379, db=0):
+    def __init__(self, host='localhost', port=6379, db=0, prefix=''):
+        self.prefix = prefix  # بادئة المفاتيح، تستخدمها إعادة التشغيل المحاكاة لعزل بياناتها
+        self.host = host
+        self.port = port
+        self.db = db
+        self._client = None
+        self._connecting = False
+        self._failed_at = None
+        self._lock = threading.Lock()
+        self.local_cache = {}  # تحسين: إضافة قاموس للتخزين المؤقت المحلي
+        self.cache_timestamps = {}  # تحسين: تتبع أوقات التخزين المؤقت
+
+    @property
+    def client(self):
+        """Redis client, or None while it is connecting or unavailable.
+
+        The first use starts the connection in a background thread, never on
+        the event loop. A failed connection is remembered and retried only
+        after RETRY_BACKOFF seconds; until then callers fall back to the
+        local cache.
+        """
+        if self._client is None:
+            self._start_connect()
+        return self._client
+
+    def _start_connect(self):
+        with self._lock:
+            if self._connecting:
+                return
+            if self._failed_at is not None and time.monotonic() - self._failed_at < RETRY_BACKOFF:
+                return
+            self._connecting = True
+        threading.Thread(target=self._connect, name="redis-connect", daemon=True).start()
+
+    def _connect(self):
         try:
-            self.client = redis.Redis(host=host, port=port, db=db, decode_responses=True)
-            self.client.ping()
+            import redis
+            from redis.backoff import NoBackoff
+            from redis.retry import Retry
+            client = redis.Redis(
+                host=self.host, port=self.port, db=self.db, decode_responses=True,
+                socket_connect_timeout=CONNECT_TIMEOUT, socket_timeout=CONNECT_TIMEOUT,
+                retry_on_timeout=False, retry=Retry(NoBackoff(), 0),
+            )
+            client.ping()
+            self._client = client
+            self._failed_at = None
             logging.info("Connected to Redis successfully")
-            self.local_cache = {}  # تحسين: إضافة قاموس للتخزين المؤقت المحلي
-            self.cache_timestamps = {}  # تحسين: تتبع أوقات التخزين المؤقت
-        except redis.ConnectionError as e:
-            logging.error(f"Failed to connect to Redis: {str(e)}")
-            raise
+        except Exception as e:
+            self._failed_at = time.monotonic()
+            logging.error(f"Failed to connect to Redis, retrying in {RETRY_BACKOFF:.0f}s: {str(e)}")
+        finally:
+            self._connecting = False
+
+    def _drop(self, e):
+        """Redis توقف أثناء العمل: نتركه حتى انقضاء مهلة إعادة المحاولة."""
+        if isinstance(e, ValueError):  # قيمة JSON تالفة لا تعني أن Redis متوقف
+            return
+        self._client = None
+        self._failed_at = time.monotonic()
+        logging.error(f"Redis unavailable, retrying in {RETRY_BACKOFF:.0f}s: {str(e)}")
 
     def set_data(self, key: str, value: dict, ttl: int = 180):  # تحسين: تغيير TTL إلى 3 دقائق (180 ثانية)
         """Store data in Redis with TTL and update local cache."""
         try:
             self.local_cache[key] = value  # تحسين: تخزين في الذاكرة المحلية
             self.cache_timestamps[key] = time.time()  # تحسين: تسجيل وقت التخزين
-            self.client.setex(key, ttl, json.dumps(value))
+            client = self.client
+            if client is None:
+                return
+            client.setex(self.prefix + key, ttl, json.dumps(value))
             logging.info(f"Stored data in Redis for key: {key}")
         except Exception as e:
+            self._drop(e)
             logging.error(f"Failed to set data in Redis for key {key}: {str(e)}")
 
     def get_data(self, key: str) -> dict:
@@ -39,7 +99,10 @@ class RedisClient:
                 logging.info(f"Retrieved data from local cache for key: {key}")
                 return self.local_cache[key]
             
-            data = self.client.get(key)
+            client = self.client
+            if client is None:
+                return None
+            data = client.get(self.prefix + key)
             if data:
                 value = json.loads(data)
                 self.local_cache[key] = value  # تحسين: تحديث التخزين المؤقت المحلي
@@ -48,7 +111,22 @@ class RedisClient:
                 return value
             return None
         except Exception as e:
+            self._drop(e)
             logging.error(f"Failed to get data from Redis for key {key}: {str(e)}")
             return None
 
+    def delete_data(self, key: str):
+        """Remove a key from the local cache and Redis."""
+        try:
+            self.local_cache.pop(key, None)
+            self.cache_timestamps.pop(key, None)
+            client = self.client
+            if client is None:
+                return
+            client.delete(self.prefix + key)
+            logging.info(f"Deleted data in Redis for key: {key}")
+        except Exception as e:
+            self._drop(e)
+            logging.error(f"Failed to delete data in Redis for key {key}: {str(e)}")
+
 redis_client = RedisClient()
\ No newline at end of file
@@ -0,0 +1,444 @@
+"""Offline replay of historical signals through the real trade path.
+
+Signals from signals_log.csv (written by Logger.log_signal) or from a raw
+text dump of channel messages are fed through SignalQueue -> handle_signal
+-> prepare_trade -> safe_execute_trade against SimulatedPocketOption, on an
+event loop whose clock jumps straight to the next timer instead of
+sleeping. A day of signals replays in seconds.
+
+Usage: python -m utils.replay signals_log.csv [--win-rate 0.55] [--seed 1]
+"""
+import argparse
+import asyncio
+import csv
+import logging
+import random
+import re
+import selectors
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from . import clock
+from .martingale_strategy import MartingaleStrategy
+from .redis_client import redis_client
+from .signal_parsers import build_parser_registry
+from .signal_queue import SignalQueue
+from .entry_scheduler import entry_scheduler
+from .precision_timer import precision_timer
+from .connectivity import connectivity_monitor
+from .payout_index import payout_index
+from .balance_ledger import ledger_for
+from .trade_modules.message_handling import handle_signal
+from .trade_modules.order_tracking import order_acks, result_tracker
+from .trade_modules.trade_utils import SIGNAL_TIMEZONE, normalize_symbol, seconds_until_entry, validate_trade_time
+from .config_manager import load_martingale_settings
+
+# إعدادات التسجيل
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[logging.FileHandler('errors.log', mode='a', encoding='utf-8')]
+)
+
+# المدة بين وصول الإشارة ووقت الدخول عندما لا يحدد المصدر وقت الوصول
+DEFAULT_LEAD = 30.0
+# صفوف السجل لنفس الرمز والاتجاه خلال هذه المدة تعتبر إشارة واحدة (صفوف المارتينجال)
+MERGE_WINDOW = 600.0
+
+
+class VirtualClockSelector:
+    """Selector wrapper that advances virtual time instead of blocking.
+
+    While executor jobs (asyncio.to_thread) are in flight it waits for real,
+    so thread results are never overtaken by a jump in virtual time.
+    """
+
+    def __init__(self, selector, loop):
+        self._selector = selector
+        self._loop = loop
+
+    def select(self, timeout=None):
+        events = self._selector.select(0)
+        if events or timeout == 0:
+            return events
+        if timeout is None or self._loop.executor_jobs:
+            return self._selector.select(timeout)
+        self._loop.advance(timeout)
+        return events
+
+    def __getattr__(self, name):
+        return getattr(self._selector, name)
+
+
+class VirtualTimeLoop(asyncio.SelectorEventLoop):
+    """حلقة أحداث بوقت افتراضي: asyncio.sleep لا ينتظر فعليًا."""
+
+    def __init__(self):
+        super().__init__(selectors.DefaultSelector())
+        self._virtual_time = 0.0
+        self.executor_jobs = 0
+        self._selector = VirtualClockSelector(self._selector, self)
+
+    def time(self):
+        return self._virtual_time
+
+    def advance(self, seconds: float):
+        if seconds > 0:
+            self._virtual_time += seconds
+
+    def run_in_executor(self, executor, func, *args):
+        future = super().run_in_executor(executor, func, *args)
+        self.executor_jobs += 1
+
+        def done(_):
+            self.executor_jobs -= 1
+
+        future.add_done_callback(done)
+        return future
+
+
+class VirtualClock:
+    """ساعة مرتبطة بوقت الحلقة الافتراضي، تبدأ من epoch المحدد."""
+
+    virtual = True
+
+    def __init__(self, loop: VirtualTimeLoop, epoch: float):
+        self.loop = loop
+        self.epoch = epoch
+
+    def time(self) -> float:
+        return self.epoch + self.loop.time()
+
+    def monotonic(self) -> float:
+        return self.loop.time()
+
+    def now(self, tz=None) -> datetime:
+        return datetime.fromtimestamp(self.time(), tz)
+
+
+def api_symbol(symbol: str) -> str:
+    """تحويل رمز الإشارة إلى صيغة رموز API (مثل EURUSD_otc)."""
+    normalized = normalize_symbol(symbol)
+    if normalized.endswith("_otc"):
+        return normalized[:-4].upper() + "_otc"
+    return normalized.upper()
+
+
+class SimulatedPocketOption:
+    """Stand-in for PocketOptionAsync with the calls the trade path uses.
+
+    Results are drawn from a seeded RNG with `win_rate`/`tie_rate`, and every
+    call costs `latency` seconds of virtual time.
+    """
+
+    def __init__(self, balance: float = 1000.0, symbols=(), payout: float = 85.0, win_rate: float = 0.5,
+                 tie_rate: float = 0.02, latency: float = 0.05, result_delay: float = 0.5, seed: int = 0):
+        self.ssid = None
+        self._balance = float(balance)
+        self.payouts = {api_symbol(symbol): payout for symbol in symbols}
+        self.win_rate = win_rate
+        self.tie_rate = tie_rate
+        self.latency = latency
+        self.result_delay = result_delay
+        self.random = random.Random(seed)
+        self.trades = {}
+        self.orders = []
+
+    async def _roundtrip(self):
+        await asyncio.sleep(self.latency)
+
+    async def balance(self):
+        await self._roundtrip()
+        return self._balance
+
+    async def payout(self):
+        await self._roundtrip()
+        return dict(self.payouts)
+
+    async def _open(self, direction, asset, amount, duration):
+        sent_at = clock.time()
+        await self._roundtrip()
+        if asset not in self.payouts:
+            raise ValueError(f"Unknown asset {asset}")
+        if amount > self._balance:
+            raise ValueError("Insufficient balance")
+        trade_id = str(uuid.uuid4())
+        self._balance -= amount
+        trade = {
+            "id": trade_id,
+            "asset": asset,
+            "amount": amount,
+            "direction": direction,
+            "openTime": sent_at,
+            "closeTime": sent_at + duration,
+        }
+        self.trades[trade_id] = trade
+        self.orders.append(trade)
+        return trade_id, trade
+
+    async def buy(self, asset, amount, time, check_win=False):
+        return await self._open("call", asset, amount, time)
+
+    async def sell(self, asset, amount, time, check_win=False):
+        return await self._open("put", asset, amount, time)
+
+    async def opened_deals(self):
+        await self._roundtrip()
+        return [dict(trade) for trade in self.trades.values() if "result" not in trade]
+
+    def _settle(self, trade):
+        """سحب نتيجة الصفقة مرة واحدة عند إغلاقها."""
+        if "result" in trade:
+            return
+        roll = self.random.random()
+        if roll < self.tie_rate:
+            trade["result"], trade["profit"] = "tie", 0.0
+            self._balance += trade["amount"]
+        elif roll < self.tie_rate + self.win_rate:
+            profit = trade["amount"] * self.payouts[trade["asset"]] / 100
+            trade["result"], trade["profit"] = "win", profit
+            self._balance += trade["amount"] + profit
+        else:
+            trade["result"], trade["profit"] = "loss", -trade["amount"]
+        trade["resultTime"] = clock.time()
+
+    async def closed_deals(self):
+        await self._roundtrip()
+        now = clock.time()
+        for trade in self.trades.values():
+            if trade["closeTime"] + self.result_delay <= now:
+                self._settle(trade)
+        return [dict(trade) for trade in self.trades.values() if "result" in trade]
+
+    async def check_win(self, trade_id):
+        trade = self.trades[trade_id]
+        if "result" not in trade:
+            await asyncio.sleep(max(trade["closeTime"] - clock.time(), 0) + self.result_delay)
+            self._settle(trade)
+        return dict(trade)
+
+    async def disconnect(self):
+        return None
+
+
+class ReplayLogger:
+    """نفس واجهة Logger لكن في الذاكرة، حتى لا تختلط السجلات الحقيقية بالمحاكاة."""
+
+    def __init__(self):
+        self.signals = []
+        self.trades = []
+
+    def debug(self, message):
+        logging.debug(message)
+
+    def info(self, message):
+        logging.info(message)
+
+    def warning(self, message):
+        logging.warning(message)
+
+    def error(self, message):
+        logging.error(message)
+
+    def log_signal(self, symbol, trade_time, direction, signal_score, accepted, candle_direction=None, candle_confidence=None):
+        signal_id = str(uuid.uuid4())
+        self.signals.append({"id": signal_id, "time": clock.time(), "symbol": symbol, "trade_time": trade_time,
+                             "direction": direction, "accepted": accepted})
+        return signal_id
+
+    def log_trade(self, signal_id, symbol, trade_type, amount, result, balance, signal_score=0):
+        self.trades.append({"signal_id": signal_id, "time": clock.time(), "symbol": symbol, "direction": trade_type,
+                            "amount": amount, "result": result, "balance": balance})
+
+
+def entry_datetime(day: datetime, trade_time_exact: str) -> datetime:
+    return SIGNAL_TIMEZONE.localize(datetime.strptime(trade_time_exact, "%H:%M:%S").replace(
+        year=day.year, month=day.month, day=day.day
+    ))
+
+
+def load_signals_csv(path: str, lead: float = DEFAULT_LEAD, merge_window: float = MERGE_WINDOW) -> list:
+    """قراءة signals_log.csv وتحويله إلى إشارات بأوقات وصول.
+
+    The log has one row per log_signal call, so a single signal shows up
+    several times (prepare_trade, handle_signal, every martingale step).
+    Rows for the same symbol and direction within `merge_window` seconds of
+    the first one are collapsed. The "Trade Time" column holds either the
+    HH:MM:SS entry time or the duration; in the latter case the row
+    timestamp is taken as the entry time.
+    """
+    signals = []
+    last_seen = {}
+    with open(path, newline='', encoding='utf-8') as file:
+        for row in csv.DictReader(file):
+            symbol = (row.get("Symbol") or "").strip()
+            direction = (row.get("Direction") or "").strip().lower()
+            trade_time = (row.get("Trade Time") or "").strip()
+            if not symbol or direction not in ("call", "put") or symbol == "None":
+                continue
+            try:
+                logged_at = datetime.fromisoformat(row["Timestamp"]).astimezone(SIGNAL_TIMEZONE)
+            except (KeyError, ValueError):
+                continue
+            if validate_trade_time(trade_time):
+                entry = entry_datetime(logged_at, trade_time)
+                if entry < logged_at - timedelta(hours=12):
+                    entry += timedelta(days=1)
+                duration = "M1"
+            else:
+                entry = logged_at.replace(microsecond=0)
+                duration = trade_time.upper() if trade_time.upper().startswith("M") else "M1"
+            key = (symbol.upper(), direction)
+            first = last_seen.get(key)
+            if first is not None and abs((entry - first).total_seconds()) < merge_window:
+                continue
+            last_seen[key] = entry
+            signals.append({
+                "arrival": entry.timestamp() - lead,
+                "message": {"symbol": symbol, "duration": duration, "time": entry.strftime("%H:%M:%S"), "direction": direction},
+            })
+    signals.sort(key=lambda signal: signal["arrival"])
+    return signals
+
+
+def load_signals_text(path: str, lead: float = DEFAULT_LEAD, start_date: datetime = None, config: dict = None) -> list:
+    """قراءة تفريغ نصي لرسائل القناة (رسالة لكل فقرة) وتحليله بسجل الصيغ."""
+    registry = build_parser_registry(config)
+    with open(path, encoding='utf-8') as file:
+        blocks = re.split(r"\n\s*\n", file.read())
+    day = start_date or datetime.now(SIGNAL_TIMEZONE)
+    previous = None
+    signals = []
+    for block in blocks:
+        message, _ = registry.parse(None, block)
+        if message is None:
+            continue
+        entry = entry_datetime(day, message["time"])
+        if previous is not None and entry < previous - timedelta(hours=1):
+            # الوقت رجع إلى الخلف: انتقلنا إلى اليوم التالي
+            day += timedelta(days=1)
+            entry += timedelta(days=1)
+        previous = entry
+        signals.append({"arrival": entry.timestamp() - lead, "message": message})
+    return signals
+
+
+def load_signals(path: str, lead: float = DEFAULT_LEAD) -> list:
+    if path.lower().endswith(".csv"):
+        return load_signals_csv(path, lead)
+    return load_signals_text(path, lead)
+
+
+async def run_replay(signals: list, settings: dict, client: SimulatedPocketOption, serial: bool = False) -> dict:
+    """Feed the signals at their virtual arrival times and wait for all trades to settle."""
+    logger = ReplayLogger()
+    strategy = MartingaleStrategy(settings, await client.balance())
+    strategy.is_active = True
+    entry_lags = []
+
+    async def signal_handler(message):
+        if not strategy.is_active:
+            return
+        orders_before = len(client.orders)
+        await handle_signal(client, message, strategy, logger)
+        # أوامر الرموز الأخرى تتداخل معها: أول أمر لنفس الأصل فقط
+        asset = api_symbol(message.get("symbol"))
+        new_orders = [order for order in client.orders[orders_before:] if order["asset"] == asset]
+        remaining = seconds_until_entry(message.get("time"), datetime.fromtimestamp(new_orders[0]["openTime"], SIGNAL_TIMEZONE)) if new_orders else None
+        if remaining is not None:
+            entry_lags.append(-remaining)
+
+    async def keep_payouts_fresh():
+        # مثل main.keep_alive: تحديث فهرس العوائد كل 15 ثانية
+        while True:
+            payout_index.update(await client.payout())
+            await asyncio.sleep(15)
+
+    feeder = asyncio.ensure_future(keep_payouts_fresh())
+    queue = SignalQueue(signal_handler, time_to_deadline=lambda message: seconds_until_entry(message.get("time")),
+                        lane_key=(lambda message: "") if serial else None)
+    queue.start()
+    for signal in signals:
+        delay = signal["arrival"] - clock.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        await queue.submit(dict(signal["message"]))
+    await queue.join()
+    await queue.stop()
+    await entry_scheduler.stop()
+    await result_tracker.stop()
+    feeder.cancel()
+    await asyncio.gather(feeder, return_exceptions=True)
+
+    results = [trade["result"] for trade in logger.trades]
+    return {
+        "signals": len(signals),
+        "orders": len(client.orders),
+        "wins": results.count("win"),
+        "losses": results.count("loss"),
+        "ties": results.count("tie"),
+        "failed": results.count("failed"),
+        "initial_balance": strategy.initial_balance,
+        "final_balance": await client.balance(),
+        "entry_lag_avg": sum(entry_lags) / len(entry_lags) if entry_lags else 0.0,
+        "entry_lag_max": max(entry_lags) if entry_lags else 0.0,
+        "refused_steps": strategy.rejected_steps,
+        "ledger": ledger_for(client).stats(),
+        "acks": order_acks.stats(),
+        "results": result_tracker.stats(),
+        "timer": precision_timer.stats(),
+        "queue": queue.stats(),
+    }
+
+
+def replay(signals: list, settings: dict, serial: bool = False, **client_options) -> dict:
+    """تشغيل إعادة التشغيل على حلقة الوقت الافتراضي وإرجاع الملخص."""
+    if not signals:
+        return {"signals": 0}
+    symbols = {signal["message"]["symbol"] for signal in signals}
+    loop = VirtualTimeLoop()
+    previous_clock = clock.set_clock(VirtualClock(loop, signals[0]["arrival"] - 1.0))
+    previous_prefix = redis_client.prefix
+    redis_client.prefix = "replay:"
+    connectivity_monitor.simulate(True)
+    payout_index.clear()
+    started = time.perf_counter()
+    try:
+        client = SimulatedPocketOption(symbols=symbols, **client_options)
+        summary = loop.run_until_complete(run_replay(signals, settings, client, serial))
+        summary["payout_index"] = payout_index.stats()
+    finally:
+        loop.close()
+        clock.set_clock(previous_clock)
+        redis_client.prefix = previous_prefix
+        connectivity_monitor.simulate(None)
+        payout_index.clear()
+    summary["virtual_seconds"] = loop.time()
+    summary["real_seconds"] = time.perf_counter() - started
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay historical signals against a simulated PocketOption client")
+    parser.add_argument("path", help="signals_log.csv or a text dump of channel messages")
+    parser.add_argument("--lead", type=float, default=DEFAULT_LEAD, help="seconds between signal arrival and entry time")
+    parser.add_argument("--balance", type=float, default=1000.0)
+    parser.add_argument("--payout", type=float, default=85.0)
+    parser.add_argument("--win-rate", type=float, default=0.5)
+    parser.add_argument("--latency", type=float, default=0.05, help="simulated round-trip per API call, seconds")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--serial", action="store_true", help="one signal at a time across all symbols (default: one lane per symbol)")
+    args = parser.parse_args()
+
+    settings = load_martingale_settings() or {"amount": 1.0, "multiplier": 2.0, "profit": 1e9, "loss": 1e9, "max_loss_count": 4, "payout": 70.0}
+    signals = load_signals(args.path, args.lead)
+    summary = replay(signals, settings, serial=args.serial, balance=args.balance, payout=args.payout, win_rate=args.win_rate,
+                     latency=args.latency, seed=args.seed)
+    print("\n📼 Replay summary:")
+    for key, value in summary.items():
+        print(f"  {key}: {value}")
+
+
+if __name__ == "__main__":
+    main()
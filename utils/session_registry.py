@@ -0,0 +1,108 @@
+import asyncio
+import logging
+from . import clock
+from .balance_ledger import ledger_for
+from .connection_supervisor import ConnectionSupervisor
+
+# إعدادات التسجيل
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[logging.FileHandler('errors.log', mode='a', encoding='utf-8')]
+)
+
+# مدة صلاحية نتيجة التحقق من SSID قبل قراءة الرصيد مرة أخرى
+VALIDITY_TTL = 600.0
+VALIDATE_RETRY_DELAY = 1.5
+
+
+class SessionRegistry:
+    """One authenticated, supervised client per SSID for the whole run.
+
+    `open` validates an SSID by reading the balance on a new
+    ConnectionSupervisor client and keeps that client, so the login check,
+    main and the account pool share one WebSocket handshake. The result
+    of the check is cached for `ttl` seconds. An SSID that failed is not
+    retried until its entry expires, and an SSID that passed is not read
+    again. The balance read during the check seeds the balance ledger.
+    """
+
+    def __init__(self, ttl: float = VALIDITY_TTL):
+        self.ttl = ttl
+        self.clients = {}
+        self.validity = {}
+        self.balances = {}
+        self.locks = {}
+        self.handshakes = 0
+        self.hits = 0
+
+    def cached(self, ssid: str):
+        """True/False إذا كانت نتيجة التحقق ما زالت صالحة، وإلا None."""
+        entry = self.validity.get(ssid)
+        if entry is None or clock.monotonic() - entry[1] >= self.ttl:
+            return None
+        return entry[0]
+
+    async def open(self, ssid: str, name: str = "account", retries: int = 1, retry_delay: float = VALIDATE_RETRY_DELAY):
+        """The validated client for `ssid` (created on first use), or None if the SSID does not work."""
+        lock = self.locks.setdefault(ssid, asyncio.Lock())
+        async with lock:
+            valid = self.cached(ssid)
+            if valid is not None:
+                self.hits += 1
+                return self.clients.get(ssid) if valid else None
+            client = self.clients.get(ssid)
+            if client is None:
+                client = ConnectionSupervisor(ssid, name).client
+                self.handshakes += 1
+            for attempt in range(retries):
+                try:
+                    balance = await client.balance()
+                    if balance is not None and balance >= 0:
+                        ledger_for(client).observe(balance)
+                        self.clients[ssid] = client
+                        self.balances[ssid] = balance
+                        self.validity[ssid] = (True, clock.monotonic())
+                        logging.info(f"SSID for {name} is valid, balance: {balance:.2f}")
+                        return client
+                    logging.warning(f"{name}: invalid balance (attempt {attempt + 1}/{retries}): {balance}")
+                except Exception as e:
+                    logging.error(f"{name}: SSID check failed (attempt {attempt + 1}/{retries}): {str(e)}")
+                if attempt < retries - 1:
+                    await asyncio.sleep(retry_delay)
+            self.validity[ssid] = (False, clock.monotonic())
+            self.clients.pop(ssid, None)
+            try:
+                await client.disconnect()
+            except Exception:
+                pass
+            return None
+
+    async def validate(self, ssid: str, name: str = "account") -> bool:
+        return await self.open(ssid, name) is not None
+
+    def balance(self, ssid: str):
+        """الرصيد المقروء عند التحقق (None إذا لم يُتحقق من SSID)."""
+        return self.balances.get(ssid)
+
+    async def discard(self, ssid: str):
+        """إغلاق جلسة SSID ونسيان نتيجة التحقق (مثلاً بعد فشل الاتصال)."""
+        self.validity.pop(ssid, None)
+        self.balances.pop(ssid, None)
+        client = self.clients.pop(ssid, None)
+        if client is not None:
+            try:
+                await client.disconnect()
+            except Exception as e:
+                logging.warning(f"Session disconnect failed: {str(e)}")
+
+    def stats(self) -> dict:
+        return {
+            "sessions": len(self.clients),
+            "handshakes": self.handshakes,
+            "cache_hits": self.hits,
+            "invalid": sum(1 for valid, _ in self.validity.values() if not valid),
+        }
+
+
+session_registry = SessionRegistry()
@@ -0,0 +1,65 @@
+import logging
+import time
+from collections import OrderedDict
+from .signal_queue import symbol_key
+
+# إعدادات التسجيل
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[logging.FileHandler('errors.log', mode='a', encoding='utf-8')]
+)
+
+
+def signal_key(message: dict) -> tuple:
+    """المفتاح الموحد للإشارة: (الرمز، المدة، الوقت، الاتجاه)."""
+    return (
+        symbol_key(message.get("symbol")),
+        str(message.get("duration") or "").upper(),
+        str(message.get("time") or ""),
+        str(message.get("direction") or "").lower(),
+    )
+
+
+class SignalDeduplicator:
+    """Drops reposts of a signal already seen within `window` seconds.
+
+    The index is an OrderedDict in arrival order, so lookups are O(1) and
+    expired keys are evicted from the front on every call.
+    """
+
+    def __init__(self, window: float = 300.0, clock=time.monotonic):
+        self.window = window
+        self.clock = clock
+        self.index = OrderedDict()
+        self.suppressed = {}
+
+    def evict(self, now: float):
+        while self.index:
+            key, (seen_at, _) = next(iter(self.index.items()))
+            if now - seen_at < self.window:
+                break
+            self.index.popitem(last=False)
+
+    def is_duplicate(self, message: dict, channel=None) -> bool:
+        now = self.clock()
+        self.evict(now)
+        key = signal_key(message)
+        seen = self.index.get(key)
+        if seen is not None:
+            self.suppressed[channel] = self.suppressed.get(channel, 0) + 1
+            logging.info(f"Duplicate signal from {channel} suppressed (first seen from {seen[1]}): {message}")
+            return True
+        self.index[key] = (now, channel)
+        return False
+
+    def forget(self, key: tuple):
+        """إزالة مفتاح من الفهرس (مثلًا عند تعديل رسالة الإشارة أو حذفها)."""
+        self.index.pop(key, None)
+
+    def stats(self) -> dict:
+        return {
+            "tracked": len(self.index),
+            "suppressed": dict(self.suppressed),
+            "suppressed_total": sum(self.suppressed.values()),
+        }
@@ -0,0 +1,159 @@
+import re
+import logging
+
+# إعدادات التسجيل
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[logging.FileHandler('errors.log', mode='a', encoding='utf-8')]
+)
+
+DEFAULT_FORMAT = "emoji"
+
+# صيغة القناة الأصلية: 💷 EURUSD-OTC  💎 M1  ⌚️ 12:30:00  🔼 call
+BUILTIN_FORMATS = {
+    "emoji": {
+        "marker": "💷",
+        "pattern": r"💷 (?P<symbol>\S+)\s+💎 (?P<duration>M\d+)\s+⌚️ (?P<time>\d{2}:\d{2}:\d{2})\s+(?P<direction>🔼 call|🔽 put)",
+    },
+}
+
+CALL_WORDS = frozenset(("call", "buy", "up", "higher", "long", "🔼", "⬆", "📈"))
+PUT_WORDS = frozenset(("put", "sell", "down", "lower", "short", "🔽", "⬇", "📉"))
+# كلمات كاملة أو رموز مفردة، حتى لا تطابق "up" كلمة مثل "support"
+_TOKEN = re.compile(r"\w+|[^\w\s]")
+
+# نصوص الاتجاه قليلة ومتكررة؛ الحد يمنع نمو الذاكرة مع صيغ الاتجاه الحرة
+DIRECTION_CACHE_SIZE = 256
+_directions = {}
+
+
+def normalize_direction(raw: str):
+    """تحويل نص الاتجاه إلى call أو put، أو None إذا لم يُعرف أو احتوى الاتجاهين معًا."""
+    if raw in _directions:
+        return _directions[raw]
+    tokens = set(_TOKEN.findall(raw.lower()))
+    is_call = not tokens.isdisjoint(CALL_WORDS)
+    is_put = not tokens.isdisjoint(PUT_WORDS)
+    direction = "call" if is_call and not is_put else "put" if is_put and not is_call else None
+    if len(_directions) >= DIRECTION_CACHE_SIZE:
+        _directions.clear()
+    _directions[raw] = direction
+    return direction
+
+
+class SignalParser:
+    """Parser for one channel layout, compiled once at startup.
+
+    `marker` is a literal that every signal of this layout contains; messages
+    without it are rejected with a single substring search before the regex
+    runs. The marker is compared case-insensitively when the format sets
+    ignore_case, and it may appear anywhere in the message: the pattern is
+    searched from the start of the text. The pattern must define the named
+    groups symbol, duration, time and direction.
+    """
+
+    def __init__(self, name: str, pattern: str, marker: str = None, flags=re.MULTILINE):
+        self.name = name
+        self.marker = marker
+        self.ignore_case = bool(flags & re.IGNORECASE)
+        self.folded_marker = marker.lower() if marker and self.ignore_case else marker
+        self.regex = re.compile(pattern, flags)
+        missing = {"symbol", "duration", "time", "direction"} - set(self.regex.groupindex)
+        if missing:
+            raise ValueError(f"Signal format '{name}' is missing groups: {', '.join(sorted(missing))}")
+        self.parsed = 0
+        self.missed = 0
+
+    def has_marker(self, text: str) -> bool:
+        if not self.marker:
+            return False
+        return self.folded_marker in (text.lower() if self.ignore_case else text)
+
+    def parse(self, text: str):
+        """إرجاع قاموس الإشارة أو None إذا لم تكن الرسالة إشارة."""
+        if not text:
+            return None
+        if self.marker and not self.has_marker(text):
+            return None
+        match = self.regex.search(text)
+        if match is None:
+            if self.marker:
+                # الرسالة تحتوي على العلامة لكنها لا تطابق الصيغة
+                self.missed += 1
+            return None
+        symbol, duration, trade_time, direction = match.group("symbol", "duration", "time", "direction")
+        normalized = normalize_direction(direction)
+        if normalized is None:
+            # اتجاه غير معروف لا يُخمن: صفقة بالاتجاه الخاطئ أسوأ من إشارة ضائعة
+            logging.warning(f"Signal format '{self.name}': unknown direction {direction!r}, message rejected")
+            self.missed += 1
+            return None
+        self.parsed += 1
+        if len(trade_time) == 5:
+            trade_time += ":00"
+        return {
+            "symbol": symbol.strip(),
+            "duration": duration.upper(),
+            "time": trade_time,
+            "direction": normalized,
+        }
+
+
+class SignalParserRegistry:
+    """Maps chat ids to the parsers of the layouts they post."""
+
+    def __init__(self):
+        self.parsers = {}
+        self.bindings = {}
+
+    def register(self, parser: SignalParser):
+        self.parsers[parser.name] = parser
+        return parser
+
+    def bind(self, chat_id, format_names):
+        """ربط معرف المحادثة بصيغة أو أكثر."""
+        if isinstance(format_names, str):
+            format_names = [format_names]
+        unknown = [name for name in format_names if name not in self.parsers]
+        if unknown:
+            raise ValueError(f"Unknown signal format(s): {', '.join(unknown)}")
+        self.bindings[chat_id] = tuple(self.parsers[name] for name in format_names)
+
+    def parsers_for(self, chat_id):
+        return self.bindings.get(chat_id) or tuple(self.parsers.values())
+
+    def parse(self, chat_id, text: str):
+        """Return (message, parser_name), or (None, None) when no parser matched."""
+        for parser in self.parsers_for(chat_id):
+            message = parser.parse(text)
+            if message is not None:
+                return message, parser.name
+        return None, None
+
+    def looks_like_signal(self, chat_id, text: str) -> bool:
+        """True if the text carries the marker of one of the chat's layouts."""
+        return any(parser.has_marker(text) for parser in self.parsers_for(chat_id))
+
+    def stats(self) -> dict:
+        return {name: {"parsed": p.parsed, "missed": p.missed} for name, p in self.parsers.items()}
+
+
+def build_parser_registry(config: dict = None) -> SignalParserRegistry:
+    """بناء السجل من الصيغ المدمجة والصيغ المعرفة في telegram_config.json.
+
+    Custom layouts go under "signal_formats" as
+    {"name": {"pattern": "...", "marker": "...", "ignore_case": false}}; they
+    are compiled here and never again.
+    """
+    registry = SignalParserRegistry()
+    formats = dict(BUILTIN_FORMATS)
+    formats.update((config or {}).get("signal_formats", {}))
+    for name, spec in formats.items():
+        try:
+            flags = re.MULTILINE | (re.IGNORECASE if spec.get("ignore_case") else 0)
+            registry.register(SignalParser(name, spec["pattern"], spec.get("marker"), flags))
+        except (KeyError, re.error, ValueError) as e:
+            logging.error(f"Invalid signal format '{name}': {str(e)}")
+            print(f"⚠️ Invalid signal format '{name}': {str(e)}")
+    return registry
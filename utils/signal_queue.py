@@ -0,0 +1,163 @@
+import asyncio
+import logging
+import time
+from .metrics import signals_total
+
+# إعدادات التسجيل
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[logging.FileHandler('errors.log', mode='a', encoding='utf-8')]
+)
+
+
+def symbol_key(symbol) -> str:
+    """مفتاح موحد للرمز بحيث تذهب كل صيغ نفس الأصل إلى نفس المسار."""
+    return "".join(ch for ch in str(symbol or "").upper() if ch.isalnum())
+
+
+class SignalQueue:
+    """Bounded queue between the Telegram callback and handle_signal.
+
+    Each symbol gets its own lane and worker task, created on its first
+    signal, so signals for one asset run in arrival order (one martingale
+    ladder) while every other asset trades side by side. `lane_key` maps a
+    signal to its lane (symbol_key by default; a constant key serializes
+    everything). `maxsize` bounds the signals waiting across all lanes.
+    `time_to_deadline(message)` returns the seconds left until the signal's
+    entry time (negative once it has passed, None if it has no deadline);
+    a signal later than `max_lateness` is shed instead of being handled.
+    """
+
+    def __init__(self, handler, maxsize: int = 100, time_to_deadline=None, max_lateness: float = 30.0, lane_key=None):
+        self.handler = handler
+        self.maxsize = max(1, int(maxsize))
+        self.time_to_deadline = time_to_deadline
+        self.max_lateness = max_lateness
+        self.lane_key = lane_key or (lambda message: symbol_key(message.get("symbol")))
+        self.lanes = {}
+        self.tasks = {}
+        self.started = False
+        self.accepted = 0
+        self.handled = 0
+        self.failed = 0
+        self.shed = {"queue_full": 0, "deadline": 0}
+        self.dequeued = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def lane_for(self, message: dict) -> asyncio.Queue:
+        """مسار الرمز (يُنشأ عند أول إشارة له، مع عامله إذا بدأ الطابور)."""
+        key = self.lane_key(message)
+        lane = self.lanes.get(key)
+        if lane is None:
+            lane = self.lanes[key] = asyncio.Queue()
+            if self.started:
+                self._spawn(key)
+        return lane
+
+    def is_late(self, message: dict) -> bool:
+        if self.time_to_deadline is None:
+            return False
+        try:
+            remaining = self.time_to_deadline(message)
+        except Exception as e:
+            logging.warning(f"Failed to compute signal deadline for {message}: {str(e)}")
+            return False
+        return remaining is not None and remaining < -self.max_lateness
+
+    def purge_late(self) -> int:
+        """حذف الإشارات التي فات موعدها من كل المسارات لإفساح المجال."""
+        dropped = 0
+        for lane in self.lanes.values():
+            kept = []
+            while not lane.empty():
+                item = lane.get_nowait()
+                lane.task_done()
+                if self.is_late(item[1]):
+                    dropped += 1
+                else:
+                    kept.append(item)
+            for item in kept:
+                lane.put_nowait(item)
+        self._shed("deadline", dropped)
+        return dropped
+
+    def _shed(self, reason: str, count: int = 1):
+        if count:
+            self.shed[reason] += count
+            signals_total.inc(count, outcome="rejected", reason=reason)
+
+    async def submit(self, message: dict) -> bool:
+        """Enqueue a parsed signal without waiting for it to be handled."""
+        if self.is_late(message):
+            self._shed("deadline")
+            logging.warning(f"Signal shed, entry time already passed: {message}")
+            return False
+        if self.depth() >= self.maxsize and not self.purge_late():
+            self._shed("queue_full")
+            logging.error(f"Signal queue full ({self.maxsize} waiting), signal shed: {message}")
+            print(f"⚠️ Signal queue full, skipping {message.get('symbol')}")
+            return False
+        self.lane_for(message).put_nowait((time.monotonic(), message))
+        self.accepted += 1
+        return True
+
+    async def _worker(self, key):
+        lane = self.lanes[key]
+        while True:
+            enqueued_at, message = await lane.get()
+            try:
+                waited = time.monotonic() - enqueued_at
+                self.dequeued += 1
+                self.total_wait += waited
+                self.max_wait = max(self.max_wait, waited)
+                if self.is_late(message):
+                    self._shed("deadline")
+                    logging.warning(f"Signal shed after waiting {waited:.3f}s in queue: {message}")
+                    continue
+                logging.info(f"Signal dequeued by worker {key or '*'} after {waited:.3f}s: {message}")
+                await self.handler(message)
+                self.handled += 1
+            except Exception as e:
+                self.failed += 1
+                logging.error(f"Signal worker {key or '*'} failed on {message}: {str(e)}")
+            finally:
+                lane.task_done()
+
+    def _spawn(self, key):
+        self.tasks[key] = asyncio.create_task(self._worker(key))
+
+    def start(self):
+        if not self.started:
+            self.started = True
+            for key in self.lanes:
+                self._spawn(key)
+
+    async def join(self):
+        """انتظار معالجة كل الإشارات الموجودة في الطابور."""
+        await asyncio.gather(*(lane.join() for lane in list(self.lanes.values())))
+
+    async def stop(self):
+        tasks = list(self.tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self.tasks = {}
+        self.started = False
+
+    def depth(self) -> int:
+        return sum(lane.qsize() for lane in self.lanes.values())
+
+    def stats(self) -> dict:
+        return {
+            "depth": self.depth(),
+            "lanes": len(self.lanes),
+            "lane_depths": {key: lane.qsize() for key, lane in self.lanes.items() if lane.qsize()},
+            "accepted": self.accepted,
+            "handled": self.handled,
+            "failed": self.failed,
+            "shed": dict(self.shed),
+            "avg_wait": self.total_wait / self.dequeued if self.dequeued else 0.0,
+            "max_wait": self.max_wait,
+        }
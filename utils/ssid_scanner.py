@@ -0,0 +1,127 @@
+import json
+import logging
+
+# إعدادات التسجيل
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[logging.FileHandler('errors.log', mode='a', encoding='utf-8')]
+)
+
+# إطار المصادقة الذي يرسله موقع PocketOption عند فتح WebSocket؛ isDemo يحدد نوع الحساب
+AUTH_PREFIX = '42["auth"'
+AUTH_PREFIX_BYTES = AUTH_PREFIX.encode()
+# صيغة SSID القديمة (جلسة PHP مسلسلة) تظهر للحساب الحقيقي فقط
+LEGACY_MARKER = 'a:4:{'
+LEGACY_MARKER_BYTES = LEGACY_MARKER.encode()
+ACCOUNT_TYPES = ("Real", "Demo")
+
+
+def classify_frame(frame):
+    """(account_type, ssid) for an auth frame, or None for any other frame.
+
+    Frames are checked for the markers before decoding, so the ordinary
+    stream traffic is never decoded or parsed.
+    """
+    if isinstance(frame, (bytes, bytearray)):
+        if AUTH_PREFIX_BYTES not in frame and LEGACY_MARKER_BYTES not in frame:
+            return None
+        frame = bytes(frame).decode("utf-8", errors="ignore")
+    elif AUTH_PREFIX not in frame and LEGACY_MARKER not in frame:
+        return None
+    if AUTH_PREFIX in frame:
+        try:
+            parsed = json.loads(frame[2:])
+            if parsed[0] == "auth":
+                return ("Demo" if parsed[1].get("isDemo") == 1 else "Real"), frame
+        except (ValueError, IndexError, KeyError, AttributeError) as e:
+            logging.error(f"Failed to parse WebSocket auth frame: {str(e)}")
+        return None
+    return "Real", frame
+
+
+def scan_frames(frames, wanted=ACCOUNT_TYPES, start: int = 0, found: dict = None):
+    """Scan `frames[start:]` for the auth frames of the `wanted` account types.
+
+    Pure function over a frame sequence: returns (found, position), where
+    `found` maps account type to SSID (the first auth frame of each type
+    wins) and `position` is the index to resume from. Stops right after the
+    frame that completes `wanted`.
+    """
+    found = dict(found or {})
+    wanted = set(wanted)
+    position = start
+    for position in range(start, len(frames)):
+        match = classify_frame(frames[position])
+        if match is not None and match[0] in wanted and match[0] not in found:
+            found[match[0]] = match[1]
+            if wanted <= found.keys():
+                return found, position + 1
+    return found, max(start, len(frames))
+
+
+class _Contents:
+    """عرض كسول لمحتوى الإطارات دون نسخ قائمة ws_messages."""
+
+    __slots__ = ("messages",)
+
+    def __init__(self, messages):
+        self.messages = messages
+
+    def __len__(self):
+        return len(self.messages)
+
+    def __getitem__(self, index):
+        return self.messages[index].content
+
+
+class SsidScanner:
+    """Incremental SSID search over the WebSocket traffic captured by selenium-wire.
+
+    Remembers how far it has read in the request list and in each
+    WebSocket's frame list, so a poll reads only the frames that arrived
+    since the previous one. Real and Demo are searched together, so one
+    page session (one tab per account type) can yield both.
+    """
+
+    def __init__(self, wanted=ACCOUNT_TYPES):
+        self.wanted = set(wanted)
+        self.found = {}
+        self.requests_seen = 0
+        self.sockets = set()
+        self.positions = {}
+        self.frames_read = 0
+
+    @property
+    def done(self) -> bool:
+        return self.wanted <= self.found.keys()
+
+    @property
+    def missing(self) -> list:
+        return [account_type for account_type in ACCOUNT_TYPES if account_type in self.wanted and account_type not in self.found]
+
+    def feed(self, key, frames) -> dict:
+        """قراءة الإطارات الجديدة فقط من تدفق واحد؛ يعيد ما وُجد حتى الآن."""
+        if self.done:
+            return self.found
+        start = self.positions.get(key, 0)
+        self.found, position = scan_frames(frames, self.wanted, start, self.found)
+        self.frames_read += position - start
+        self.positions[key] = position
+        return self.found
+
+    def scan_requests(self, requests) -> dict:
+        """Feed every WebSocket in selenium-wire's `driver.requests` from where the last scan stopped.
+
+        selenium-wire returns fresh request objects on each read, so
+        sockets are remembered by request id, not by object.
+        """
+        for index, request in enumerate(requests):
+            if self.done:
+                break
+            if index >= self.requests_seen and "wss://" in request.url:
+                self.sockets.add(request.id)
+            if request.id in self.sockets and request.ws_messages:
+                self.feed(request.id, _Contents(request.ws_messages))
+        self.requests_seen = max(self.requests_seen, len(requests))
+        return self.found
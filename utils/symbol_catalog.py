@@ -0,0 +1,60 @@
+import logging
+
+# إعدادات التسجيل
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[logging.FileHandler('errors.log', mode='a', encoding='utf-8')]
+)
+
+# الفواصل التي تختلف بين القنوات و API: "EUR/USD OTC" و "EURUSD-OTC" و "EURUSD_otc" و "#AAPL_otc"
+_ALIAS_STRIP = str.maketrans("", "", " /-_#.")
+OTC_SUFFIX = "otc"
+
+
+def alias_key(symbol: str) -> str:
+    """المفتاح الموحد لكل صيغ الرمز: أحرف صغيرة بدون فواصل."""
+    return symbol.lower().translate(_ALIAS_STRIP)
+
+
+class SymbolCatalog:
+    """Maps every known spelling of a symbol to its API symbol in one dict lookup.
+
+    Rebuilt from the payout map whenever the set of live symbols changes.
+    Every API symbol is reachable through its alias_key (slash, dash,
+    `_otc`, `otc`, spaces and case all collapse to the same key). An OTC
+    spelling whose OTC asset is not listed falls back to the regular asset,
+    as check_payout always did.
+    """
+
+    def __init__(self, symbols=()):
+        self.aliases = {}
+        self.symbols = frozenset()
+        self.rebuilds = 0
+        if symbols:
+            self.rebuild(symbols)
+
+    def rebuild(self, symbols) -> bool:
+        """إعادة بناء الفهرس إذا تغيرت قائمة الرموز؛ يعيد True عند إعادة البناء."""
+        symbols = frozenset(symbols)
+        if symbols == self.symbols:
+            return False
+        aliases = {}
+        for symbol in symbols:
+            aliases[alias_key(symbol)] = symbol
+        # الصيغة OTC لأصل لا يملك نسخة OTC تشير إلى الأصل العادي
+        for key, symbol in list(aliases.items()):
+            if not key.endswith(OTC_SUFFIX):
+                aliases.setdefault(key + OTC_SUFFIX, symbol)
+        self.aliases = aliases
+        self.symbols = symbols
+        self.rebuilds += 1
+        logging.info(f"Symbol catalog rebuilt: {len(symbols)} symbols, {len(aliases)} aliases")
+        return True
+
+    def resolve(self, symbol: str):
+        """API symbol for any spelling of `symbol`, or None if it is not listed."""
+        return self.aliases.get(alias_key(symbol))
+
+    def __len__(self):
+        return len(self.symbols)
@@ -0,0 +1,212 @@
+import asyncio
+import json
+import logging
+import os
+import tempfile
+from . import clock
+from .payout_index import payout_index
+
+# إعدادات التسجيل
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[logging.FileHandler('errors.log', mode='a', encoding='utf-8')]
+)
+
+SYMBOLS_FILE = "symbols_catalog.json"
+# نسخة صيغة الملف؛ ملف بنسخة أحدث يُقرأ ولا يُكتب فوقه
+FORMAT_VERSION = 1
+# تحديث القائمة من العميل الحي كل REFRESH_INTERVAL ثانية
+REFRESH_INTERVAL = 60.0
+# last_seen وحده لا يستحق كتابة الملف في كل تحديث؛ رمز جديد يُكتب فورًا
+SAVE_INTERVAL = 600.0
+
+# القائمة الافتراضية قبل أول تحديث ناجح (مثلاً أول تشغيل على جهاز جديد)
+DEFAULT_SYMBOLS = (
+    "EURUSD", "GBPUSD", "USDJPY", "AUDUSD", "USDCAD", "USDCHF", "NZDUSD",
+    "AUDUSD-OTC", "EURUSD-OTC", "GBPUSD-OTC", "USDJPY-OTC", "NZDUSD-OTC",
+    "AUDCAD-OTC", "GBPJPY-OTC", "CADCHF-OTC", "AUDJPY-OTC", "USDMYR-OTC",
+    "USDCHF-OTC", "USDCNH-OTC", "TNDUSD-OTC", "BHDCNY-OTC", "EURHUF-OTC",
+    "AUDCHF-OTC", "EURRUB-OTC", "USDPKR-OTC", "USDARS-OTC", "USDBRL-OTC",
+    "USDPHP-OTC", "USDCLP-OTC", "USDCOP-OTC", "USDEGP-OTC", "USDIDR-OTC",
+    "USDSGD-OTC", "USDTHB-OTC", "YERUSD-OTC", "ZARUSD-OTC", "AEDCNY-OTC",
+    "AUDNZD-OTC", "CADJPY-OTC", "EURGBP-OTC", "EURJPY-OTC", "EURNZD-OTC",
+    "EURTRY-OTC", "GBPAUD-OTC", "NGNUSD-OTC", "NZDJPY-OTC",
+)
+
+
+def _merge(target: dict, source: dict):
+    """دمج سجلات الرموز: أقدم first_seen وأحدث last_seen وآخر عائد معروف."""
+    for symbol, record in source.items():
+        current = target.get(symbol)
+        if current is None:
+            target[symbol] = dict(record)
+            continue
+        current["first_seen"] = min(current["first_seen"], record["first_seen"])
+        if record["last_seen"] > current["last_seen"]:
+            current["last_seen"] = record["last_seen"]
+            current["payout"] = record.get("payout")
+
+
+class SymbolStore:
+    """Symbols the broker has listed, persisted to a JSON file shared by every bot on the host.
+
+    The file holds {"version", "updated_at", "symbols": {symbol: {first_seen,
+    last_seen, payout}}}. It is read once at boot. A background task then
+    takes the live symbol list from payout_index, which keep_alive refreshes,
+    or asks the client when the index is stale. Each save re-reads the file
+    and merges it first, so processes sharing the file do not drop each
+    other's symbols. The new file is written to a temp file and swapped in
+    with os.replace, so readers never see a partial file.
+    """
+
+    def __init__(self, path: str = SYMBOLS_FILE, refresh_interval: float = REFRESH_INTERVAL, save_interval: float = SAVE_INTERVAL):
+        self.path = path
+        self.refresh_interval = refresh_interval
+        self.save_interval = save_interval
+        self.records = {}
+        self.loaded = False
+        self.read_only = False
+        self.dirty = False
+        self.saved_at = None
+        self.task = None
+        self.refreshes = 0
+        self.saves = 0
+        self.failures = 0
+
+    def _read(self) -> dict:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logging.error(f"Symbol catalog {self.path} unreadable, ignored: {str(e)}")
+            return {}
+        version = data.get("version")
+        if not isinstance(version, int) or version < 1:
+            logging.error(f"Symbol catalog {self.path} has no valid version, ignored")
+            return {}
+        if version > FORMAT_VERSION:
+            # كتبه إصدار أحدث من الروبوت: نقرأ الحقول المعروفة ولا نكتب فوقه
+            self.read_only = True
+            logging.warning(f"Symbol catalog {self.path} is format {version} (this bot writes {FORMAT_VERSION}); using it read-only")
+        return {
+            symbol: {"first_seen": float(record["first_seen"]), "last_seen": float(record["last_seen"]), "payout": record.get("payout")}
+            for symbol, record in data.get("symbols", {}).items()
+            if isinstance(record, dict) and "first_seen" in record and "last_seen" in record
+        }
+
+    def load(self) -> dict:
+        """قراءة الملف مرة واحدة (عند أول استخدام)."""
+        if not self.loaded:
+            _merge(self.records, self._read())
+            self.loaded = True
+            logging.info(f"Symbol catalog loaded: {len(self.records)} symbols from {self.path}")
+        return self.records
+
+    def symbols(self) -> list:
+        """الرموز المعروفة، أو القائمة الافتراضية إذا لم يُحفظ شيء بعد."""
+        records = self.load()
+        return sorted(records) if records else list(DEFAULT_SYMBOLS)
+
+    def observe(self, full_payout: dict) -> int:
+        """تسجيل الرموز المدرجة الآن؛ يعيد عدد الرموز الجديدة."""
+        self.load()
+        now = round(clock.time(), 3)
+        added = 0
+        for symbol, payout in full_payout.items():
+            record = self.records.get(symbol)
+            if record is None:
+                self.records[symbol] = {"first_seen": now, "last_seen": now, "payout": payout}
+                added += 1
+                continue
+            record["last_seen"] = now
+            record["payout"] = payout
+        self.dirty = True
+        if added:
+            logging.info(f"Symbol catalog: {added} new symbols")
+        return added
+
+    def _write(self):
+        records = {}
+        _merge(records, self._read())
+        _merge(records, self.records)
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, temp_path = tempfile.mkstemp(prefix=".symbols_catalog.", dir=directory)
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump({"version": FORMAT_VERSION, "updated_at": round(clock.time(), 3), "symbols": records}, f, ensure_ascii=False, indent=1, sort_keys=True)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, self.path)
+        except Exception:
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+            raise
+        return records
+
+    async def save(self, force: bool = False) -> bool:
+        """Write the catalog if it changed; last_seen-only changes wait for save_interval."""
+        if self.read_only or not self.dirty:
+            return False
+        if not force and self.saved_at is not None and clock.monotonic() - self.saved_at < self.save_interval:
+            return False
+        records = await asyncio.to_thread(self._write)
+        # رموز أضافتها عمليات أخرى تصبح معروفة هنا أيضًا
+        _merge(self.records, records)
+        self.dirty = False
+        self.saved_at = clock.monotonic()
+        self.saves += 1
+        return True
+
+    async def refresh(self, client) -> int:
+        """Record the symbols listed now: from payout_index when fresh, otherwise from the client."""
+        if payout_index.is_fresh:
+            full_payout = {entry.symbol: entry.payout for entry in payout_index.entries.values()}
+        else:
+            full_payout = await client.payout()
+            payout_index.update(full_payout)
+        if not full_payout:
+            return 0
+        added = self.observe(full_payout)
+        self.refreshes += 1
+        await self.save(force=bool(added) or self.saved_at is None)
+        return added
+
+    async def _run(self, client):
+        while True:
+            try:
+                await self.refresh(client)
+            except Exception as e:
+                self.failures += 1
+                logging.error(f"Symbol catalog refresh failed: {str(e)}")
+            await asyncio.sleep(self.refresh_interval)
+
+    def start(self, client):
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self._run(client))
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+        try:
+            await self.save(force=True)
+        except Exception as e:
+            logging.error(f"Symbol catalog save failed: {str(e)}")
+
+    def stats(self) -> dict:
+        return {
+            "symbols": len(self.records),
+            "refreshes": self.refreshes,
+            "saves": self.saves,
+            "failures": self.failures,
+            "read_only": self.read_only,
+        }
+
+
+symbol_store = SymbolStore()
@@ -2,8 +2,9 @@ import os
 import json
 from telethon import TelegramClient, events
 from telethon.errors import SessionPasswordNeededError, PhoneNumberInvalidError, FloodWaitError
-import re
 import logging
+from .signal_parsers import build_parser_registry
+from .metrics import stage_seconds, signals_total
 
 # إعدادات التسجيل
 logging.basicConfig(
@@ -104,22 +105,57 @@ async def setup_telegram():
 
     return client, channel_name
 
-async def listen_to_signals(client, signal_handler, channel_name):
+async def resolve_parser_bindings(client, registry, channels, config=None):
+    """ربط كل قناة بمعرف المحادثة الخاص بها والصيغ المحددة لها في الإعدادات."""
+    channel_formats = (config or {}).get("channel_formats", {})
+    for channel in channels:
+        formats = channel_formats.get(channel)
+        if not formats:
+            continue
+        try:
+            chat_id = await client.get_peer_id(channel)
+            registry.bind(chat_id, formats)
+            logging.info(f"Channel {channel} ({chat_id}) bound to signal format(s): {formats}")
+        except Exception as e:
+            logging.error(f"Failed to bind signal format for {channel}: {str(e)}")
+            print(f"⚠️ Failed to bind signal format for {channel}: {str(e)}")
+
+async def listen_to_signals(client, signal_handler, channel_name, registry=None, on_edit=None, on_delete=None):
     channels = [ch.strip() for ch in channel_name.split(",")]
+    if registry is None:
+        config = load_telegram_config()
+        registry = build_parser_registry(config)
+        await resolve_parser_bindings(client, registry, channels, config)
+
     @client.on(events.NewMessage(chats=channels))
     async def handler(event):
         message_text = event.message.text
-        pattern = r"💷 (\S+)\s+💎 (M\d+)\s+⌚️ (\d{2}:\d{2}:\d{2})\s+(🔼 call|🔽 put)"
-        match = re.search(pattern, message_text, re.MULTILINE)
-        if match:
-            symbol, duration, time, direction = match.groups()
-            direction = "call" if "call" in direction.lower() else "put"
-            message = {
-                "symbol": symbol,
-                "duration": duration,
-                "time": time,
-                "direction": direction
-            }
-            await signal_handler(message)
-
-    await client.run_until_disconnected()
\ No newline at end of file
+        with stage_seconds.time(stage="parse"):
+            message, format_name = registry.parse(event.chat_id, message_text)
+        if message is None:
+            if message_text and registry.looks_like_signal(event.chat_id, message_text):
+                signals_total.inc(outcome="rejected", reason="unparsed")
+                logging.warning(f"Unparsed signal-like message from {event.chat_id}: {message_text!r}")
+            return
+        message["chat_id"] = event.chat_id
+        message["message_id"] = event.message.id
+        logging.info(f"Signal parsed with '{format_name}' format from {event.chat_id}: {message}")
+        await signal_handler(message)
+
+    if on_edit:
+        @client.on(events.MessageEdited(chats=channels))
+        async def edit_handler(event):
+            message, _ = registry.parse(event.chat_id, event.message.text)
+            if message is not None:
+                message["chat_id"] = event.chat_id
+                message["message_id"] = event.message.id
+            logging.info(f"Message {event.message.id} edited in {event.chat_id}, parsed as: {message}")
+            await on_edit(event.chat_id, event.message.id, message)
+
+    if on_delete:
+        @client.on(events.MessageDeleted(chats=channels))
+        async def delete_handler(event):
+            logging.info(f"Messages {event.deleted_ids} deleted in {event.chat_id}")
+            await on_delete(event.chat_id, event.deleted_ids)
+
+    await client.run_until_disconnected()
@@ -0,0 +1,165 @@
+import asyncio
+import logging
+import statistics
+import struct
+import time
+from collections import deque
+from . import clock
+
+# إعدادات التسجيل
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[logging.FileHandler('errors.log', mode='a', encoding='utf-8')]
+)
+
+NTP_SERVERS = (("pool.ntp.org", 123), ("time.google.com", 123), ("time.cloudflare.com", 123))
+# الفرق بين بداية عصر NTP (1900) وبداية عصر Unix (1970) بالثواني
+NTP_EPOCH_DELTA = 2208988800
+# عدد العينات في كل مزامنة، والفاصل بين المزامنات الخلفية
+SYNC_SAMPLES = 8
+SYNC_INTERVAL = 300.0
+# العينات التي يتجاوز زمن رحلتها أقل زمن رحلة بهذا الهامش تُستبعد (مسار شبكة مزدحم)
+DELAY_MARGIN = 0.010
+
+
+def _to_ntp(timestamp: float) -> bytes:
+    timestamp += NTP_EPOCH_DELTA
+    seconds = int(timestamp)
+    return struct.pack("!II", seconds, int((timestamp - seconds) * 2 ** 32) & 0xFFFFFFFF)
+
+
+def _from_ntp(data: bytes) -> float:
+    seconds, fraction = struct.unpack("!II", data)
+    return seconds - NTP_EPOCH_DELTA + fraction / 2 ** 32
+
+
+class _NTPProtocol(asyncio.DatagramProtocol):
+    def __init__(self, response: asyncio.Future):
+        self.response = response
+
+    def datagram_received(self, data, addr):
+        if not self.response.done():
+            self.response.set_result((data, time.time()))
+
+    def error_received(self, exc):
+        if not self.response.done():
+            self.response.set_exception(exc)
+
+
+async def query_ntp(host: str, port: int = 123, timeout: float = 1.0):
+    """One SNTP exchange; returns (offset, delay) in seconds relative to the system clock."""
+    loop = asyncio.get_running_loop()
+    response = loop.create_future()
+    transport, _ = await loop.create_datagram_endpoint(lambda: _NTPProtocol(response), remote_addr=(host, port))
+    try:
+        sent_at = time.time()
+        origin = _to_ntp(sent_at)
+        # LI=0, VN=4, Mode=3 (client)؛ طابع الإرسال يعود في حقل originate للتحقق من الرد
+        transport.sendto(b"\x23" + b"\x00" * 39 + origin)
+        data, received_at = await asyncio.wait_for(response, timeout)
+    finally:
+        transport.close()
+    if len(data) < 48:
+        raise ValueError(f"Short NTP reply from {host}: {len(data)} bytes")
+    if data[0] & 0x07 != 4 or data[1] == 0:
+        raise ValueError(f"Invalid NTP reply from {host} (mode {data[0] & 0x07}, stratum {data[1]})")
+    if data[24:32] != origin:
+        raise ValueError(f"NTP reply from {host} does not match the request")
+    server_received = _from_ntp(data[32:40])
+    server_sent = _from_ntp(data[40:48])
+    offset = ((server_received - sent_at) + (server_sent - received_at)) / 2
+    delay = (received_at - sent_at) - (server_sent - server_received)
+    return offset, delay
+
+
+def filter_samples(samples, delay_margin: float = DELAY_MARGIN):
+    """Median offset of the samples whose delay is close to the smallest one."""
+    if not samples:
+        return None
+    best = min(delay for _, delay in samples)
+    kept = [offset for offset, delay in samples if delay <= best + delay_margin]
+    return statistics.median(kept)
+
+
+class ClockOffsetEstimator:
+    """Keeps clock.time() aligned with NTP time.
+
+    Each sync takes `samples` SNTP samples spread over the configured
+    servers, keeps the ones with the lowest round-trip delay (the least
+    queued, so the most symmetric) and applies their median offset with
+    clock.set_offset. A background task repeats this every `interval`
+    seconds. Servers are (host, port) pairs, so a local fake responder
+    can stand in for the pool.
+    """
+
+    def __init__(self, servers=NTP_SERVERS, samples: int = SYNC_SAMPLES, interval: float = SYNC_INTERVAL, timeout: float = 1.0, spacing: float = 0.05):
+        self.servers = tuple(servers)
+        self.samples = samples
+        self.interval = interval
+        self.timeout = timeout
+        self.spacing = spacing
+        self.offset = 0.0
+        self.delay = None
+        self.synced_at = None
+        self.failures = 0
+        self.history = deque(maxlen=50)
+        self.task = None
+
+    async def collect(self):
+        samples = []
+        for i in range(self.samples):
+            host, port = self.servers[i % len(self.servers)]
+            try:
+                samples.append(await query_ntp(host, port, self.timeout))
+            except Exception as e:
+                logging.warning(f"NTP sample from {host}:{port} failed: {str(e)}")
+            if i < self.samples - 1:
+                await asyncio.sleep(self.spacing)
+        return samples
+
+    async def sync(self):
+        """Take a round of samples and apply the filtered offset; returns it, or None on failure."""
+        samples = await self.collect()
+        offset = filter_samples(samples)
+        if offset is None:
+            self.failures += 1
+            logging.error("Clock sync failed: no NTP samples")
+            return None
+        self.offset = offset
+        self.delay = min(delay for _, delay in samples)
+        self.synced_at = time.monotonic()
+        self.history.append(offset)
+        clock.set_offset(offset)
+        logging.info(f"Clock offset {offset * 1000:+.1f} ms from {len(samples)} samples, best delay {self.delay * 1000:.1f} ms")
+        return offset
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.sync()
+            except Exception as e:
+                logging.error(f"Clock sync error: {str(e)}")
+
+    def start(self):
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+
+    def stats(self) -> dict:
+        return {
+            "offset_ms": round(self.offset * 1000, 1),
+            "delay_ms": round(self.delay * 1000, 1) if self.delay is not None else None,
+            "age": round(time.monotonic() - self.synced_at, 1) if self.synced_at is not None else None,
+            "syncs": len(self.history),
+            "failures": self.failures,
+        }
+
+
+clock_offset = ClockOffsetEstimator()
@@ -0,0 +1,314 @@
+import asyncio
+import json
+import logging
+import os
+import tempfile
+import uuid
+from . import clock
+
+# إعدادات التسجيل
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[logging.FileHandler('errors.log', mode='a', encoding='utf-8')]
+)
+
+JOURNAL_FILE = "trade_journal.jsonl"
+# الأحداث تُجمع وتُكتب بـ fsync واحد كل FLUSH_INTERVAL ثانية أو عند امتلاء الدفعة؛ نية الأمر تُكتب قبل إرساله
+FLUSH_INTERVAL = 0.05
+FLUSH_BATCH = 64
+# معرفات الصفقات المعروفة (لها أمر أو نتيجة في السجل)؛ لا تُربط نية مجهولة بإحداها عند الاستعادة
+KNOWN_LIMIT = 1000
+# معرفات الصفقات المغلقة المحفوظة في لقطة الضغط لكل حساب
+SETTLED_KEEP = 200
+
+
+def _empty_state() -> dict:
+    return {"realized": 0.0, "wins": 0, "losses": 0, "ties": 0, "total_trades": 0, "ladders": {}, "open": {}, "settled": []}
+
+
+class TradeJournal:
+    """Append-only journal of intent, order, ack and result events, one JSON line each.
+
+    `record` only appends to an in-memory buffer; a background task writes
+    the buffer and fsyncs once per batch, so trades fired together share
+    one disk sync. The one write-ahead record is the intent: it is written
+    and fsynced with `sync` before the order is sent, so a crash during
+    the buy round trip still leaves the order on disk. The order event
+    that follows adds the trade id. An intent with no order event, and an
+    order whose ack failed, stay in `open` with status "intent" or
+    "unknown" and are resolved against the server on restart.
+
+    A clean shutdown appends `session_end`, unless an order is still
+    unresolved. `recover` replays the events after the last session_end
+    and returns each account's strategy counters, ladders and open trades.
+    `compact` rewrites the file as one snapshot per account.
+    """
+
+    def __init__(self, path: str = JOURNAL_FILE, interval: float = FLUSH_INTERVAL, batch: int = FLUSH_BATCH):
+        self.path = path
+        self.interval = interval
+        self.batch = batch
+        self.buffer = []
+        self.file = None
+        self.task = None
+        self.wake = asyncio.Event()
+        self.lock = asyncio.Lock()
+        self.closing = False
+        self.seq = 0
+        self.unresolved = set()
+        self.known = {}
+        self.written = 0
+        self.fsyncs = 0
+        self.max_batch = 0
+        self.torn = 0
+        self.recovered = 0
+
+    @property
+    def is_open(self) -> bool:
+        return self.file is not None
+
+    def record(self, type: str, account: str = None, urgent: bool = False, **fields):
+        """إضافة حدث إلى الدفعة الحالية (لا شيء إذا لم يُفتح السجل)."""
+        if self.file is None:
+            return
+        self.seq += 1
+        event = {"seq": self.seq, "t": round(clock.time(), 3), "type": type}
+        if account is not None:
+            event["account"] = account
+        event.update(fields)
+        self.remember(fields.get("trade_id"))
+        self.buffer.append(json.dumps(event, ensure_ascii=False, default=str) + "\n")
+        if urgent or len(self.buffer) >= self.batch:
+            self.wake.set()
+
+    def _write(self, data: str):
+        self.file.write(data)
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    async def flush(self) -> int:
+        """كتابة الدفعة الحالية مع fsync واحد؛ يعيد عدد الأحداث المكتوبة."""
+        async with self.lock:
+            if not self.buffer or self.file is None:
+                return 0
+            lines, self.buffer = self.buffer, []
+            await asyncio.to_thread(self._write, "".join(lines))
+            self.written += len(lines)
+            self.fsyncs += 1
+            self.max_batch = max(self.max_batch, len(lines))
+            return len(lines)
+
+    async def sync(self):
+        """كتابة كل ما في الدفعة الآن وانتظار fsync (قبل إرسال أمر)."""
+        if self.file is not None:
+            await self.flush()
+
+    def remember(self, trade_id):
+        """إضافة معرف صفقة إلى المعرفات المعروفة (بحد أقصى KNOWN_LIMIT، الأقدم يُنسى أولًا)."""
+        if trade_id is None:
+            return
+        self.known.pop(str(trade_id), None)
+        self.known[str(trade_id)] = None
+        if len(self.known) > KNOWN_LIMIT:
+            del self.known[next(iter(self.known))]
+
+    def track(self, add=(), resolve=()):
+        """أوامر لم تُعرف حالتها بعد؛ لا يُكتب session_end ما دام أحدها قائمًا."""
+        self.unresolved.difference_update(resolve)
+        self.unresolved.update(add)
+
+    async def _run(self):
+        # يتوقف بالعلم لا بالإلغاء حتى لا تُقطع كتابة جارية
+        while not self.closing:
+            try:
+                await asyncio.wait_for(self.wake.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self.wake.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                logging.error(f"Trade journal write failed: {str(e)}")
+
+    def open(self):
+        """فتح السجل للإضافة وبدء الكتابة في الخلفية."""
+        if self.file is not None:
+            return
+        self.file = open(self.path, "a", encoding="utf-8")
+        self.closing = False
+        self.task = asyncio.create_task(self._run())
+        logging.info(f"Trade journal open: {self.path}")
+
+    async def close(self, clean: bool = True):
+        """إغلاق السجل؛ الإغلاق النظيف يسجل session_end فلا يُستعاد شيء عند التشغيل التالي."""
+        if self.file is None:
+            return
+        if clean and self.unresolved:
+            logging.warning(f"Trade journal: {len(self.unresolved)} orders unresolved, kept for the next start")
+        elif clean:
+            self.record("session_end")
+        self.closing = True
+        self.wake.set()
+        if self.task is not None:
+            await self.task
+            self.task = None
+        try:
+            await self.flush()
+        finally:
+            self.file.close()
+            self.file = None
+
+    def load(self) -> list:
+        """أحداث الجلسة الأخيرة (بعد آخر session_end)؛ يتجاهل سطرًا مقطوعًا في النهاية."""
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                lines = f.readlines()
+        except FileNotFoundError:
+            return []
+        events = []
+        for number, line in enumerate(lines, 1):
+            if not line.strip():
+                continue
+            try:
+                event = json.loads(line)
+            except ValueError:
+                self.torn += 1
+                level = logging.INFO if number == len(lines) else logging.WARNING
+                logging.log(level, f"Trade journal line {number} is incomplete, skipped")
+                continue
+            if event.get("type") == "session_end":
+                events = []
+            else:
+                events.append(event)
+            self.seq = max(self.seq, int(event.get("seq", 0)))
+        return events
+
+    def recover(self, events: list = None) -> dict:
+        """Replay the journal into {account: state}; state has the strategy counters, ladders and open trades."""
+        start = clock.monotonic()
+        events = self.load() if events is None else events
+        state = {}
+        for event in events:
+            account = str(event.get("account", "")).lower()
+            kind = event.get("type")
+            if kind == "snapshot":
+                snapshot = _empty_state()
+                snapshot.update(event.get("state", {}))
+                state[account] = snapshot
+                for settled in snapshot["settled"]:
+                    self.remember(settled)
+                continue
+            current = state.setdefault(account, _empty_state())
+            trade_id = str(event.get("trade_id"))
+            self.remember(event.get("trade_id"))
+            if kind == "intent":
+                current["open"]["intent:" + event["intent"]] = dict(event, status="intent")
+            elif kind == "order":
+                # حقول الأمر من النية؛ بدون ack بعد، فالحالة غير معروفة حتى يتأكد
+                intent = current["open"].pop("intent:" + str(event.get("intent")), {})
+                current["open"][trade_id] = {**intent, "status": "unknown", **event}
+            elif kind == "ack":
+                if trade_id in current["open"]:
+                    current["open"][trade_id]["status"] = "open" if event.get("ok") else "unknown"
+            elif kind == "abort":
+                current["open"].pop("intent:" + str(event.get("intent")), None)
+                current["open"].pop(trade_id, None)
+            elif kind == "result":
+                current["open"].pop(trade_id, None)
+                current["settled"] = (current["settled"] + [trade_id])[-SETTLED_KEEP:]
+                for field in ("realized", "wins", "losses", "ties", "total_trades"):
+                    current[field] = event.get(field, current[field])
+                current["ladders"][event["ladder"]] = {"loss_count": event["loss_count"], "current_amount": event["current_amount"]}
+            elif kind == "ladder":
+                current["ladders"][event["ladder"]] = {"loss_count": event["loss_count"], "current_amount": event["current_amount"]}
+        self.recovered = len(events)
+        logging.info(f"Trade journal replayed {len(events)} events in {(clock.monotonic() - start) * 1000:.1f} ms")
+        return state
+
+    def compact(self, state: dict):
+        """Rewrite the journal as one snapshot (plus its open orders) per account, atomically."""
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, temp_path = tempfile.mkstemp(prefix=".trade_journal.", dir=directory)
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                for account, current in state.items():
+                    snapshot = {key: value for key, value in current.items() if key != "open"}
+                    self.seq += 1
+                    f.write(json.dumps({"seq": self.seq, "t": round(clock.time(), 3), "type": "snapshot", "account": account, "state": snapshot}, ensure_ascii=False) + "\n")
+                    for order in current["open"].values():
+                        # نية بلا معرف تبقى نية؛ ما له معرف يُكتب أمرًا مع حالته
+                        order = dict(order, type="intent" if order.get("status") == "intent" else "order")
+                        f.write(json.dumps(order, ensure_ascii=False, default=str) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, self.path)
+        except Exception:
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+            raise
+
+    def for_account(self, name: str) -> "AccountJournal":
+        return AccountJournal(self, name)
+
+    def stats(self) -> dict:
+        return {
+            "open": self.is_open,
+            "written": self.written,
+            "pending": len(self.buffer),
+            "unresolved": len(self.unresolved),
+            "fsyncs": self.fsyncs,
+            "avg_batch": round(self.written / self.fsyncs, 1) if self.fsyncs else None,
+            "max_batch": self.max_batch,
+            "recovered_events": self.recovered,
+            "torn_lines": self.torn,
+        }
+
+
+class AccountJournal:
+    """واجهة السجل لحساب واحد، تُعلق على MartingaleStrategy.journal."""
+
+    def __init__(self, journal: TradeJournal, name: str):
+        self.journal = journal
+        self.name = str(name).lower()
+
+    async def intent(self, ladder: str, order, expires_at: float) -> str:
+        """Write-ahead record of an order about to be sent; returns once it is on disk."""
+        intent = uuid.uuid4().hex[:12]
+        self.journal.record(
+            "intent", self.name, intent=intent, ladder=ladder, symbol=order.symbol,
+            direction=order.direction, amount=order.amount, duration=order.duration, payout=order.payout,
+            expires_at=round(expires_at, 3),
+        )
+        self.journal.track(add=["intent:" + intent])
+        await self.journal.sync()
+        return intent
+
+    def order(self, intent: str, trade_id):
+        self.journal.record("order", self.name, urgent=True, intent=intent, trade_id=trade_id)
+        self.journal.track(add=[str(trade_id)], resolve=["intent:" + intent])
+
+    def ack(self, trade_id, ok: bool):
+        self.journal.record("ack", self.name, trade_id=trade_id, ok=bool(ok))
+        if ok:
+            self.journal.track(resolve=[str(trade_id)])
+
+    def abort(self, intent: str = None, trade_id=None, reason: str = None):
+        """الأمر لم يُفتح على الخادم (رُفض قبل الإرسال أو لم يوجد عند الاستعادة)."""
+        self.journal.record("abort", self.name, urgent=True, intent=intent, trade_id=trade_id, reason=reason)
+        self.journal.track(resolve=["intent:" + str(intent), str(trade_id)])
+
+    def result(self, trade_id, ladder, result: str, amount: float, profit: float, strategy, loss_count: int):
+        self.journal.record(
+            "result", self.name, trade_id=trade_id, ladder=ladder.key, result=result, amount=amount, profit=profit,
+            loss_count=loss_count, current_amount=ladder.current_amount, realized=strategy.realized,
+            wins=strategy.wins, losses=strategy.losses, ties=strategy.ties, total_trades=strategy.total_trades,
+        )
+
+    def ladder(self, ladder):
+        self.journal.record("ladder", self.name, ladder=ladder.key, loss_count=ladder.loss_count, current_amount=ladder.current_amount)
+
+
+trade_journal = TradeJournal()
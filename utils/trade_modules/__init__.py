@@ -1,8 +1,32 @@
-from .trade_execution import safe_execute_trade  # تحديث إلى safe_execute_trade
-from .trade_preparation import prepare_trade
-from .message_handling import handle_signal
-from .trade_globals import SUPPORTED_SYMBOLS, DEFAULT_DURATION, MINIMUM_PAYOUT, MAX_TIME_DIFF, initialize_driver, quit_driver
-from .trade_utils import validate_symbol, validate_trade_time, format_amount, normalize_symbol, check_payout
-import pandas as pd
-import pandas_ta as ta
-import requests
\ No newline at end of file
+import importlib
+
+# التصدير كسول: pandas و pandas_ta و requests لم تعد تُستورد (لم تكن مستخدمة)، و SUPPORTED_SYMBOLS يُجلب عند أول قراءة
+_EXPORTS = {
+    "safe_execute_trade": ".trade_execution",  # تحديث إلى safe_execute_trade
+    "prepare_trade": ".trade_preparation",
+    "handle_signal": ".message_handling",
+    "SUPPORTED_SYMBOLS": ".trade_globals",
+    "DEFAULT_DURATION": ".trade_globals",
+    "MINIMUM_PAYOUT": ".trade_globals",
+    "MAX_TIME_DIFF": ".trade_globals",
+    "initialize_driver": ".trade_globals",
+    "quit_driver": ".trade_globals",
+    "validate_symbol": ".trade_utils",
+    "validate_trade_time": ".trade_utils",
+    "format_amount": ".trade_utils",
+    "normalize_symbol": ".trade_utils",
+    "check_payout": ".trade_utils",
+}
+
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(_EXPORTS[name], __name__), name)
+    if name != "SUPPORTED_SYMBOLS":
+        globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_EXPORTS))
@@ -5,14 +5,17 @@ from datetime import datetime, timedelta
 from BinaryOptionsToolsV2.pocketoption.asyncronous import PocketOptionAsync
 from ..martingale_strategy import MartingaleStrategy
 from ..logger import Logger
-from .trade_execution import safe_execute_trade
+from .trade_execution import safe_execute_trade, arm_trade, fire_armed_trade
 from .trade_preparation import prepare_trade
 from .trade_utils import display_account_stats, check_payout
+from utils import clock
+from utils.entry_scheduler import entry_scheduler
+from utils.balance_ledger import ledger_for
+from .order_tracking import result_tracker, locate_order
+from utils.metrics import stage_seconds, signals_total, trades_total
 import pytz
 import time
 import sys
-import msvcrt
-import platform
 
 # إعدادات التسجيل
 logging.basicConfig(
@@ -31,54 +34,175 @@ console_handler.setFormatter(console_formatter)
 logging.getLogger().addHandler(console_handler)
 
 async def wait_for_result(client: PocketOptionAsync, trade_id: str, duration: int):
-    start_wait = time.time()
-    await asyncio.sleep(max(duration - 1, 0))
-    max_attempts = 20
-    attempt = 0
-    failed_parse_duration_count = 0
+    """انتظار نتيجة الصفقة عبر متتبع النتائج المشترك لكل الصفقات المفتوحة."""
+    start_wait = clock.time()
+    trade_data = await result_tracker.wait(client, trade_id, start_wait + duration)
+    if trade_data is None:
+        logging.error(f"فشل جلب نتيجة الصفقة {trade_id}")
+        return None
+    logging.info(f"نتيجة الصفقة {trade_id}: {trade_data['result']} في {time.strftime('%H:%M:%S')}")
+    logging.info(f"Wait time for result: {(clock.time() - start_wait):.3f} seconds")
+    return trade_data
+
+async def run_martingale(client: PocketOptionAsync, strategy: MartingaleStrategy, ladder, logger: Logger, symbol, trade_time, direction,
+                         prepared_symbol, duration, prepared_direction, payout, start_prepare_time, trade_id=None, amount=None, wait=None):
+    """حلقة المارتينجال لسلم واحد بعد صفقة خاسرة.
+
+    إذا مُرر trade_id فهي صفقة مفتوحة مسبقًا (مستعادة من سجل الصفقات بعد إعادة التشغيل):
+    تُنتظر نتيجتها خلال wait ثانية أولًا، ثم يكمل السلم كالمعتاد.
+    """
+    pending = trade_id
+    result = "loss"
+    # الصفقة المستعادة تُنتظر حتى لو أوقفت الحدود التداول: مبلغها مفتوح ويجب تسويته
+    while result == "loss" and (pending is not None or strategy.is_active):
+        if pending is None:
+            amount = float(ladder.get_amount())
+            if not await ladder.open(amount):
+                logging.warning(f"إيقاف سلم {symbol}: حدود الربح/الخسارة لا تسمح بصفقة مضاعفة بمبلغ {amount:.2f}")
+                print(f"⚠️ {symbol}: Martingale stopped, profit/loss limit leaves no room")
+                ladder.loss_count = 0
+                ladder.current_amount = strategy.settings["amount"]
+                ladder.checkpoint()
+                await display_account_stats(strategy)
+                print("🔥 Waiting for a new signal 🔥")
+                return
+            balance_before = await ledger_for(client).get()
+            logging.info(f"الرصيد قبل الصفقة المضاعفة: {balance_before:.2f}, المبلغ: {amount:.2f}")
+            signal_id = logger.log_signal(symbol, trade_time, direction, signal_score=1, accepted=True)
 
-    while attempt < max_attempts:
-        try:
-            trade_data = await client.check_win(trade_id)
-            if trade_data and "result" in trade_data:
-                logging.info(f"نتيجة الصفقة {trade_id}: {trade_data['result']} في {time.strftime('%H:%M:%S')}")
-                logging.info(f"Wait time for result: {(time.time() - start_wait):.3f} seconds")
-                return trade_data
-        except Exception as e:
-            err_str = str(e)
-            if "Failed to parse duration" in err_str:
-                failed_parse_duration_count += 1
-                logging.warning(f"⚠️ تجاهل خطأ تحويل المدة (محاولة {attempt+1}): {err_str}")
-                if failed_parse_duration_count > 5:
-                    await asyncio.sleep(1.0)
-                else:
-                    await asyncio.sleep(0.5)
-            else:
-                logging.error(f"محاولة {attempt + 1}/{max_attempts} - خطأ أثناء انتظار نتيجة الصفقة {trade_id}: {err_str}")
-                await asyncio.sleep(0.5)
-            attempt += 1
-            continue
-        attempt += 1
-        await asyncio.sleep(0.5)
-
-    logging.error(f"فشل جلب نتيجة الصفقة {trade_id} بعد {max_attempts} محاولات")
-    return None
-
-def check_for_skip(timeout=0.01):
-    """التحقق مما إذا ضغط المستخدم على مفتاح 's' لتخطي الصفقة."""
-    if platform.system() == "Windows":
-        start_time = time.time()
-        while time.time() - start_time < timeout:
-            if msvcrt.kbhit():
-                key = msvcrt.getch().decode('utf-8', errors='ignore').lower()
-                return key == 's'
-    return False
-
-async def handle_signal(client: PocketOptionAsync, message: dict, strategy: MartingaleStrategy, logger: Logger, ssid=None, demo=None):
-    start_total_time = time.time()
+            print(f"Started Martingale {ladder.loss_count} ...👍🏼")
+            trade_id = await safe_execute_trade(client, prepared_symbol, amount, duration, prepared_direction, strategy.settings["payout"], strategy, ladder=ladder)
+            execution_duration = clock.time() - start_prepare_time
+            logging.info(f"Execution time: {execution_duration:.3f} seconds")
+
+            if trade_id is None:
+                logging.error(f"فشل تنفيذ الصفقة المضاعفة لـ {prepared_symbol}")
+                print(f"❌ فشل تنفيذ الصفقة المضاعفة لـ {prepared_symbol}")
+                trades_total.inc(result="failed")
+                ladder.release(amount)
+                logger.log_trade(signal_id, symbol, prepared_direction, amount, "failed", balance_before, signal_score=0)
+                ladder.loss_count = 0  # إعادة تعيين عند الفشل
+                ladder.checkpoint()
+                await display_account_stats(strategy)
+                print("🔥 Waiting for a new signal 🔥")
+                return
+
+            trade_data = await wait_for_result(client, trade_id, duration)
+        else:
+            # صفقة فُتحت قبل إعادة التشغيل: لا أمر جديد، فقط انتظار نتيجتها
+            pending = None
+            balance_before = await ledger_for(client).get()
+            signal_id = logger.log_signal(symbol, trade_time, direction, signal_score=1, accepted=True)
+            trade_data = await wait_for_result(client, trade_id, wait if wait is not None else duration)
+        result = trade_data.get('result') if trade_data else "loss"
+        trades_total.inc(result=result)
+        balance_after = ledger_for(client).settle(trade_id, trade_data, amount)
+        strategy.update_balance(balance_after)
+        profit_or_loss = float(trade_data.get('profit', -amount)) if trade_data else -amount
+
+        if result == "win":
+            result_display = f"WIN ✅{ladder.loss_count if ladder.loss_count > 0 else ''}"
+            trade_profit = balance_after - balance_before if balance_after > balance_before else profit_or_loss
+            trade_loss = 0.0
+        elif result == "loss":
+            result_display = f"Martingale {ladder.loss_count + 1}"
+            trade_profit = 0.0
+            trade_loss = balance_before - balance_after if balance_before > balance_after else amount
+        elif result == "tie":
+            result_display = "DOJI ⚖"
+            trade_profit = 0.0
+            trade_loss = 0.0
+        else:
+            result_display = result
+            trade_profit = 0.0
+            trade_loss = amount
+
+        if result in ["win", "tie"]:
+            os.system('cls' if os.name == 'nt' else 'clear')
+        logging.info(f"تم تنفيذ الصفقة المضاعفة: {prepared_symbol} ({prepared_direction}), المبلغ: {amount:.2f}, النتيجة: {result_display}, الرصيد: {balance_after:.2f}")
+        print(f"✅ The trade was a {result_display}")
+
+        logging.info(f"ربح/خسارة الصفقة المضاعفة: {trade_profit:.2f}, الرصيد قبل: {balance_before:.2f}, الرصيد بعد: {balance_after:.2f}")
+        logger.log_trade(signal_id, symbol, prepared_direction, amount, result, balance_after, signal_score=1)
+        continue_trading = await ladder.update_amount(result, amount, profit_or_loss, payout, trade_id=trade_id)
+
+        print(f"💰 Profit: {trade_profit:.2f}, Loss: {trade_loss:.2f}")
+        if not continue_trading or not strategy.is_active:
+            if result == "loss" and ladder.loss_count >= strategy.settings["max_loss_count"]:
+                print(f"✖️ Loss")
+            elif result == "win":
+                print(f"WIN ✅")
+            ladder.loss_count = 0  # إعادة تعيين loss_count بعد التوقف
+            await display_account_stats(strategy)
+            print("🔥 Waiting for a new signal 🔥")
+            logging.info(f"توقف حلقة المارتينجال: continue_trading={continue_trading}, is_active={strategy.is_active}, loss_count={ladder.loss_count}")
+            if not strategy.is_active:
+                net_profit, net_loss = strategy.net_result()
+                if net_profit >= strategy.settings["profit"]:
+                    logging.info(f"توقف التداول بعد الوصول إلى الحد الأقصى للربح ({strategy.settings['profit']})")
+                    print(f"🛑 توقف الروبوت: الوصول إلى الحد الأقصى للربح ({strategy.settings['profit']})")
+                elif net_loss >= strategy.settings["loss"]:
+                    logging.info(f"توقف التداول بعد الوصول إلى الحد الأقصى للخسارة ({strategy.settings['loss']})")
+                    print(f"🛑 توقف الروبوت: الوصول إلى الحد الأقصى للخسارة ({strategy.settings['loss']})")
+                await display_account_stats(strategy)
+                print("👋 Session ended and logged.")
+            return
+
+async def resume_trade(client: PocketOptionAsync, strategy: MartingaleStrategy, logger: Logger, entry: dict):
+    """Re-attach to a trade the trade journal still shows as open after a restart.
+
+    The stake goes back on its ladder without the limit check (the order is
+    already on the server) and the balance ledger tracks it without
+    subtracting it again; then the ladder continues from the trade's result.
+    An intent or an unconfirmed order is first looked up on the server; if
+    it was never opened it is dropped from the journal.
+    """
+    journal = strategy.journal
+    if entry.get("status") in ("intent", "unknown"):
+        trade_id = await locate_order(client, entry, exclude=journal.journal.known if journal is not None else ())
+        if trade_id is None:
+            logging.warning(f"الأمر غير المؤكد لـ {entry['symbol']} ({entry.get('trade_id') or entry.get('intent')}) غير موجود على الخادم، أُسقط")
+            print(f"ℹ️ Unconfirmed order on {entry['symbol']} was never opened, dropped")
+            if journal is not None:
+                journal.abort(entry.get("intent"), entry.get("trade_id"), reason="not on server")
+            return
+        if journal is not None:
+            if entry.get("trade_id") is None:
+                journal.order(entry["intent"], trade_id)
+            journal.ack(trade_id, True)
+        entry = dict(entry, trade_id=trade_id)
+    trade_id = entry["trade_id"]
+    amount = float(entry["amount"])
+    ladder = strategy.ladder(entry["ladder"])
+    ladder.open_stake += amount
+    ledger_for(client).adopt(trade_id, amount)
+    symbol = entry["symbol"]
+    direction = entry["direction"]
+    duration = entry["duration"]
+    remaining = max(0.0, float(entry.get("expires_at") or 0.0) - clock.time())
+    logging.info(f"استئناف الصفقة المفتوحة {trade_id}: {symbol} ({direction}), المبلغ: {amount:.2f}, السلم: {ladder.key}, الخسارات: {ladder.loss_count}, المتبقي: {remaining:.1f} ثانية")
+    print(f"♻️ Resuming open trade on {symbol} ({direction}, {amount:.2f}), result in {remaining:.0f}s")
+    try:
+        await run_martingale(
+            client, strategy, ladder, logger, symbol, duration, direction,
+            symbol, duration, direction, entry.get("payout"), clock.time(), trade_id=trade_id, amount=amount, wait=remaining
+        )
+    except Exception as e:
+        logging.error(f"خطأ أثناء استئناف الصفقة {trade_id}: {str(e)}")
+        print(f"⚠️ خطأ أثناء استئناف الصفقة {trade_id}: {str(e)}")
+        ladder.release()
+
+# تحديث العداد على الشاشة بمعدل مناسب للإنسان، لا في كل ملّي ثانية
+COUNTDOWN_REFRESH = 0.1
+
+async def handle_signal(client: PocketOptionAsync, message: dict, strategy: MartingaleStrategy, logger: Logger, ssid=None, demo=None, on_fire=None):
+    start_total_time = clock.time()
+    ladder = None
+    arming = None
     try:
         if not strategy.is_active:
             logging.info("⚠️ الروبوت متوقف، تجاهل الإشارة")
+            signals_total.inc(outcome="rejected", reason="inactive")
             print("⚠️ الروبوت متوقف، تجاهل الإشارة")
             return
 
@@ -87,9 +211,11 @@ async def handle_signal(client: PocketOptionAsync, message: dict, strategy: Mart
         trade_time = message.get('duration')
         trade_time_exact = message.get('time')
         direction = message.get('direction')
+        entry_key = message.get('entry_key')
 
         if not all([symbol, trade_time, direction]):
             logging.error(f"بيانات الإشارة غير مكتملة: {message}")
+            signals_total.inc(outcome="rejected", reason="incomplete")
             print(f"❌ Not Signal : {message}")
             signal_id = logger.log_signal(symbol, trade_time, direction, signal_score=0, accepted=False)
             net_profit = strategy.current_balance - strategy.initial_balance
@@ -97,6 +223,9 @@ async def handle_signal(client: PocketOptionAsync, message: dict, strategy: Mart
             print(f"💰 Profit: {net_profit:.2f}, Loss: {net_loss:.2f}, Balance: {strategy.current_balance:.2f}")
             return
 
+        # لكل رمز سلم مارتينجال خاص به، فلا تنتظر إشارات الرموز الأخرى انتهاء هذا السلم
+        ladder = strategy.ladder(symbol)
+
         # جلب نسبة العائد
         api_symbol, payout = await check_payout(client, symbol, strategy.settings["payout"])
         payout_display = f"{payout:.0f}%" if payout is not None else "N/A"
@@ -105,9 +234,10 @@ async def handle_signal(client: PocketOptionAsync, message: dict, strategy: Mart
         print(f"💎 {trade_time}\n")
         print(f"⌚️ {trade_time_exact}\n")
         print(f"{direction_display}\n")
-        print(f"💶 Amount: {strategy.get_amount():.2f}\n")
+        print(f"💶 Amount: {ladder.get_amount():.2f}\n")
 
         if api_symbol is None:
+            signals_total.inc(outcome="rejected", reason="payout")
             signal_id = logger.log_signal(symbol, trade_time, direction, signal_score=0, accepted=False)
             net_profit = strategy.current_balance - strategy.initial_balance
             net_loss = strategy.initial_balance - strategy.current_balance if strategy.current_balance < strategy.initial_balance else 0
@@ -115,14 +245,15 @@ async def handle_signal(client: PocketOptionAsync, message: dict, strategy: Mart
             print("🔥 Waiting for a new signal 🔥")
             return
 
-        start_prepare_time = time.time()
+        start_prepare_time = clock.time()
         prepared_symbol, duration, prepared_direction = await prepare_trade(
-            client, symbol, trade_time, direction, strategy.settings, trade_time_exact=trade_time_exact, logger=logger
+            client, symbol, trade_time, direction, strategy.settings, trade_time_exact=trade_time_exact, logger=logger, api_symbol=api_symbol
         )
-        logging.info(f"Preparation time: {(time.time() - start_prepare_time):.3f} seconds")
+        logging.info(f"Preparation time: {(clock.time() - start_prepare_time):.3f} seconds")
 
         if prepared_symbol is None or duration is None or prepared_direction is None:
             logging.warning(f"فشل تحضير الصفقة لـ {symbol}")
+            signals_total.inc(outcome="rejected", reason="prepare")
             signal_id = logger.log_signal(symbol, trade_time, direction, signal_score=0, accepted=False)
             net_profit = strategy.current_balance - strategy.initial_balance
             net_loss = strategy.initial_balance - strategy.current_balance if strategy.current_balance < strategy.initial_balance else 0
@@ -130,10 +261,17 @@ async def handle_signal(client: PocketOptionAsync, message: dict, strategy: Mart
             print("🔥 Waiting for a new signal 🔥")
             return
 
+        # تجهيز الصفقة الأولى أثناء الانتظار: كل الفحوصات تتم الآن، وعند وقت الدخول يُرسل الأمر فقط
+        amount = float(ladder.get_amount())
+        arming = asyncio.ensure_future(arm_trade(
+            client, prepared_symbol, amount, duration, prepared_direction, strategy.settings["payout"], quote=(api_symbol, payout)
+        ))
+
         # التحقق من وقت الصفقة
+        fire_at = None
         if trade_time_exact:
             target_tz = pytz.timezone('America/Sao_Paulo')
-            current_time = datetime.now(target_tz)
+            current_time = clock.now(target_tz)
             try:
                 trade_time_obj = datetime.strptime(trade_time_exact, "%H:%M:%S").replace(
                     year=current_time.year, month=current_time.month, day=current_time.day
@@ -147,6 +285,8 @@ async def handle_signal(client: PocketOptionAsync, message: dict, strategy: Mart
                 if time_diff > 600:
                     logging.warning(f"وقت الصفقة بعيد: {trade_time_exact}, فرق الوقت: {time_diff} ثانية")
                     print(f"⚠️ وقت الصفقة بعيد: {trade_time_exact}")
+                    signals_total.inc(outcome="rejected", reason="too_far")
+                    arming.cancel()
                     signal_id = logger.log_signal(symbol, trade_time_exact, direction, signal_score=0, accepted=False)
                     await display_account_stats(strategy)
                     print("�fire: Waiting for a new signal 🔥")
@@ -154,70 +294,100 @@ async def handle_signal(client: PocketOptionAsync, message: dict, strategy: Mart
                 elif time_diff < -30:
                     logging.warning(f"وقت الصفقة قد مضى: {trade_time_exact}, فرق الوقت: {time_diff} ثانية")
                     print(f"⚠️ وقت الصفقة قد مضى: {trade_time_exact}")
+                    signals_total.inc(outcome="rejected", reason="passed")
+                    arming.cancel()
                     signal_id = logger.log_signal(symbol, trade_time_exact, direction, signal_score=0, accepted=False)
                     await display_account_stats(strategy)
                     print("🔥 Waiting for a new signal 🔥")
                     return
 
+                # وقت الدخول مطلق حتى تنتظر كل الحسابات التي تتلقى نفس الإشارة نفس المدخل في المجدول
+                fire_at = trade_time_obj.timestamp() - 0.5
                 if time_diff > 0.5:  # عازل زمني 0.5 ثانية
-                    start_wait_time = time.time()
-                    print("ℹ️ Press 's' to skip this trade")
-                    while time_diff > 0.5:
-                        sys.stdout.write(f"\r⏱️ Waiting: {time_diff:.2f} | Press 's' to skip")
+                    start_wait_time = clock.time()
+                    print(f"ℹ️ To skip this trade: POST /skip?symbol={prepared_symbol} on the control port")
+                    # الانتظار عبر المجدول المركزي حتى يمكن إلغاء الدخول عند تعديل أو حذف رسالة الإشارة أو تخطيها من لوحة التحكم
+                    entry_wait = asyncio.ensure_future(entry_scheduler.wait(entry_key, fire_at, label=prepared_symbol))
+                    while not entry_wait.done():
+                        sys.stdout.write(f"\r⏱️ Waiting: {time_diff:.2f}")
                         sys.stdout.flush()
-                        if await asyncio.to_thread(check_for_skip, 0.01):
-                            logging.info(f"تم تخطي الصفقة لـ {symbol} بواسطة المستخدم")
-                            print(f"\n✅ Trade skipped by user for {symbol}")
-                            signal_id = logger.log_signal(symbol, trade_time_exact, direction, signal_score=0, accepted=False)
-                            await display_account_stats(strategy)
-                            print("🔥 Waiting for a new signal 🔥")
-                            return
-                        await asyncio.sleep(0.001)  # تقليل النوم إلى 0.001 ثانية
-                        time_diff = (trade_time_obj - datetime.now(target_tz)).total_seconds()
+                        # الدقة في وقت الدخول يوفرها المجدول؛ هذه الحلقة للعرض فقط
+                        await asyncio.wait({entry_wait}, timeout=COUNTDOWN_REFRESH)
+                        time_diff = (trade_time_obj - clock.now(target_tz)).total_seconds()
 
                     sys.stdout.write("\r" + " " * 50 + "\r")
                     sys.stdout.flush()
-                    logging.info(f"Waiting time: {(time.time() - start_wait_time):.3f}")
+                    logging.info(f"Waiting time: {(clock.time() - start_wait_time):.3f}")
+                    if not entry_wait.result():
+                        logging.info(f"تم إلغاء الصفقة لـ {symbol}: رسالة الإشارة عُدلت أو حُذفت أو تم تخطيها")
+                        print(f"⚠️ Entry for {symbol} cancelled (signal edited/deleted or skipped)")
+                        signals_total.inc(outcome="rejected", reason="cancelled")
+                        arming.cancel()
+                        signal_id = logger.log_signal(symbol, trade_time_exact, direction, signal_score=0, accepted=False)
+                        await display_account_stats(strategy)
+                        print("🔥 Waiting for a new signal 🔥")
+                        return
 
             except ValueError:
                 logging.error(f"تنسيق وقت الصفقة غير صحيح: {trade_time_exact}")
                 print(f"❌ تنسيق وقت الصفقة غير صحيح: {trade_time_exact}")
+                signals_total.inc(outcome="rejected", reason="bad_time")
+                arming.cancel()
                 signal_id = logger.log_signal(symbol, trade_time_exact, direction, signal_score=0, accepted=False)
                 await display_account_stats(strategy)
                 print("🔥 Waiting for a new signal 🔥")
                 return
 
-        # تنفيذ الصفقة الأولى
-        amount = float(strategy.get_amount())
-        balance_before = await client.balance()
+        # تنفيذ الصفقة الأولى: الأمر مجهز مسبقًا، فلا يُرسل عند وقت الدخول إلا buy/sell
+        order = await arming
+        reject_reason = "validation"
+        # حجز المبلغ ضمن حدود الربح/الخسارة المشتركة بين كل السلالم
+        if order is not None and not await ladder.open(amount):
+            print(f"⚠️ {symbol}: profit/loss limit leaves no room for this trade")
+            reject_reason = "limit"
+            order = None
+        print("Started ...👍🏼")
+        if order is not None:
+            # تأخر الإرسال عن وقت الدخول (أو عن استلام الإشارة إذا لم يكن لها وقت)
+            fire_latency = clock.time() - (fire_at if fire_at is not None else start_total_time)
+            trade_id = await fire_armed_trade(client, order, strategy, ladder=ladder, fire_at=fire_at)
+            if on_fire is not None:
+                on_fire(fire_latency, trade_id)
+            balance_before = order.balance
+        else:
+            trade_id = None
+            balance_before = strategy.current_balance
         logging.info(f"الرصيد قبل الصفقة: {balance_before:.2f}, المبلغ: {amount:.2f}")
         signal_id = logger.log_signal(symbol, trade_time, direction, signal_score=1, accepted=True)
-
-        print("Started ...👍🏼")
-        trade_id = await safe_execute_trade(client, prepared_symbol, amount, duration, prepared_direction, strategy.settings["payout"], strategy)
-        execution_duration = time.time() - start_prepare_time
+        execution_duration = clock.time() - start_prepare_time
         logging.info(f"Execution time: {execution_duration:.3f} seconds")
 
         if trade_id is None:
             logging.error(f"فشل تنفيذ الصفقة لـ {prepared_symbol}")
             print(f"❌ فشل تنفيذ الصفقة لـ {prepared_symbol}")
+            signals_total.inc(outcome="rejected", reason=reject_reason if order is None else (order.dropped or "execution_failed"))
+            if order is not None:
+                ladder.release(amount)
+            trades_total.inc(result="failed")
             logger.log_trade(signal_id, symbol, prepared_direction, amount, "failed", balance_before, signal_score=0)
             await display_account_stats(strategy)
             print("🔥 Waiting for a new signal 🔥")
             return
 
+        signals_total.inc(outcome="accepted", reason="fired")
         trade_data = await wait_for_result(client, trade_id, duration)
         result = trade_data.get('result') if trade_data else "loss"
-        balance_after = await client.balance()
+        trades_total.inc(result=result)
+        balance_after = ledger_for(client).settle(trade_id, trade_data, amount)
         strategy.update_balance(balance_after)
         profit_or_loss = float(trade_data.get('profit', -amount)) if trade_data else -amount
 
         if result == "win":
-            result_display = f"WIN ✅{strategy.loss_count if strategy.loss_count > 0 else ''}"
+            result_display = f"WIN ✅{ladder.loss_count if ladder.loss_count > 0 else ''}"
             trade_profit = balance_after - balance_before if balance_after > balance_before else profit_or_loss
             trade_loss = 0.0
         elif result == "loss":
-            result_display = f"Martingale {strategy.loss_count + 1}"
+            result_display = f"Martingale {ladder.loss_count + 1}"
             trade_profit = 0.0
             trade_loss = balance_before - balance_after if balance_before > balance_after else amount
         elif result == "tie":
@@ -236,20 +406,19 @@ async def handle_signal(client: PocketOptionAsync, message: dict, strategy: Mart
 
         logging.info(f"ربح/خسارة الصفقة: {trade_profit:.2f}, الرصيد قبل: {balance_before:.2f}, الرصيد بعد: {balance_after:.2f}")
         logger.log_trade(signal_id, symbol, prepared_direction, amount, result, balance_after, signal_score=1)
-        continue_trading = await strategy.update_amount(result, amount, profit_or_loss, payout)
+        continue_trading = await ladder.update_amount(result, amount, profit_or_loss, payout, trade_id=trade_id)
 
         print(f"💰 Profit: {trade_profit:.2f}, Loss: {trade_loss:.2f}")
         if not continue_trading or not strategy.is_active:
-            if result == "loss" and strategy.loss_count >= strategy.settings["max_loss_count"]:
+            if result == "loss" and ladder.loss_count >= strategy.settings["max_loss_count"]:
                 print(f"✖️ Loss")
             elif result == "win":
                 print(f"WIN ✅")
-            strategy.loss_count = 0  # إعادة تعيين loss_count بعد التوقف
+            ladder.loss_count = 0  # إعادة تعيين loss_count بعد التوقف
             await display_account_stats(strategy)
             print("🔥 Waiting for a new signal 🔥")
             if not strategy.is_active:
-                net_profit = strategy.current_balance - strategy.initial_balance
-                net_loss = strategy.initial_balance - strategy.current_balance if strategy.current_balance < strategy.initial_balance else 0
+                net_profit, net_loss = strategy.net_result()
                 if net_profit >= strategy.settings["profit"]:
                     logging.info(f"توقف التداول بعد الوصول إلى الحد الأقصى للربح ({strategy.settings['profit']})")
                     print(f"🛑 توقف الروبوت: الوصول إلى الحد الأقصى للربح ({strategy.settings['profit']})")
@@ -261,83 +430,23 @@ async def handle_signal(client: PocketOptionAsync, message: dict, strategy: Mart
             return
 
         # حلقة المارتينجال
-        while result == "loss" and strategy.is_active:
-            amount = float(strategy.get_amount())
-            balance_before = await client.balance()
-            logging.info(f"الرصيد قبل الصفقة المضاعفة: {balance_before:.2f}, المبلغ: {amount:.2f}")
-            signal_id = logger.log_signal(symbol, trade_time, direction, signal_score=1, accepted=True)
-
-            print(f"Started Martingale {strategy.loss_count} ...👍🏼")
-            trade_id = await safe_execute_trade(client, prepared_symbol, amount, duration, prepared_direction, strategy.settings["payout"], strategy)
-            execution_duration = time.time() - start_prepare_time
-            logging.info(f"Execution time: {execution_duration:.3f} seconds")
-
-            if trade_id is None:
-                logging.error(f"فشل تنفيذ الصفقة المضاعفة لـ {prepared_symbol}")
-                print(f"❌ فشل تنفيذ الصفقة المضاعفة لـ {prepared_symbol}")
-                logger.log_trade(signal_id, symbol, prepared_direction, amount, "failed", balance_before, signal_score=0)
-                strategy.loss_count = 0  # إعادة تعيين عند الفشل
-                await display_account_stats(strategy)
-                print("🔥 Waiting for a new signal 🔥")
-                return
-
-            trade_data = await wait_for_result(client, trade_id, duration)
-            result = trade_data.get('result') if trade_data else "loss"
-            balance_after = await client.balance()
-            strategy.update_balance(balance_after)
-            profit_or_loss = float(trade_data.get('profit', -amount)) if trade_data else -amount
-
-            if result == "win":
-                result_display = f"WIN ✅{strategy.loss_count if strategy.loss_count > 0 else ''}"
-                trade_profit = balance_after - balance_before if balance_after > balance_before else profit_or_loss
-                trade_loss = 0.0
-            elif result == "loss":
-                result_display = f"Martingale {strategy.loss_count + 1}"
-                trade_profit = 0.0
-                trade_loss = balance_before - balance_after if balance_before > balance_after else amount
-            elif result == "tie":
-                result_display = "DOJI ⚖"
-                trade_profit = 0.0
-                trade_loss = 0.0
-            else:
-                result_display = result
-                trade_profit = 0.0
-                trade_loss = amount
-
-            if result in ["win", "tie"]:
-                os.system('cls' if os.name == 'nt' else 'clear')
-            logging.info(f"تم تنفيذ الصفقة المضاعفة: {prepared_symbol} ({prepared_direction}), المبلغ: {amount:.2f}, النتيجة: {result_display}, الرصيد: {balance_after:.2f}")
-            print(f"✅ The trade was a {result_display}")
-
-            logging.info(f"ربح/خسارة الصفقة المضاعفة: {trade_profit:.2f}, الرصيد قبل: {balance_before:.2f}, الرصيد بعد: {balance_after:.2f}")
-            logger.log_trade(signal_id, symbol, prepared_direction, amount, result, balance_after, signal_score=1)
-            continue_trading = await strategy.update_amount(result, amount, profit_or_loss, payout)
-
-            print(f"💰 Profit: {trade_profit:.2f}, Loss: {trade_loss:.2f}")
-            if not continue_trading or not strategy.is_active:
-                if result == "loss" and strategy.loss_count >= strategy.settings["max_loss_count"]:
-                    print(f"✖️ Loss")
-                elif result == "win":
-                    print(f"WIN ✅")
-                strategy.loss_count = 0  # إعادة تعيين loss_count بعد التوقف
-                await display_account_stats(strategy)
-                print("🔥 Waiting for a new signal 🔥")
-                logging.info(f"توقف حلقة المارتينجال: continue_trading={continue_trading}, is_active={strategy.is_active}, loss_count={strategy.loss_count}")
-                if not strategy.is_active:
-                    net_profit = strategy.current_balance - strategy.initial_balance
-                    net_loss = strategy.initial_balance - strategy.current_balance if strategy.current_balance < strategy.initial_balance else 0
-                    if net_profit >= strategy.settings["profit"]:
-                        logging.info(f"توقف التداول بعد الوصول إلى الحد الأقصى للربح ({strategy.settings['profit']})")
-                        print(f"🛑 توقف الروبوت: الوصول إلى الحد الأقصى للربح ({strategy.settings['profit']})")
-                    elif net_loss >= strategy.settings["loss"]:
-                        logging.info(f"توقف التداول بعد الوصول إلى الحد الأقصى للخسارة ({strategy.settings['loss']})")
-                        print(f"🛑 توقف الروبوت: الوصول إلى الحد الأقصى للخسارة ({strategy.settings['loss']})")
-                    await display_account_stats(strategy)
-                    print("👋 Session ended and logged.")
-                return
+        await run_martingale(
+            client, strategy, ladder, logger, symbol, trade_time, direction,
+            prepared_symbol, duration, prepared_direction, payout, start_prepare_time
+        )
     except Exception as e:
         logging.error(f"خطأ أثناء معالجة الإشارة: {str(e)}")
         print(f"⚠️ خطأ أثناء معالجة الإشارة: {str(e)}")
+        signals_total.inc(outcome="rejected", reason="error")
+        if arming is not None:
+            # لا تُترك فحوصات التجهيز تعمل، ولا استثناء غير مقروء في المهمة
+            if arming.done():
+                if not arming.cancelled():
+                    arming.exception()
+            else:
+                arming.cancel()
+        if ladder is not None:
+            ladder.release()
         try:
             symbol = message.get("symbol", "unknown")
             trade_time = message.get("duration", "unknown")
@@ -348,4 +457,5 @@ async def handle_signal(client: PocketOptionAsync, message: dict, strategy: Mart
         await display_account_stats(strategy)
         print("🔥 Waiting for a new signal 🔥")
     finally:
-        logging.info(f"Total signal handling time: {(time.time() - start_total_time):.3f} seconds")
\ No newline at end of file
+        stage_seconds.observe(clock.time() - start_total_time, stage="total")
+        logging.info(f"Total signal handling time: {(clock.time() - start_total_time):.3f} seconds")
\ No newline at end of file
@@ -0,0 +1,336 @@
+import asyncio
+import logging
+from collections import deque
+from datetime import datetime, timezone
+from utils import clock
+from utils.metrics import stage_seconds
+
+# إعدادات التسجيل
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[logging.FileHandler('errors.log', mode='a', encoding='utf-8')]
+)
+
+# المهلة القصوى لانتظار تأكيد فتح الصفقة (بالثواني)
+CONFIRM_TIMEOUT = 3.0
+# البحث مرة واحدة في opened_deals() إذا لم تصل بيانات الفتح مع الأمر
+CONFIRM_FALLBACK = True
+# الفاصل بين عمليات البحث في الصفقات المغلقة بعد انتهاء مدة الصفقة
+RESULT_POLL_INTERVAL = 0.5
+# أقصى انتظار للنتيجة بعد انتهاء مدة الصفقة قبل اعتبارها مفقودة
+RESULT_MAX_WAIT = 30.0
+# نافذة مطابقة نية أمر بلا معرف مع صفقات الخادم، بالثواني بعد تسجيل النية
+LOCATE_WINDOW = 10.0
+
+
+def _deal_id(deal):
+    if isinstance(deal, dict):
+        return deal.get("id")
+    return None
+
+
+class OrderAcknowledgements:
+    """Awaitable open acknowledgements keyed by trade id.
+
+    `buy`/`sell` already return the order-opened data sent by the server;
+    `acknowledge` resolves the future waiting on that trade id. Any other
+    source of open events can resolve it the same way. Latency is measured
+    from the moment the order was sent to the acknowledgement.
+    """
+
+    def __init__(self, history: int = 200):
+        self.pending = {}
+        self.latencies = deque(maxlen=history)
+        self.confirmed = 0
+        self.fallbacks = 0
+        self.failed = 0
+
+    def expect(self, trade_id) -> asyncio.Future:
+        future = self.pending.get(trade_id)
+        if future is None:
+            future = self.pending[trade_id] = asyncio.get_running_loop().create_future()
+        return future
+
+    def acknowledge(self, trade_id, deal) -> bool:
+        """تأكيد الصفقة ببيانات الفتح؛ يعيد False إذا لم تطابق المعرف."""
+        deal_id = _deal_id(deal)
+        if not deal or (deal_id is not None and str(deal_id) != str(trade_id)):
+            return False
+        future = self.expect(trade_id)
+        if not future.done():
+            future.set_result(deal)
+        return True
+
+    async def _lookup_opened(self, client, trade_id) -> bool:
+        try:
+            deals = await client.opened_deals()
+        except Exception as e:
+            logging.warning(f"opened_deals() lookup for {trade_id} failed: {str(e)}")
+            return False
+        for deal in deals or []:
+            if str(_deal_id(deal)) == str(trade_id):
+                return self.acknowledge(trade_id, deal)
+        return False
+
+    async def confirm(self, client, trade_id, deal=None, sent_at=None, timeout: float = CONFIRM_TIMEOUT, fallback: bool = CONFIRM_FALLBACK) -> bool:
+        """Wait for the open acknowledgement of `trade_id`; returns True once it is seen."""
+        future = self.expect(trade_id)
+        try:
+            if deal is not None and not self.acknowledge(trade_id, deal):
+                logging.warning(f"Order-opened data does not match trade {trade_id}: {deal}")
+            if not future.done() and fallback:
+                self.fallbacks += 1
+                await self._lookup_opened(client, trade_id)
+            if not future.done():
+                await asyncio.wait_for(asyncio.shield(future), timeout=timeout)
+        except asyncio.TimeoutError:
+            self.failed += 1
+            return False
+        finally:
+            self.pending.pop(trade_id, None)
+        self.confirmed += 1
+        if sent_at is not None:
+            latency = clock.monotonic() - sent_at
+            self.latencies.append(latency)
+            stage_seconds.observe(latency, stage="confirm")
+            logging.info(f"Trade {trade_id} acknowledged in {latency * 1000:.1f} ms")
+        return True
+
+    def stats(self) -> dict:
+        latencies = sorted(self.latencies)
+        return {
+            "confirmed": self.confirmed,
+            "fallbacks": self.fallbacks,
+            "failed": self.failed,
+            "ack_ms_avg": round(sum(latencies) / len(latencies) * 1000, 1) if latencies else None,
+            "ack_ms_max": round(latencies[-1] * 1000, 1) if latencies else None,
+        }
+
+
+order_acks = OrderAcknowledgements()
+
+
+def _deal_time(value):
+    """وقت فتح الصفقة كـ timestamp: رقم بالثواني أو الملّي ثانية، أو نص تاريخ (UTC إذا لم تُذكر المنطقة)."""
+    if isinstance(value, str):
+        text = value.strip()
+        try:
+            value = float(text)
+        except ValueError:
+            try:
+                parsed = datetime.fromisoformat(text.replace("Z", "+00:00"))
+            except ValueError:
+                return None
+            if parsed.tzinfo is None:
+                parsed = parsed.replace(tzinfo=timezone.utc)
+            return parsed.timestamp()
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return value / 1000 if value > 1e11 else float(value)
+    return None
+
+
+def _matches_intent(deal, entry) -> bool:
+    if not isinstance(deal, dict) or deal.get("asset") != entry.get("symbol"):
+        return False
+    try:
+        if abs(float(deal.get("amount")) - float(entry.get("amount"))) > 1e-6:
+            return False
+    except (TypeError, ValueError):
+        return False
+    # بدون وقت فتح مقروء لا مطابقة: مبالغ السلم تتكرر، وصفقة قديمة بنفس الأصل والمبلغ ليست هذه النية
+    opened = _deal_time(deal.get("openTime"))
+    if opened is None or "t" not in entry:
+        return False
+    return entry["t"] - 1.0 <= opened <= entry["t"] + LOCATE_WINDOW
+
+
+async def locate_order(client, entry: dict, exclude=()):
+    """Find a journaled order whose fate is unknown after a restart.
+
+    An entry with a trade id (its ack failed or never came) is looked up by
+    id in opened_deals, then closed_deals, then check_win. An intent with no
+    trade id (the process stopped during the buy round trip) is matched by
+    asset, amount and an open time within LOCATE_WINDOW of the intent;
+    deals in `exclude` (ids the journal already knows) are never matched.
+    Returns the trade id if the server opened the order, or None.
+    """
+    trade_id = entry.get("trade_id")
+    for lookup in ("opened_deals", "closed_deals"):
+        try:
+            deals = await getattr(client, lookup)() or []
+        except Exception as e:
+            logging.warning(f"{lookup}() lookup for journaled order failed: {str(e)}")
+            continue
+        for deal in deals:
+            if trade_id is not None and str(_deal_id(deal)) == str(trade_id):
+                return trade_id
+            if trade_id is None and str(_deal_id(deal)) not in exclude and _matches_intent(deal, entry):
+                return _deal_id(deal)
+    if trade_id is None:
+        return None
+    try:
+        async with asyncio.timeout(RESULT_POLL_INTERVAL * 4):
+            trade_data = await client.check_win(trade_id)
+        if trade_data and "result" in trade_data:
+            return trade_id
+    except Exception as e:
+        logging.warning(f"check_win for journaled trade {trade_id} failed: {str(e)}")
+    return None
+
+
+class TrackedTrade:
+    __slots__ = ("trade_id", "client", "expires_at", "next_check", "future")
+
+    def __init__(self, trade_id, client, expires_at: float, future: asyncio.Future):
+        self.trade_id = trade_id
+        self.client = client
+        self.expires_at = expires_at
+        self.next_check = expires_at
+        self.future = future
+
+
+class ResultTracker:
+    """Follows every open trade and resolves a future with its result.
+
+    One task sleeps until the earliest expiry. Trades of the same client
+    that are due together share a single closed_deals() call; check_win is
+    only used for a closed deal without a result field, or when the client
+    cannot list closed deals. `resolve` lets any close event deliver a
+    result directly. The gap between expiry and delivery is recorded.
+    """
+
+    def __init__(self, poll_interval: float = RESULT_POLL_INTERVAL, max_wait: float = RESULT_MAX_WAIT, history: int = 200):
+        self.poll_interval = poll_interval
+        self.max_wait = max_wait
+        self.pending = {}
+        self.task = None
+        self.wake = None
+        self.gaps = deque(maxlen=history)
+        self.delivered = 0
+        self.timeouts = 0
+        self.lookups = 0
+
+    def track(self, client, trade_id, expires_at: float) -> asyncio.Future:
+        """متابعة صفقة تنتهي في expires_at (clock.time())."""
+        entry = self.pending.get(trade_id)
+        if entry is None:
+            entry = TrackedTrade(trade_id, client, expires_at, asyncio.get_running_loop().create_future())
+            self.pending[trade_id] = entry
+        self._ensure_task()
+        self.wake.set()
+        return entry.future
+
+    async def wait(self, client, trade_id, expires_at: float):
+        """Return the trade data with its result, or None if it never arrives."""
+        return await asyncio.shield(self.track(client, trade_id, expires_at))
+
+    def resolve(self, trade_id, trade_data) -> bool:
+        """تسليم نتيجة صفقة (من حدث إغلاق أو من قائمة الصفقات المغلقة)."""
+        entry = self.pending.pop(trade_id, None)
+        if entry is None:
+            return False
+        gap = clock.time() - entry.expires_at
+        if trade_data is None:
+            self.timeouts += 1
+            logging.error(f"No result for trade {trade_id} {gap:.1f}s after expiry")
+        else:
+            self.delivered += 1
+            self.gaps.append(gap)
+            stage_seconds.observe(max(gap, 0.0), stage="result_delay")
+            logging.info(f"Result for trade {trade_id}: {trade_data.get('result')}, {gap:.3f}s after expiry")
+        if not entry.future.done():
+            entry.future.set_result(trade_data)
+        return True
+
+    def _ensure_task(self):
+        loop = asyncio.get_running_loop()
+        if self.task is not None and not self.task.done() and self.task.get_loop() is loop:
+            return
+        self.wake = asyncio.Event()
+        self.task = loop.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            if not self.pending:
+                self.wake.clear()
+                await self.wake.wait()
+                continue
+            now = clock.time()
+            delay = min(entry.next_check for entry in self.pending.values()) - now
+            if delay > 0:
+                self.wake.clear()
+                try:
+                    await asyncio.wait_for(self.wake.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            due = {}
+            for entry in self.pending.values():
+                if entry.next_check <= now:
+                    due.setdefault(id(entry.client), []).append(entry)
+            await asyncio.gather(*(self._check(entries) for entries in due.values()))
+
+    async def _check(self, entries):
+        """بحث واحد في الصفقات المغلقة لكل الصفقات المستحقة لنفس العميل."""
+        client = entries[0].client
+        self.lookups += 1
+        try:
+            # نفس مهلة _check_win: طلب معلق لا يوقف متابعة كل الصفقات
+            async with asyncio.timeout(self.poll_interval * 4):
+                closed = {str(_deal_id(deal)): deal for deal in (await client.closed_deals() or [])}
+        except Exception as e:
+            logging.warning(f"closed_deals() lookup failed, falling back to check_win: {str(e) or type(e).__name__}")
+            closed = None
+        lookups = []
+        for entry in entries:
+            deal = closed.get(str(entry.trade_id)) if closed is not None else None
+            if deal is not None and "result" in deal:
+                self.resolve(entry.trade_id, deal)
+            elif deal is not None or closed is None:
+                lookups.append(entry)
+            else:
+                self._retry(entry)
+        if lookups:
+            await asyncio.gather(*(self._check_win(entry) for entry in lookups))
+
+    async def _check_win(self, entry):
+        try:
+            async with asyncio.timeout(self.poll_interval * 4):
+                trade_data = await entry.client.check_win(entry.trade_id)
+            if trade_data and "result" in trade_data:
+                self.resolve(entry.trade_id, trade_data)
+                return
+        except Exception as e:
+            logging.warning(f"check_win for trade {entry.trade_id} failed: {str(e)}")
+        self._retry(entry)
+
+    def _retry(self, entry):
+        now = clock.time()
+        if now - entry.expires_at >= self.max_wait:
+            self.resolve(entry.trade_id, None)
+        else:
+            entry.next_check = now + self.poll_interval
+
+    async def stop(self):
+        for trade_id in list(self.pending):
+            entry = self.pending.pop(trade_id)
+            entry.future.cancel()
+        if self.task is not None:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+
+    def stats(self) -> dict:
+        gaps = sorted(self.gaps)
+        return {
+            "open": len(self.pending),
+            "delivered": self.delivered,
+            "timeouts": self.timeouts,
+            "lookups": self.lookups,
+            "gap_avg": round(sum(gaps) / len(gaps), 3) if gaps else None,
+            "gap_max": round(gaps[-1], 3) if gaps else None,
+        }
+
+
+result_tracker = ResultTracker()
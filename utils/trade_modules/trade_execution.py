@@ -1,10 +1,15 @@
 from BinaryOptionsToolsV2.pocketoption.asyncronous import PocketOptionAsync
 import logging
-import time
 import asyncio
-import aiohttp
+from utils.connectivity import connectivity_monitor
+from utils import clock
 from .trade_utils import check_payout, display_account_stats
-from utils.redis_client import redis_client
+from .trade_validation import run_checks
+from .order_tracking import order_acks, locate_order, CONFIRM_TIMEOUT
+from utils.balance_ledger import ledger_for
+from utils.connection_supervisor import hold_deadline, LateOrderError
+from utils.metrics import stage_seconds
+from utils.symbol_catalog import alias_key
 
 # إعدادات التسجيل
 logging.basicConfig(
@@ -21,176 +26,257 @@ logger = logging.getLogger()
 if not any(isinstance(h, logging.StreamHandler) for h in logger.handlers):
     logger.addHandler(console_handler)
 
-async def check_internet_connection(timeout=1):
-    """التحقق من الاتصال بالإنترنت مرة واحدة فقط."""
-    url = 'https://po.trade'
-    try:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url, timeout=timeout) as response:
-                if response.status == 200:
-                    logging.info(f"الاتصال بالإنترنت ناجح عبر {url}")
-                    return True
-                else:
-                    logging.error(f"فشل التحقق من الاتصال عبر {url}: استجابة غير متوقعة {response.status}")
-                    print(f"⚠️ فشل التحقق من الاتصال عبر {url}: استجابة {response.status}")
-    except Exception as e:
-        logging.error(f"فشل التحقق من الاتصال عبر {url}: {str(e)}")
-        print(f"⚠️ فشل التحقق من الاتصال عبر {url}: {str(e)}")
+async def check_internet_connection():
+    """التحقق من الاتصال بالإنترنت من الحالة المخزنة لمراقب الاتصال."""
+    if await connectivity_monitor.check():
+        return True
+    logging.error(f"لا يوجد اتصال بالإنترنت، فشل متتالي: {connectivity_monitor.consecutive_failures}")
+    print("⚠️ فشل التحقق من الاتصال بالإنترنت")
     return False
 
-async def is_ws_connected(client: PocketOptionAsync):
-    """التحقق من اتصال WebSocket باستخدام balance مع التخزين المؤقت."""
-    try:
-        # التحقق من التخزين المؤقت أولاً
-        redis_key = "ws_connection_status"
-        cached_status = redis_client.get_data(redis_key)
-        if cached_status and cached_status.get("is_connected", False):
-            logging.info("استخدام حالة اتصال WebSocket من التخزين المؤقت")
-            return True
-
-        # إذا لم يكن هناك تخزين مؤقت، نفذ طلب balance
-        balance = await client.balance()
-        if balance is not None and isinstance(balance, (int, float)) and balance >= 0:
-            redis_client.set_data(redis_key, {"is_connected": True}, ttl=30)  # تخزين مؤقت لمدة 30 ثانية
-            logging.info("اتصال WebSocket نشط")
-            return True
-        else:
-            logging.error("فشل التحقق من اتصال WebSocket: استجابة غير صالحة من balance")
-            redis_client.set_data(redis_key, {"is_connected": False}, ttl=30)
-            return False
-    except Exception as e:
-        logging.error(f"اتصال WebSocket غير نشط: {str(e)}")
-        print(f"⚠️ فشل الاتصال بـ WebSocket: {str(e)}")
-        redis_client.set_data(redis_key, {"is_connected": False}, ttl=30)
-        return False
-
-async def confirm_trade(client: PocketOptionAsync, trade_id, timeout=3):
-    """تأكيد تنفيذ الصفقة."""
-    start_time = time.time()
-    while time.time() - start_time < timeout:
-        try:
-            balance = await client.balance()
-            if balance is not None and balance >= 0:
-                logging.info(f"تم تأكيد الصفقة {trade_id} بنجاح")
-                return True
-        except Exception as e:
-            logging.warning(f"فشل تأكيد الصفقة {trade_id}: {str(e)}")
-        await asyncio.sleep(0.5)
+async def confirm_trade(client: PocketOptionAsync, trade_id, deal=None, sent_at=None, timeout=CONFIRM_TIMEOUT):
+    """تأكيد تنفيذ الصفقة من بيانات فتح الصفقة المطابقة لمعرفها."""
+    if await order_acks.confirm(client, trade_id, deal, sent_at, timeout):
+        logging.info(f"تم تأكيد الصفقة {trade_id} بنجاح")
+        return True
     logging.error(f"لم يتم تأكيد الصفقة {trade_id} خلال {timeout} ثواني")
     print(f"⚠️ لم يتم تأكيد الصفقة {trade_id}")
+    # الصفقة قد تكون فُتحت رغم عدم التأكيد: مطابقة الرصيد مع الخادم
+    ledger_for(client).schedule_reconcile()
     return False
 
-async def safe_execute_trade(client: PocketOptionAsync, symbol: str, amount: float, duration_input, direction: str, min_payout: float, martingale_strategy):
-    """تنفيذ الصفقة مرة واحدة مع التحقق من الاتصال والرصيد."""
+MINIMUM_TRADE_AMOUNT = 1.0
+BUFFER_AMOUNT = 0.5
+DURATION_MAP = {"M1": 60, "M2": 120, "M3": 180, "M5": 300, "M15": 900}
+# عمر الأمر المجهز الذي يستدعي إعادة فحص سريعة لحالة الاتصال قبل الإرسال
+ARMED_ORDER_MAX_AGE = 5.0
+# أقصى تأخر مقبول عن وقت الدخول؛ بعده يُسقط الأمر بدل إرسال صفقة غير التي طلبتها الإشارة
+LATE_TOLERANCE = 2.0
+# انتظار قبل البحث على الخادم عن أمر فشل استدعاء buy/sell الخاص به
+INTENT_LOOKUP_DELAY = CONFIRM_TIMEOUT
+
+# عمليات البحث الجارية في الخلفية (مرجع حتى لا تُجمع المهام قبل انتهائها)
+_intent_lookups = set()
+
+async def resolve_intent(client: PocketOptionAsync, journal, intent, entry: dict, delay: float = INTENT_LOOKUP_DELAY):
+    """Settle the journal intent of an order whose buy/sell raised, so it stops blocking session_end.
+
+    The order is looked up on the server: if it opened anyway it is
+    journaled as an acknowledged order (and the balance ledger reconciled,
+    since its stake was released), otherwise the intent is aborted.
+    """
+    trade_id = None
     try:
-        start_time_total = time.time()
-        # التحقق من الاتصال بالإنترنت
-        internet_start = time.time()
-        if not await check_internet_connection():
-            await display_account_stats(martingale_strategy)
-            return None
-        logging.info(f"وقت التحقق من الاتصال بالإنترنت: {(time.time() - internet_start):.3f} ثانية")
+        await asyncio.sleep(delay)
+        trade_id = await locate_order(client, entry, exclude=journal.journal.known)
+    except Exception as e:
+        logging.error(f"البحث عن الأمر المجهول لـ {entry['symbol']} فشل: {str(e)}")
+    if trade_id is None:
+        journal.abort(intent, reason="not on server")
+        return
+    journal.order(intent, trade_id)
+    journal.ack(trade_id, True)
+    ledger_for(client).schedule_reconcile()
+    logging.warning(f"الصفقة {trade_id} لـ {entry['symbol']} فُتحت رغم فشل الإرسال؛ نتيجتها لا تُطبق على السلم")
+    print(f"⚠️ {entry['symbol']}: order {trade_id} opened although sending failed, balance reconciled")
 
-        # التحقق من اتصال WebSocket
-        if not await is_ws_connected(client):
-            await display_account_stats(martingale_strategy)
-            return None
+def _resolve_later(client, journal, intent, entry):
+    task = asyncio.ensure_future(resolve_intent(client, journal, intent, entry))
+    _intent_lookups.add(task)
+    task.add_done_callback(_intent_lookups.discard)
 
-        # التحقق من الرصيد
-        MINIMUM_TRADE_AMOUNT = 1.0
-        BUFFER_AMOUNT = 0.5
-        balance = await client.balance()
-        if balance is None or balance < 0:
-            logging.error("فشل جلب الرصيد قبل تنفيذ الصفقة")
-            print("⚠️ فشل جلب الرصيد")
-            await display_account_stats(martingale_strategy)
-            return None
-        logging.info(f"الرصيد الحالي: {balance}, المبلغ المطلوب: {amount}, الحد الأدنى: {MINIMUM_TRADE_AMOUNT}, الاحتياطي: {BUFFER_AMOUNT}")
-        if balance < amount + MINIMUM_TRADE_AMOUNT + BUFFER_AMOUNT:
-            logging.error(f"الرصيد غير كافٍ: {balance} < {amount + MINIMUM_TRADE_AMOUNT + BUFFER_AMOUNT}")
-            print(f"⚠️ الرصيد غير كافٍ: {balance:,.2f} $")
-            await display_account_stats(martingale_strategy)
-            return None
+async def check_connectivity():
+    if await check_internet_connection():
+        return True, None, None
+    return False, "لا يوجد اتصال بالإنترنت", None
 
-        # التحقق من نسبة العائد
-        api_symbol, payout = await check_payout(client, symbol, min_payout)
-        if api_symbol is None:
-            logging.error(f"الأصل {symbol} غير نشط أو العائد أقل من الحد الأدنى")
-            print(f"⚠️ الأصل {symbol} غير نشط أو العائد أقل من الحد الأدنى")
-            await display_account_stats(martingale_strategy)
-            return None
+async def check_balance(client: PocketOptionAsync, amount: float):
+    """التحقق من كفاية الرصيد من سجل الرصيد المحلي."""
+    balance = await ledger_for(client).get()
+    if balance is None or not isinstance(balance, (int, float)) or balance < 0:
+        return False, "فشل جلب الرصيد", None
+    logging.info(f"الرصيد الحالي: {balance}, المبلغ المطلوب: {amount}, الحد الأدنى: {MINIMUM_TRADE_AMOUNT}, الاحتياطي: {BUFFER_AMOUNT}")
+    if balance < amount + MINIMUM_TRADE_AMOUNT + BUFFER_AMOUNT:
+        return False, f"الرصيد غير كافٍ: {balance:,.2f} $", balance
+    return True, None, balance
 
-        # تحويل المدة
-        duration_map = {"M1": 60, "M2": 120, "M3": 180, "M5": 300, "M15": 900}
-        if isinstance(duration_input, str):
-            duration = duration_map.get(duration_input.upper())
-            if duration is None:
-                logging.error(f"مدة غير معروفة: {duration_input}")
-                print(f"⚠️ مدة غير مدعومة: {duration_input}")
+async def check_symbol_payout(client: PocketOptionAsync, symbol: str, min_payout: float):
+    api_symbol, payout = await check_payout(client, symbol, min_payout)
+    if api_symbol is None:
+        return False, f"الأصل {symbol} غير نشط أو العائد أقل من الحد الأدنى", None
+    return True, None, (api_symbol, payout)
+
+def check_duration(duration_input):
+    """تحويل المدة (M1...) إلى ثوانٍ والتحقق من صحتها."""
+    if not isinstance(duration_input, (str, int, float)):
+        return False, f"نوع المدة غير صالح: {duration_input}", None
+    if isinstance(duration_input, str):
+        duration = DURATION_MAP.get(duration_input.upper())
+        if duration is None:
+            return False, f"مدة غير مدعومة: {duration_input}", None
+    else:
+        duration = duration_input
+    if duration <= 0 or duration > 900:
+        return False, f"مدة غير صالحة: {duration}", None
+    return True, None, duration
+
+class ArmedOrder:
+    """أمر جاهز للإرسال: كل الفحوصات تمت، ويبقى فقط استدعاء buy/sell."""
+
+    def __init__(self, symbol, amount, duration, direction, payout, balance, report):
+        self.symbol = symbol
+        self.amount = amount
+        self.duration = duration
+        self.direction = direction
+        self.payout = payout
+        self.balance = balance
+        self.report = report
+        self.armed_at = clock.monotonic()
+        self.dropped = None  # سبب إسقاط الأمر دون إرسال (مثلاً "late")
+
+async def arm_trade(client: PocketOptionAsync, symbol: str, amount: float, duration_input, direction: str, min_payout: float, quote=None):
+    """Run every pre-trade validation and return an ArmedOrder, or None if rejected.
+
+    `quote` is an (api_symbol, payout) pair the caller already fetched for
+    this signal; when given, the payout is not looked up again.
+    """
+    if direction not in ("call", "put"):
+        logging.error(f"اتجاه غير صالح: {direction}")
+        print(f"⚠️ اتجاه غير صالح: {direction}")
+        return None
+    # الفحوصات مستقلة عن بعضها: تشغيلها معًا ضمن ميزانية زمنية واحدة
+    report = await run_checks({
+        "internet": check_connectivity,
+        "balance": lambda: check_balance(client, amount),
+        "payout": (lambda: (True, None, quote)) if quote and quote[0] else (lambda: check_symbol_payout(client, symbol, min_payout)),
+        "duration": lambda: check_duration(duration_input),
+    })
+    if not report.ok:
+        logging.error(f"رفض الصفقة لـ {symbol}: {report.failed.name} - {report.failed.reason}")
+        print(f"⚠️ {report.failed.reason}")
+        return None
+    api_symbol, payout = report.value("payout")
+    return ArmedOrder(api_symbol, amount, report.value("duration"), direction, payout, report.value("balance"), report)
+
+async def fire_armed_trade(client: PocketOptionAsync, order: ArmedOrder, martingale_strategy, max_age: float = ARMED_ORDER_MAX_AGE, ladder=None,
+                           fire_at: float = None, late_tolerance: float = LATE_TOLERANCE):
+    """Send the armed order, with a cheap connectivity check if arming was long ago.
+
+    `fire_at` is the signal's entry time (clock.time()). When given, the
+    order is dropped with reason "late" instead of being sent more than
+    `late_tolerance` seconds after it, including while the client is
+    reconnecting.
+    """
+    journal = getattr(martingale_strategy, "journal", None)
+    deadline_token = None
+    try:
+        if fire_at is not None:
+            remaining = fire_at + late_tolerance - clock.time()
+            if remaining <= 0:
+                order.dropped = "late"
+                logging.error(f"الأمر لـ {order.symbol} متأخر {late_tolerance - remaining:.1f} ثانية عن وقت الدخول، أُسقط")
+                print(f"⚠️ {order.symbol}: entry time passed, order dropped")
                 await display_account_stats(martingale_strategy)
                 return None
-        else:
-            duration = duration_input
-
-        # التحقق من صحة المدة
-        if not isinstance(duration_input, (str, int, float)):
-            logging.error(f"نوع المدة غير صالح: {type(duration_input)}، القيمة: {duration_input}")
-            print(f"⚠️ نوع المدة غير صالح: {duration_input}")
-            await display_account_stats(martingale_strategy)
-            return None
-        if not isinstance(duration, (int, float)) or duration <= 0 or duration > 900:
-            logging.error(f"مدة غير صالحة: {duration}")
-            print(f"⚠️ مدة غير صالحة: {duration}")
+            deadline_token = hold_deadline.set(clock.monotonic() + remaining)
+        age = clock.monotonic() - order.armed_at
+        if age > max_age and not connectivity_monitor.is_online:
+            logging.error(f"الأمر المجهز لـ {order.symbol} قديم ({age:.1f} ثانية) ولا يوجد اتصال")
+            print("⚠️ لا يوجد اتصال بالإنترنت")
             await display_account_stats(martingale_strategy)
             return None
 
+        # نية الأمر على القرص قبل إرساله: توقف البرنامج أثناء buy لا يُضيع صفقة قد تكون فُتحت
+        intent = None
+        intent_entry = {"symbol": order.symbol, "amount": order.amount, "t": clock.time()}
+        if journal is not None:
+            intent = await journal.intent(ladder.key if ladder is not None else alias_key(order.symbol), order, clock.time() + order.duration)
+
         # تنفيذ الصفقة
-        start_time = time.time()
+        start_time = clock.time()
+        sent_at = clock.monotonic()
         trade_id = None
+        deal = None
         timeout = 60
         try:
             async with asyncio.timeout(timeout):
-                if direction == "call":
-                    trade_id, _ = await client.buy(api_symbol, amount, duration, check_win=False)
-                elif direction == "put":
-                    trade_id, _ = await client.sell(api_symbol, amount, duration, check_win=False)
+                if order.direction == "call":
+                    trade_id, deal = await client.buy(order.symbol, order.amount, order.duration, check_win=False)
                 else:
-                    logging.error(f"اتجاه غير صالح: {direction}")
-                    print(f"⚠️ اتجاه غير صالح: {direction}")
-                    await display_account_stats(martingale_strategy)
-                    return None
+                    trade_id, deal = await client.sell(order.symbol, order.amount, order.duration, check_win=False)
+        except LateOrderError as e:
+            order.dropped = "late"
+            if journal is not None:
+                journal.abort(intent, reason="late")
+            logging.error(f"إسقاط الأمر لـ {order.symbol}: {str(e)}")
+            print(f"⚠️ {order.symbol}: still reconnecting at the entry deadline, order dropped")
+            await display_account_stats(martingale_strategy)
+            return None
         except asyncio.TimeoutError:
-            logging.error(f"تجاوز المهلة الزمنية {timeout} ثانية أثناء تنفيذ الصفقة لـ {api_symbol}")
-            print(f"❌ تجاوز المهلة الزمنية {timeout} ثانية لـ {api_symbol}")
+            if journal is not None:
+                _resolve_later(client, journal, intent, intent_entry)
+            logging.error(f"تجاوز المهلة الزمنية {timeout} ثانية أثناء تنفيذ الصفقة لـ {order.symbol}")
+            print(f"❌ تجاوز المهلة الزمنية {timeout} ثانية لـ {order.symbol}")
             await display_account_stats(martingale_strategy)
             return None
         except Exception as e:
-            logging.error(f"خطأ أثناء تنفيذ الصفقة لـ {api_symbol}: {str(e)}")
-            print(f"❌ فشل تنفيذ الصفقة لـ {api_symbol}: {str(e)}")
+            # الأمر قد يكون وصل إلى الخادم قبل الخطأ: مصيره يُعرف في الخلفية
+            if journal is not None:
+                _resolve_later(client, journal, intent, intent_entry)
+            logging.error(f"خطأ أثناء تنفيذ الصفقة لـ {order.symbol}: {str(e)}")
+            print(f"❌ فشل تنفيذ الصفقة لـ {order.symbol}: {str(e)}")
             await display_account_stats(martingale_strategy)
             return None
 
-        end_time = time.time()
+        end_time = clock.time()
+        stage_seconds.observe(end_time - start_time, stage="buy")
         logging.info(f"تأخير تنفيذ الصفقة: {(end_time - start_time):.3f} ثانية")
 
         # تأكيد الصفقة
         if trade_id is not None:
-            if await confirm_trade(client, trade_id):
-                logging.info(f"نجاح بدء الصفقة: {api_symbol}, trade_id: {trade_id}")
+            ledger_for(client).reserve(trade_id, order.amount)
+            if journal is not None:
+                journal.order(intent, trade_id)
+            confirmed = await confirm_trade(client, trade_id, deal, sent_at)
+            if journal is not None:
+                journal.ack(trade_id, confirmed)
+            if confirmed:
+                logging.info(f"نجاح بدء الصفقة: {order.symbol}, trade_id: {trade_id}")
                 return trade_id
             else:
-                logging.error(f"لم يتم تأكيد الصفقة: {api_symbol}")
-                print(f"❌ لم يتم تأكيد الصفقة: {api_symbol}")
+                logging.error(f"لم يتم تأكيد الصفقة: {order.symbol}")
+                print(f"❌ لم يتم تأكيد الصفقة: {order.symbol}")
                 await display_account_stats(martingale_strategy)
                 return None
         else:
-            logging.error(f"فشل تنفيذ الصفقة لـ {api_symbol}: لا يوجد معرف صفقة")
-            print(f"❌ فشل تنفيذ الصفقة لـ {api_symbol}")
+            if journal is not None:
+                journal.abort(intent, reason="no trade id")
+            logging.error(f"فشل تنفيذ الصفقة لـ {order.symbol}: لا يوجد معرف صفقة")
+            print(f"❌ فشل تنفيذ الصفقة لـ {order.symbol}")
             await display_account_stats(martingale_strategy)
             return None
 
+    except Exception as e:
+        logging.error(f"خطأ عام أثناء تنفيذ الصفقة لـ {order.symbol}: {str(e)}")
+        print(f"❌ خطأ عام أثناء تنفيذ الصفقة: {str(e)}")
+        await display_account_stats(martingale_strategy)
+        return None
+    finally:
+        if deadline_token is not None:
+            hold_deadline.reset(deadline_token)
+
+async def safe_execute_trade(client: PocketOptionAsync, symbol: str, amount: float, duration_input, direction: str, min_payout: float, martingale_strategy, ladder=None):
+    """تنفيذ الصفقة مرة واحدة مع التحقق من الاتصال والرصيد."""
+    try:
+        start_time_total = clock.time()
+        order = await arm_trade(client, symbol, amount, duration_input, direction, min_payout)
+        logging.info(f"وقت فحوصات ما قبل الصفقة: {(clock.time() - start_time_total):.3f} ثانية")
+        if order is None:
+            await display_account_stats(martingale_strategy)
+            return None
+        return await fire_armed_trade(client, order, martingale_strategy, ladder=ladder)
     except Exception as e:
         logging.error(f"خطأ عام أثناء تنفيذ الصفقة لـ {symbol}: {str(e)}")
         print(f"❌ خطأ عام أثناء تنفيذ الصفقة: {str(e)}")
         await display_account_stats(martingale_strategy)
-        return None
\ No newline at end of file
+        return None
@@ -1,9 +1,13 @@
 import re
 from datetime import datetime
+import pytz
 from BinaryOptionsToolsV2.pocketoption.asyncronous import PocketOptionAsync
 import logging
 import asyncio
 from utils.redis_client import redis_client
+from utils.payout_index import payout_index
+from utils.symbol_catalog import alias_key, OTC_SUFFIX
+from utils import clock
 
 # إعدادات التسجيل
 logging.basicConfig(
@@ -21,8 +25,7 @@ logging.getLogger().addHandler(console_handler)
 async def display_account_stats(martingale_strategy):
     """عرض إحصائيات الحساب باستخدام بيانات MartingaleStrategy"""
     try:
-        net_profit = martingale_strategy.current_balance - martingale_strategy.initial_balance
-        net_loss = martingale_strategy.initial_balance - martingale_strategy.current_balance if martingale_strategy.current_balance < martingale_strategy.initial_balance else 0.0
+        net_profit, net_loss = martingale_strategy.net_result()
         print("📊 Account Stats:")
         print(f"  Wins: {martingale_strategy.wins}")
         print(f"  Profit: {net_profit:.2f}")
@@ -37,28 +40,31 @@ async def display_account_stats(martingale_strategy):
         print(f"⚠️ خطأ أثناء عرض إحصائيات الحساب: {str(e)}")
 
 def normalize_symbol(symbol: str) -> str:
-    """تطبيع صيغة الرمز لضمان التوافق مع API."""
-    symbol = symbol.replace(" ", "").replace("/", "").lower()
-    symbol_mapping = {
-        "eurusdotc": "eurusd_otc",
-        "usdphpotc": "usdphp_otc",
-    }
-    symbol = symbol_mapping.get(symbol, symbol)
-    symbol = symbol.replace("-otc", "_otc").replace("otc", "_otc")
-    while "__otc" in symbol:
-        symbol = symbol.replace("__otc", "_otc")
-    return symbol
+    """تطبيع صيغة الرمز لضمان التوافق مع API (eurusd_otc)."""
+    key = alias_key(symbol)
+    if key.endswith(OTC_SUFFIX):
+        return key[:-len(OTC_SUFFIX)] + "_otc"
+    return key
 
 async def check_payout(client: PocketOptionAsync, symbol: str, min_payout: float) -> tuple:
     """التحقق من نسبة العائد مع التخزين المؤقت المحلي."""
     max_attempts = 3  # تحسين: تقليل المحاولات إلى 3
     attempt = 0
     normalized_symbol = normalize_symbol(symbol)
-    symbol_variants = [
-        normalized_symbol,
-        normalized_symbol.replace("_otc", ""),
-        normalized_symbol.replace("_otc", "-otc")
-    ]
+
+    # الفهرس الحي الذي يحدّثه keep_alive: بدون أي طلب شبكة في الحالة المعتادة
+    hit, entry = payout_index.lookup(symbol)
+    if hit:
+        if entry is None:
+            logging.warning(f"الرمز {symbol} غير موجود في قائمة العوائد الحالية")
+            print(f"⚠️ الرمز {symbol} غير نشط")
+            return None, None
+        logging.info(f"Using indexed payout for {symbol}: {entry.payout}%")
+        if entry.payout >= min_payout:
+            return entry.symbol, entry.payout
+        logging.warning(f"تم تخطي {entry.symbol}: نسبة العائد {entry.payout}% أقل من الحد الأدنى {min_payout}%")
+        print(f"⚠️ تم تخطي {entry.symbol}: نسبة العائد {entry.payout}% أقل من الحد الأدنى {min_payout}%")
+        return None, None
 
     # التحقق من التخزين المؤقت في Redis
     redis_key = f"payout_{normalized_symbol}"
@@ -78,20 +84,20 @@ async def check_payout(client: PocketOptionAsync, symbol: str, min_payout: float
                 attempt += 1
                 await asyncio.sleep(0.5)  # تحسين: تقليل النوم إلى 0.5 ثانية
                 continue
+            payout_index.update(full_payout)
 
-            for variant in symbol_variants:
-                for key in full_payout:
-                    if key.lower() == variant.lower():
-                        payout = float(full_payout[key])
-                        logging.info(f"رمز: {key}, نسبة العائد: {payout}%, الحد الأدنى: {min_payout}%")
-                        if payout >= min_payout:
-                            redis_client.set_data(redis_key, {"symbol": key, "payout": payout}, ttl=180)  # تحسين: TTL إلى 3 دقائق
-                            logging.info(f"رمز صالح: {key}, نسبة العائد: {payout}%")
-                            return key, payout
-                        else:
-                            logging.warning(f"تم تخطي {key}: نسبة العائد {payout}% أقل من الحد الأدنى {min_payout}%")
-                            print(f"⚠️ تم تخطي {key}: نسبة العائد {payout}% أقل من الحد الأدنى {min_payout}%")
-                            return None, None
+            key = payout_index.catalog.resolve(symbol)
+            if key is not None and key in full_payout:
+                payout = float(full_payout[key])
+                logging.info(f"رمز: {key}, نسبة العائد: {payout}%, الحد الأدنى: {min_payout}%")
+                if payout >= min_payout:
+                    redis_client.set_data(redis_key, {"symbol": key, "payout": payout}, ttl=180)  # تحسين: TTL إلى 3 دقائق
+                    logging.info(f"رمز صالح: {key}, نسبة العائد: {payout}%")
+                    return key, payout
+                else:
+                    logging.warning(f"تم تخطي {key}: نسبة العائد {payout}% أقل من الحد الأدنى {min_payout}%")
+                    print(f"⚠️ تم تخطي {key}: نسبة العائد {payout}% أقل من الحد الأدنى {min_payout}%")
+                    return None, None
             logging.warning(f"محاولة {attempt + 1}: الرمز {symbol} غير نشط")
             print(f"⚠️ الرمز {symbol} غير نشط")
         except Exception as e:
@@ -104,6 +110,27 @@ async def check_payout(client: PocketOptionAsync, symbol: str, min_payout: float
     print(f"❌ فشل التحقق من العائد لـ {symbol} بعد {max_attempts} محاولات")
     return None, None
 
+SIGNAL_TIMEZONE = pytz.timezone('America/Sao_Paulo')
+
+def seconds_until_entry(trade_time_exact: str, current_time: datetime = None):
+    """الفرق بالثواني حتى أقرب موعد لوقت الإشارة (سالب إذا فات الموعد).
+
+    Returns None when the time is missing or malformed.
+    """
+    if not trade_time_exact or not validate_trade_time(trade_time_exact):
+        return None
+    current_time = current_time or clock.now(SIGNAL_TIMEZONE)
+    entry = SIGNAL_TIMEZONE.localize(datetime.strptime(trade_time_exact, "%H:%M:%S").replace(
+        year=current_time.year, month=current_time.month, day=current_time.day
+    ))
+    diff = (entry - current_time).total_seconds()
+    # أقرب موعد: الإشارة التي فاتت قبل ثوانٍ متأخرة وليست لليوم التالي
+    if diff > 43200:
+        diff -= 86400
+    elif diff < -43200:
+        diff += 86400
+    return diff
+
 def validate_symbol(symbol: str) -> bool:
     """التحقق من أن الرمز صالح."""
     pattern = r"^[A-Z0-9]+$"
@@ -119,4 +146,4 @@ def validate_trade_time(trade_time: str) -> bool:
 
 def format_amount(amount: float) -> str:
     """تنسيق المبلغ للعرض."""
-    return f"{amount:,.2f}"
\ No newline at end of file
+    return f"{amount:,.2f}"
\ No newline at end of file
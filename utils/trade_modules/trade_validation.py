@@ -0,0 +1,98 @@
+import asyncio
+import logging
+from utils import clock
+from utils.metrics import stage_seconds
+
+# إعدادات التسجيل
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[logging.FileHandler('errors.log', mode='a', encoding='utf-8')]
+)
+
+# الحد الأقصى لزمن كل فحوصات ما قبل الصفقة مجتمعة (بالثواني)
+VALIDATION_BUDGET = 3.0
+
+
+class CheckResult:
+    __slots__ = ("name", "ok", "reason", "value", "elapsed")
+
+    def __init__(self, name, ok, reason=None, value=None, elapsed=0.0):
+        self.name = name
+        self.ok = ok
+        self.reason = reason
+        self.value = value
+        self.elapsed = elapsed
+
+
+class ValidationReport:
+    """Outcome of one run_checks call: per-check results, timings and the first hard rejection."""
+
+    def __init__(self, results: dict, failed: CheckResult, elapsed: float):
+        self.results = results
+        self.failed = failed
+        self.elapsed = elapsed
+
+    @property
+    def ok(self) -> bool:
+        return self.failed is None
+
+    def value(self, name):
+        result = self.results.get(name)
+        return result.value if result else None
+
+    def timings(self) -> dict:
+        return {name: round(result.elapsed, 3) for name, result in self.results.items()}
+
+    def summary(self) -> str:
+        status = "passed" if self.ok else f"rejected by {self.failed.name}: {self.failed.reason}"
+        return f"Validation {status} in {self.elapsed:.3f}s, timings: {self.timings()}"
+
+
+async def _timed(name, check) -> CheckResult:
+    start = clock.monotonic()
+    try:
+        outcome = check()
+        if asyncio.iscoroutine(outcome):
+            outcome = await outcome
+        ok, reason, value = outcome
+    except Exception as e:
+        ok, reason, value = False, str(e), None
+    return CheckResult(name, ok, reason, value, clock.monotonic() - start)
+
+
+async def run_checks(checks: dict, budget: float = VALIDATION_BUDGET) -> ValidationReport:
+    """تشغيل الفحوصات المستقلة معًا ضمن ميزانية زمنية، والتوقف عند أول رفض.
+
+    `checks` maps a name to a callable returning (ok, reason, value), either
+    directly or as a coroutine. Checks still running when one fails or when
+    the budget runs out are cancelled.
+    """
+    start = clock.monotonic()
+    tasks = {asyncio.ensure_future(_timed(name, check)): name for name, check in checks.items()}
+    results = {}
+    failed = None
+    pending = set(tasks)
+    try:
+        while pending and failed is None:
+            remaining = budget - (clock.monotonic() - start)
+            if remaining <= 0:
+                name = next(tasks[task] for task in tasks if task in pending)
+                failed = CheckResult(name, False, f"latency budget of {budget:.2f}s exceeded", None, clock.monotonic() - start)
+                results[name] = failed
+                break
+            done, pending = await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                result = task.result()
+                results[result.name] = result
+                if not result.ok and failed is None:
+                    failed = result
+    finally:
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+    report = ValidationReport(results, failed, clock.monotonic() - start)
+    stage_seconds.observe(report.elapsed, stage="validation")
+    logging.info(report.summary())
+    return report